@@ -0,0 +1,143 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from config import ARTIFACT_STORE_DIR, ARTIFACT_STORE_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactStore:
+    """
+    Almacén en disco de archivos generados (recibos, etc.) direccionado por contenido.
+
+    - blobs/<sha[:2]>/<sha256>: el contenido, guardado una sola vez aunque varias claves lo usen.
+    - refs/<clave>: JSON con el sha256 al que apunta cada clave (ej. "recibo_15_v1.pdf")
+      y metadatos opcionales (nombre de archivo, datos para el mensaje, etc.).
+
+    El tamaño total de los blobs está limitado a `max_bytes`; al superarlo se eliminan
+    los blobs usados hace más tiempo (la fecha de modificación se renueva en cada lectura).
+    Las referencias que apuntan a un blob eliminado se tratan como ausentes.
+    """
+
+    def __init__(self, directorio: str, max_bytes: int):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._dir_blobs = os.path.join(directorio, "blobs")
+        self._dir_refs = os.path.join(directorio, "refs")
+        os.makedirs(self._dir_blobs, exist_ok=True)
+        os.makedirs(self._dir_refs, exist_ok=True)
+        self._lock = threading.Lock()
+        self._total_bytes = sum(os.path.getsize(ruta) for ruta, _ in self._listar_blobs())
+
+    def _ruta_blob(self, sha: str) -> str:
+        return os.path.join(self._dir_blobs, sha[:2], sha)
+
+    def _ruta_ref(self, clave: str) -> str:
+        if os.sep in clave or (os.altsep and os.altsep in clave) or clave.startswith('.'):
+            raise ValueError(f"Clave de artefacto inválida: {clave}")
+        return os.path.join(self._dir_refs, clave)
+
+    def _listar_blobs(self):
+        """Genera (ruta, mtime) de todos los blobs almacenados."""
+        for subdir in os.scandir(self._dir_blobs):
+            if not subdir.is_dir():
+                continue
+            for entrada in os.scandir(subdir.path):
+                if entrada.is_file() and not entrada.name.endswith('.tmp'):
+                    yield entrada.path, entrada.stat().st_mtime
+
+    @staticmethod
+    def _escribir_atomico(ruta: str, contenido: bytes) -> None:
+        """Escribe en un temporal del mismo directorio y lo renombra, para no dejar archivos a medias."""
+        fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(contenido)
+            os.replace(temporal, ruta)
+        except Exception:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+
+    def obtener(self, clave: str) -> tuple[bytes, dict] | None:
+        """Devuelve (contenido, metadatos) asociados a `clave`, o None si no existe o fue desalojado."""
+        ruta_ref = self._ruta_ref(clave)
+        try:
+            with open(ruta_ref, 'r', encoding='utf-8') as f:
+                ref = json.load(f)
+            sha = ref["sha256"]
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError):
+            logger.warning(f"Referencia ilegible para la clave {clave}; se descarta.")
+            self.invalidar(clave)
+            return None
+        ruta_blob = self._ruta_blob(sha)
+        try:
+            with open(ruta_blob, 'rb') as f:
+                contenido = f.read()
+        except FileNotFoundError:
+            # El blob fue desalojado: la referencia ya no sirve
+            self.invalidar(clave)
+            return None
+        if hashlib.sha256(contenido).hexdigest() != sha:
+            logger.warning(f"Artefacto corrupto para la clave {clave}; se descarta.")
+            self.invalidar(clave)
+            return None
+        # Marca el blob como usado recientemente para el desalojo LRU
+        try:
+            os.utime(ruta_blob)
+        except FileNotFoundError:
+            pass
+        return contenido, ref.get("meta", {})
+
+    def guardar(self, clave: str, contenido: bytes, metadatos: dict = None) -> str:
+        """Guarda `contenido` (y metadatos serializables a JSON) bajo `clave` y devuelve su sha256."""
+        sha = hashlib.sha256(contenido).hexdigest()
+        ruta_blob = self._ruta_blob(sha)
+        with self._lock:
+            if os.path.exists(ruta_blob):
+                os.utime(ruta_blob)
+            else:
+                os.makedirs(os.path.dirname(ruta_blob), exist_ok=True)
+                self._escribir_atomico(ruta_blob, contenido)
+                self._total_bytes += len(contenido)
+            ref = json.dumps({"sha256": sha, "meta": metadatos or {}}, ensure_ascii=False)
+            self._escribir_atomico(self._ruta_ref(clave), ref.encode('utf-8'))
+            if self._total_bytes > self.max_bytes:
+                self._desalojar()
+        return sha
+
+    def invalidar(self, *claves: str) -> None:
+        """Elimina las referencias indicadas; sus blobs quedan sujetos al desalojo normal."""
+        for clave in claves:
+            try:
+                os.remove(self._ruta_ref(clave))
+            except FileNotFoundError:
+                pass
+
+    def _desalojar(self) -> None:
+        """Elimina los blobs menos usados hasta quedar por debajo del límite (llamar con el lock tomado)."""
+        for ruta, _ in sorted(self._listar_blobs(), key=lambda item: item[1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                tamano = os.path.getsize(ruta)
+                os.remove(ruta)
+                self._total_bytes -= tamano
+            except FileNotFoundError:
+                continue
+        logger.info(f"Almacén de artefactos desalojado hasta {self._total_bytes} bytes.")
+
+
+_almacen = None
+
+def obtener_almacen() -> ArtifactStore:
+    """Devuelve el almacén de artefactos del bot, creándolo en el primer uso."""
+    global _almacen
+    if _almacen is None:
+        _almacen = ArtifactStore(ARTIFACT_STORE_DIR, ARTIFACT_STORE_MAX_MB * 1024 * 1024)
+    return _almacen
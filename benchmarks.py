@@ -0,0 +1,335 @@
+"""
+Benchmarks de rendimiento con escenarios con nombre: consultas de database.py sobre libros
+de distintos tamaños, generadores (PDF, PNG, gráfico, Excel) y flujos completos de
+handlers con el arnés de carga.
+
+Por escenario se mide el tiempo real y de CPU (mediana y mínimo de `--repeticiones`,
+tras una ejecución de calentamiento) y el pico de memoria de Python (tracemalloc, en una
+ejecución aparte para no inflar los tiempos). Los resultados se guardan en JSON y se
+comparan con una línea base: cualquier métrica que empeore más que su umbral es una
+regresión y el proceso termina con código 1 (útil en CI).
+
+Uso:
+    python benchmarks.py --listar
+    python benchmarks.py --guardar-base                      # primera vez: fija la línea base
+    python benchmarks.py --solo pdf,excel --umbral-tiempo 0.3
+    python benchmarks.py --db --solo db.                      # requiere una base DESECHABLE
+
+Los escenarios `db.*` solo se ejecutan con --db: cargan datos sintéticos
+(dataset_generator.py) en la base configurada vaciando antes inquilinos, pagos y gastos.
+"""
+import io
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import statistics
+import tempfile
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+SEMILLA = 20240101
+RESULTADOS_POR_DEFECTO = "benchmarks_resultados.json"
+BASE_POR_DEFECTO = "benchmarks_base.json"
+# Diferencias absolutas por debajo de estas no cuentan como regresión (ruido de medición)
+TOLERANCIA_MS = 1.0
+TOLERANCIA_KB = 64.0
+
+
+class Escenario:
+    __slots__ = ("nombre", "preparar", "tamanos", "requiere_db", "descripcion")
+
+    def __init__(self, nombre: str, preparar, tamanos: tuple, requiere_db: bool, descripcion: str):
+        self.nombre = nombre
+        self.preparar = preparar
+        self.tamanos = tamanos
+        self.requiere_db = requiere_db
+        self.descripcion = descripcion
+
+    def instancias(self) -> list[tuple[str, object]]:
+        """(nombre completo, tamaño) de cada variante: 'pdf.informe[500]' o 'png.recibo'."""
+        return [(f"{self.nombre}[{t}]" if t is not None else self.nombre, t) for t in self.tamanos]
+
+
+ESCENARIOS: dict[str, Escenario] = {}
+
+
+def escenario(nombre: str, tamanos: tuple = (None,), requiere_db: bool = False):
+    """
+    Registra un escenario. La función decorada recibe el tamaño, prepara los datos (fuera
+    de la medición) y devuelve la operación a medir, síncrona o corrutina sin argumentos.
+    """
+    def decorador(preparar):
+        ESCENARIOS[nombre] = Escenario(nombre, preparar, tamanos, requiere_db, (preparar.__doc__ or "").strip())
+        return preparar
+    return decorador
+
+
+# === Datos sintéticos para los generadores ===
+
+def _datos_informe(filas: int, semilla: int = SEMILLA) -> dict:
+    """Datos con la forma de obtener_informe_mensual: `filas` pagos y una décima parte de gastos."""
+    from dataset_generator import NOMBRES, APELLIDOS, GASTOS
+    rng = random.Random(semilla)
+    inicio = date(2026, 3, 1)
+    pagos = [
+        (i, inicio + timedelta(days=rng.randint(0, 30)), f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}",
+         Decimal(rng.randrange(8000, 35001, 500)))
+        for i in range(1, filas + 1)
+    ]
+    gastos = [
+        (i, inicio + timedelta(days=rng.randint(0, 30)), rng.choice(GASTOS)[0], Decimal(rng.randint(500, 15000)))
+        for i in range(1, max(1, filas // 10) + 1)
+    ]
+    ingresos = sum(p[3] for p in pagos)
+    total_gastos = sum(g[3] for g in gastos)
+    comision = ingresos * Decimal("0.05")
+    return {
+        "total_ingresos": ingresos, "total_gastos": total_gastos, "total_comision": comision,
+        "monto_neto": ingresos - comision - total_gastos, "pagos_mes": pagos, "gastos_mes": gastos,
+    }
+
+
+# === Escenarios de generadores ===
+
+@escenario("pdf.informe", tamanos=(20, 500, 5000))
+def _pdf_informe(filas: int):
+    """crear_informe_pdf con N pagos (modo de informe grande por encima del umbral)."""
+    from pdf_generator import crear_informe_pdf
+    datos = _datos_informe(filas)
+    return lambda: crear_informe_pdf(datos, 3, 2026)
+
+@escenario("excel.informe", tamanos=(20, 500, 5000))
+def _excel_informe(filas: int):
+    """exportar_informe_excel con N pagos, en memoria."""
+    from export_generator import exportar_informe_excel
+    datos = _datos_informe(filas)
+    return lambda: exportar_informe_excel(3, 2026, datos)
+
+@escenario("png.recibo")
+def _png_recibo(_):
+    """crear_recibo_png de un pago (plantilla y fuentes ya en caché tras el calentamiento)."""
+    from receipt_generator import crear_recibo_png
+    return lambda: crear_recibo_png(1234, date(2026, 3, 5), "María Altagracia Pérez Gómez", Decimal("18500.00"), "Marzo 2026")
+
+@escenario("grafico.financiero")
+def _grafico_financiero(_):
+    """_crear_grafico_financiero (gráfico de /resumen e /informe)."""
+    from chart_generator import _crear_grafico_financiero
+    return lambda: _crear_grafico_financiero(
+        "BALANCE DEL MES • MARZO 2026", "Desglose de rendimiento financiero en Marzo 2026",
+        Decimal("412500.00"), Decimal("38200.00"), Decimal("20625.00"), Decimal("353675.00"),
+    )
+
+
+# === Escenarios de extremo a extremo ===
+
+@escenario("handlers.flujos", tamanos=(1, 10))
+def _handlers_flujos(usuarios: int):
+    """Flujos completos (pago, informe, resumen) de N usuarios con load_harness, base en memoria y API sin latencia."""
+    import load_harness
+
+    async def ejecutar():
+        reporte = await load_harness.ejecutar(
+            usuarios=usuarios, iteraciones=2, pausa=0, latencia_api_ms=0, latencia_db_ms=0,
+            inquilinos=10, semilla=SEMILLA,
+        )
+        if reporte["errores"] or reporte["sin_respuesta"]:
+            raise RuntimeError(f"El arnés terminó con errores: {reporte['errores']} / sin respuesta {reporte['sin_respuesta']}")
+    return ejecutar
+
+
+# === Escenarios de base de datos (requieren --db) ===
+
+_libro_cargado = {"inquilinos": None}
+
+async def _asegurar_libro(inquilinos: int) -> None:
+    """Carga 10 años de historial con `inquilinos` inquilinos, salvo que ya sea el cargado."""
+    if _libro_cargado["inquilinos"] == inquilinos:
+        return
+    import database
+    from dataset_generator import generar
+    with tempfile.TemporaryDirectory(prefix="alqui_bot_bench_") as directorio:
+        archivos = generar(directorio, semilla=SEMILLA, inquilinos=inquilinos, anios=10)
+        await database.cargar_csv_masivo({tabla: ruta for tabla, (ruta, _) in archivos.items()}, vaciar=True)
+    _libro_cargado["inquilinos"] = inquilinos
+
+def _mes_anterior() -> tuple[int, int]:
+    hoy = datetime.now().date().replace(day=1) - timedelta(days=1)
+    return hoy.month, hoy.year
+
+@escenario("db.informe_mensual", tamanos=(100, 1000, 5000), requiere_db=True)
+async def _db_informe_mensual(inquilinos: int):
+    """obtener_informe_mensual del último mes completo sobre un libro de 10 años con N inquilinos."""
+    import database
+    await _asegurar_libro(inquilinos)
+    mes, anio = _mes_anterior()
+    return lambda: database.obtener_informe_mensual(mes, anio)
+
+@escenario("db.recordatorio", tamanos=(100, 1000), requiere_db=True)
+async def _db_recordatorio(inquilinos: int):
+    """obtener_inquilinos_para_recordatorio con N inquilinos."""
+    import database
+    await _asegurar_libro(inquilinos)
+    return lambda: database.obtener_inquilinos_para_recordatorio()
+
+
+# === Medición ===
+
+async def _llamar(operacion) -> None:
+    resultado = operacion()
+    if asyncio.iscoroutine(resultado):
+        await resultado
+
+async def medir(operacion, repeticiones: int = 5) -> dict:
+    """Calentamiento, `repeticiones` mediciones de tiempo y una ejecución con tracemalloc para el pico."""
+    await _llamar(operacion)
+    reales, cpu = [], []
+    for _ in range(repeticiones):
+        inicio_real, inicio_cpu = time.perf_counter(), time.process_time()
+        await _llamar(operacion)
+        reales.append((time.perf_counter() - inicio_real) * 1000)
+        cpu.append((time.process_time() - inicio_cpu) * 1000)
+
+    tracemalloc.start()
+    try:
+        await _llamar(operacion)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "repeticiones": repeticiones,
+        "real_ms": round(statistics.median(reales), 3),
+        "real_min_ms": round(min(reales), 3),
+        "cpu_ms": round(statistics.median(cpu), 3),
+        "memoria_pico_kb": round(pico / 1024, 1),
+    }
+
+def _seleccionados(filtro: str | None, con_db: bool) -> list[tuple[Escenario, str, object]]:
+    patrones = [p.strip() for p in filtro.split(",") if p.strip()] if filtro else []
+    elegidos = []
+    for esc in ESCENARIOS.values():
+        if esc.requiere_db and not con_db:
+            continue
+        for nombre, tamano in esc.instancias():
+            if not patrones or any(nombre.startswith(p) for p in patrones):
+                elegidos.append((esc, nombre, tamano))
+    return elegidos
+
+async def ejecutar(filtro: str | None = None, repeticiones: int = 5, con_db: bool = False) -> dict:
+    """Ejecuta los escenarios seleccionados y devuelve el documento de resultados."""
+    import database
+    resultados = {}
+    if con_db:
+        await database.init_pool()
+        await database.inicializar_db()
+    try:
+        for esc, nombre, tamano in _seleccionados(filtro, con_db):
+            try:
+                operacion = esc.preparar(tamano)
+                if asyncio.iscoroutine(operacion):
+                    operacion = await operacion
+                resultados[nombre] = await medir(operacion, repeticiones)
+            except Exception as e:
+                logger.error(f"Escenario {nombre} falló: {e}", exc_info=True)
+                resultados[nombre] = {"error": str(e)}
+                continue
+            r = resultados[nombre]
+            print(f"  {nombre:<28} real {r['real_ms']:>10.2f} ms  cpu {r['cpu_ms']:>10.2f} ms  pico {r['memoria_pico_kb']:>10.1f} KB", file=sys.stderr)
+    finally:
+        if con_db:
+            await database.close_pool()
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "escenarios": resultados,
+    }
+
+
+# === Comparación con la línea base ===
+
+def comparar(actual: dict, base: dict, umbral_tiempo: float = 0.2, umbral_cpu: float = 0.2,
+             umbral_memoria: float = 0.2) -> list[dict]:
+    """
+    Devuelve las regresiones de `actual` frente a `base`: métricas cuyo aumento relativo
+    supera su umbral (0.2 = +20 %) y que además superan la tolerancia absoluta. Los
+    escenarios que no están en ambos documentos se ignoran.
+    """
+    metricas = (
+        ("real_ms", umbral_tiempo, TOLERANCIA_MS),
+        ("cpu_ms", umbral_cpu, TOLERANCIA_MS),
+        ("memoria_pico_kb", umbral_memoria, TOLERANCIA_KB),
+    )
+    regresiones = []
+    for nombre, medido in actual.get("escenarios", {}).items():
+        referencia = base.get("escenarios", {}).get(nombre)
+        if not referencia or "error" in medido or "error" in referencia:
+            continue
+        for metrica, umbral, tolerancia in metricas:
+            antes, ahora = referencia.get(metrica), medido.get(metrica)
+            if antes is None or ahora is None or ahora - antes <= tolerancia:
+                continue
+            cambio = (ahora - antes) / antes if antes else float("inf")
+            if cambio > umbral:
+                regresiones.append({"escenario": nombre, "metrica": metrica, "base": antes, "actual": ahora, "cambio": round(cambio, 3)})
+    return regresiones
+
+
+def _listar() -> None:
+    for esc in ESCENARIOS.values():
+        nombres = ", ".join(nombre for nombre, _ in esc.instancias())
+        print(f"{nombres}{'  (requiere --db)' if esc.requiere_db else ''}\n    {esc.descripcion}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de consultas, generadores y handlers de Alqui_bot.")
+    parser.add_argument("--listar", action="store_true", help="Muestra los escenarios disponibles.")
+    parser.add_argument("--solo", help="Prefijos de escenarios separados por coma (ej. pdf,db.informe_mensual[1000]).")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Mediciones por escenario (tras un calentamiento).")
+    parser.add_argument("--db", action="store_true", help="Incluye los escenarios db.* (vacían y recargan la base configurada).")
+    parser.add_argument("--salida", default=RESULTADOS_POR_DEFECTO, help="Archivo JSON de resultados.")
+    parser.add_argument("--base", default=BASE_POR_DEFECTO, help="Línea base con la que comparar.")
+    parser.add_argument("--guardar-base", action="store_true", help="Guarda estos resultados como nueva línea base.")
+    parser.add_argument("--umbral-tiempo", type=float, default=0.2, help="Aumento relativo máximo del tiempo real (0.2 = 20%%).")
+    parser.add_argument("--umbral-cpu", type=float, default=0.2, help="Aumento relativo máximo del tiempo de CPU.")
+    parser.add_argument("--umbral-memoria", type=float, default=0.2, help="Aumento relativo máximo del pico de memoria.")
+    args = parser.parse_args()
+
+    if args.listar:
+        _listar()
+        raise SystemExit(0)
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.WARNING)
+    resultados = asyncio.run(ejecutar(args.solo, args.repeticiones, args.db))
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"Resultados en {args.salida}")
+
+    codigo = 1 if any("error" in r for r in resultados["escenarios"].values()) else 0
+    if args.guardar_base:
+        with open(args.base, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"Línea base guardada en {args.base}")
+    else:
+        try:
+            with open(args.base, encoding="utf-8") as f:
+                base = json.load(f)
+        except FileNotFoundError:
+            print(f"Sin línea base ({args.base}); use --guardar-base para crearla.")
+        else:
+            regresiones = comparar(resultados, base, args.umbral_tiempo, args.umbral_cpu, args.umbral_memoria)
+            for r in regresiones:
+                print(f"REGRESIÓN {r['escenario']} {r['metrica']}: {r['base']} -> {r['actual']} (+{r['cambio']:.0%})")
+            if regresiones:
+                codigo = 1
+            else:
+                print(f"Sin regresiones frente a {args.base}.")
+    raise SystemExit(codigo)
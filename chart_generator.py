@@ -1,9 +1,13 @@
 import io
 import matplotlib
 matplotlib.use('Agg') # Uso en servidores sin GUI (Railway/Linux)
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib.ticker as ticker
 from decimal import Decimal
+from PIL import Image
+from image_optimizer import codificar_png
+from tracing import trazar
 
 def _crear_grafico_financiero(titulo: str, subtitulo: str, ingresos: Decimal, gastos: Decimal, comision: Decimal, neto: Decimal) -> io.BytesIO:
     """
@@ -17,7 +21,11 @@ def _crear_grafico_financiero(titulo: str, subtitulo: str, ingresos: Decimal, ga
     colors = ['#10B981', '#F43F5E', '#F59E0B', color_neto]
     edge_colors = ['#059669', '#E11D48', '#D97706', '#4338CA' if neto >= 0 else '#BE123C']
 
-    fig, ax = plt.subplots(figsize=(8, 5.5), dpi=200)
+    # Figura creada sin pyplot: no comparte estado global, así varios gráficos pueden
+    # renderizarse a la vez en hilos distintos.
+    fig = Figure(figsize=(8, 5.5), dpi=200)
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
     fig.patch.set_facecolor('#F8FAFC')
     ax.set_facecolor('#FFFFFF')
 
@@ -63,14 +71,15 @@ def _crear_grafico_financiero(titulo: str, subtitulo: str, ingresos: Decimal, ga
     # Línea en cero si hay negativos o para sentar base
     ax.axhline(0, color='#94A3B8', linewidth=1.2, zorder=2)
 
-    plt.tight_layout(rect=[0, 0.04, 1, 0.88])
+    fig.tight_layout(rect=[0, 0.04, 1, 0.88])
 
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', facecolor=fig.get_facecolor(), edgecolor='none')
-    plt.close(fig)
-    buffer.seek(0)
-    return buffer
+    # Se toma el raster RGBA directamente del canvas (mismo resultado que savefig con
+    # el fondo de la figura) y se codifica una sola vez con el optimizador de imágenes.
+    fig.canvas.draw()
+    img = Image.frombuffer('RGBA', fig.canvas.get_width_height(), fig.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1).copy()
+    return codificar_png(img, "grafico")
 
+@trazar()
 def generar_grafico_resumen(ingresos: Decimal, gastos: Decimal, comision: Decimal, neto: Decimal) -> io.BytesIO:
     """Genera un gráfico de barras premium con el resumen financiero general."""
     return _crear_grafico_financiero(
@@ -79,6 +88,7 @@ def generar_grafico_resumen(ingresos: Decimal, gastos: Decimal, comision: Decima
         ingresos=ingresos, gastos=gastos, comision=comision, neto=neto
     )
 
+@trazar()
 def generar_grafico_mensual(mes: int, anio: int, ingresos: Decimal, gastos: Decimal, comision: Decimal, neto: Decimal) -> io.BytesIO:
     """Genera un gráfico de barras premium específico para un mes y año."""
     meses = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
@@ -21,6 +21,11 @@ except (ValueError, AttributeError):
 # Token del bot de Telegram, obtenido de una variable de entorno
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
+# === Registro (Logging) ===
+# Nivel del log y formato: texto legible o una línea JSON por registro (con update_id y handler)
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() in ("1", "true", "si", "sí", "yes")
+
 # === Configuración de la Base de Datos PostgreSQL ===
 DB_HOST = os.getenv("PGHOST")
 DB_PORT = os.getenv("PGPORT")
@@ -31,3 +36,102 @@ DB_PASSWORD = os.getenv("PGPASSWORD")
 # === Configuración de Negocio ===
 # Tasa de comisión sobre los ingresos (ej: 0.05 para 5%)
 COMMISSION_RATE = 0.05
+
+# === Configuración de Recibos en Lote ===
+# Número de procesos para renderizar recibos en lote (/recibos). 0 = un proceso por CPU.
+RECIBOS_LOTE_WORKERS = int(os.getenv("RECIBOS_LOTE_WORKERS", "0")) or None
+
+# === Configuración del Almacén de Artefactos ===
+# Directorio donde se guardan los recibos generados para volver a descargarlos sin re-renderizar
+ARTIFACT_STORE_DIR = os.getenv("ARTIFACT_STORE_DIR", str(Path(__file__).resolve().parent / "artifacts"))
+# Tamaño máximo del almacén en MB; al superarlo se eliminan los archivos usados hace más tiempo
+ARTIFACT_STORE_MAX_MB = int(os.getenv("ARTIFACT_STORE_MAX_MB", "200"))
+
+# === Prerenderizado de Recibos ===
+# Segundos que se conservan en memoria los recibos renderizados en segundo plano tras
+# registrar un pago. 0 desactiva el prerenderizado.
+RECIBO_PRERENDER_TTL = int(os.getenv("RECIBO_PRERENDER_TTL", "600"))
+
+# === Optimización de Imágenes ===
+# Reducir a una paleta de 256 colores las vistas previas PNG que se envían al chat (casi sin
+# pérdida en estos diseños planos); los PNG originales de descargas y lotes no se tocan
+IMAGEN_CUANTIZAR = os.getenv("IMAGEN_CUANTIZAR", "true").lower() in ("1", "true", "si", "sí", "yes")
+# Nivel de compresión zlib de las vistas previas PNG (0-9)
+IMAGEN_NIVEL_ZLIB = int(os.getenv("IMAGEN_NIVEL_ZLIB", "9"))
+# Formato de las vistas previas enviadas como foto en el chat: png, webp o jpeg
+IMAGEN_FORMATO_VISTA_PREVIA = os.getenv("IMAGEN_FORMATO_VISTA_PREVIA", "png").lower()
+IMAGEN_CALIDAD_VISTA_PREVIA = int(os.getenv("IMAGEN_CALIDAD_VISTA_PREVIA", "85"))
+
+# === Perfil de Salida PDF ===
+# Perfil compacto: flujos comprimidos y sin codificación ASCII85 (archivos más pequeños)
+PDF_COMPACTO = os.getenv("PDF_COMPACTO", "true").lower() in ("1", "true", "si", "sí", "yes")
+
+# === Concurrencia ===
+# Máximo de actualizaciones de Telegram procesadas a la vez (las de un mismo chat siempre en orden; 1 = de una en una)
+ACTUALIZACIONES_CONCURRENTES = int(os.getenv("ACTUALIZACIONES_CONCURRENTES", "8"))
+
+# === API de Telegram ===
+# URL base de la Bot API; por defecto la oficial. Para pruebas sin red, la de
+# fake_telegram_server.py (ej. http://127.0.0.1:8081/bot)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+# === Modo Webhook ===
+# Modo de ejecución por defecto (polling o webhook); `python main.py --mode ...` lo sobrescribe
+MODO_EJECUCION = os.getenv("MODO_EJECUCION", "polling").lower()
+# URL pública base donde Telegram enviará las actualizaciones (ej. https://mi-bot.up.railway.app);
+# obligatoria en modo webhook, que la registra al arrancar
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_RUTA = os.getenv("WEBHOOK_RUTA", "/telegram")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PUERTO = int(os.getenv("WEBHOOK_PUERTO", os.getenv("PORT", "8443")))
+# Token secreto que Telegram envía en cada petición (cabecera X-Telegram-Bot-Api-Secret-Token)
+WEBHOOK_SECRETO = os.getenv("WEBHOOK_SECRETO")
+
+# === Persistencia del Estado del Bot ===
+# Guarda conversaciones en curso y user_data en PostgreSQL para sobrevivir a reinicios
+PERSISTENCIA_ACTIVA = os.getenv("PERSISTENCIA_ACTIVA", "true").lower() in ("1", "true", "si", "sí", "yes")
+# Cada cuántos segundos se escriben en lote los cambios acumulados
+PERSISTENCIA_INTERVALO = float(os.getenv("PERSISTENCIA_INTERVALO", "10"))
+
+# === Cola de Envíos ===
+# Límites de envío a Telegram (~30 mensajes/s en total y ~1/s por chat)
+SALIDA_MENSAJES_POR_SEGUNDO = float(os.getenv("SALIDA_MENSAJES_POR_SEGUNDO", "25"))
+SALIDA_MENSAJES_POR_CHAT = float(os.getenv("SALIDA_MENSAJES_POR_CHAT", "1"))
+SALIDA_RAFAGA_CHAT = int(os.getenv("SALIDA_RAFAGA_CHAT", "3"))
+# Envíos despachados en paralelo por ciclo y reintentos antes de descartar uno
+SALIDA_LOTE_MAXIMO = int(os.getenv("SALIDA_LOTE_MAXIMO", "25"))
+SALIDA_MAX_INTENTOS = int(os.getenv("SALIDA_MAX_INTENTOS", "5"))
+# Guardar en la base los envíos pendientes para recuperarlos tras un reinicio
+SALIDA_PERSISTIR = os.getenv("SALIDA_PERSISTIR", "true").lower() in ("1", "true", "si", "sí", "yes")
+
+# === Búsqueda de Inquilinos ===
+# Con más inquilinos que este número, los flujos muestran solo el botón "🔎 Buscar" (búsqueda inline)
+INQUILINOS_MAX_BOTONES = int(os.getenv("INQUILINOS_MAX_BOTONES", "20"))
+
+# === Métricas de Latencia ===
+# Duraciones recientes que se guardan por handler para los percentiles de /stats
+LATENCIAS_VENTANA = int(os.getenv("LATENCIAS_VENTANA", "500"))
+
+# === Monitor del Event Loop ===
+# Detecta código síncrono que bloquea el loop y lo atribuye al handler en curso (ver loop_monitor.py)
+LOOP_MONITOR_ACTIVO = os.getenv("LOOP_MONITOR_ACTIVO", "true").lower() in ("1", "true", "si", "sí", "yes")
+# Bloqueos más largos que este umbral se registran con la pila del código responsable
+LOOP_UMBRAL_MS = float(os.getenv("LOOP_UMBRAL_MS", "250"))
+# Cada cuánto late el loop para medir su retardo
+LOOP_INTERVALO_MS = float(os.getenv("LOOP_INTERVALO_MS", "50"))
+
+# === Perfilado bajo Demanda (/profile) ===
+# Cada cuántos ms se toma una muestra de la pila de las actualizaciones perfiladas
+PERFIL_INTERVALO_MS = float(os.getenv("PERFIL_INTERVALO_MS", "5"))
+# Máximo de actualizaciones que se pueden pedir de una vez con /profile N
+PERFIL_MAX_ACTUALIZACIONES = int(os.getenv("PERFIL_MAX_ACTUALIZACIONES", "20"))
+
+# === Trazas de Peticiones ===
+TRAZAS_ACTIVAS = os.getenv("TRAZAS_ACTIVAS", "true").lower() in ("1", "true", "si", "sí", "yes")
+# Fracción de actualizaciones cuya traza se exporta (0-1)
+TRAZAS_MUESTREO = float(os.getenv("TRAZAS_MUESTREO", "0.01"))
+# Las actualizaciones que tardan al menos esto (ms) se exportan siempre, muestreadas o no
+TRAZAS_LENTAS_MS = float(os.getenv("TRAZAS_LENTAS_MS", "3000"))
+# Archivo Chrome Trace Event (abrible en ui.perfetto.dev); al superar TRAZAS_MAX_MB rota a <archivo>.1
+TRAZAS_ARCHIVO = os.getenv("TRAZAS_ARCHIVO", str(Path(__file__).resolve().parent / "trazas" / "trazas.json"))
+TRAZAS_MAX_MB = int(os.getenv("TRAZAS_MAX_MB", "50"))
@@ -1,9 +1,14 @@
 import os
+import gzip
+import asyncio
 import aiopg
+import psycopg2
 import logging
 from urllib.parse import urlparse
 from decimal import Decimal
 from datetime import date, datetime, timedelta, timezone
+import metrics
+from tracing import trazar
 from config import COMMISSION_RATE, DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
 
 logger = logging.getLogger(__name__)
@@ -13,16 +18,14 @@ pool = None
 # === Zona Horaria ===
 DO_TZ = timezone(timedelta(hours=-4)) # República Dominicana
 
-async def init_pool():
+def _construir_dsn() -> str:
     """
-    Inicializa el pool de conexiones a la base de datos.
+    Construye el DSN de conexión a la base de datos.
     Busca las credenciales en el siguiente orden:
     1. DATABASE_URL (ideal para producción en Railway).
     2. DATABASE_PUBLIC_URL (ideal para desarrollo local).
     3. Variables de entorno individuales (PGHOST, PGUSER, etc.).
     """
-    global pool
-    
     # Prioridad 1: DATABASE_URL (para producción)
     dsn_url = os.getenv("DATABASE_URL")
     
@@ -44,8 +47,18 @@ async def init_pool():
         logger.critical("No se encontraron credenciales de base de datos completas. Defina DATABASE_URL, DATABASE_PUBLIC_URL o las variables PG*.")
         raise ValueError("Credenciales de base de datos incompletas o no encontradas.")
 
+    return dsn
+
+async def init_pool():
+    """Inicializa el pool de conexiones a la base de datos."""
+    global pool
+    dsn = _construir_dsn()
+
     try:
         pool = await aiopg.create_pool(dsn)
+        metrics.registrar_indicador("db.pool.conexiones", lambda: pool.size if pool else 0)
+        metrics.registrar_indicador("db.pool.libres", lambda: pool.freesize if pool else 0)
+        metrics.registrar_indicador("db.pool.maximo", lambda: pool.maxsize if pool else 0)
         logger.info("Pool de conexiones a la base de datos inicializado correctamente.")
     except Exception as e:
         logger.error(f"Error al inicializar el pool de conexiones: {e}")
@@ -95,6 +108,28 @@ async def inicializar_db():
                 CREATE INDEX IF NOT EXISTS idx_gastos_fecha ON gastos(fecha);
             """)
 
+            # Envíos de la cola de salida aún no entregados (ver outbound_queue.py)
+            await cur.execute("""
+                CREATE TABLE IF NOT EXISTS envios_pendientes (
+                    id BIGSERIAL PRIMARY KEY,
+                    chat_id BIGINT NOT NULL,
+                    metodo TEXT NOT NULL,
+                    datos BYTEA NOT NULL,
+                    creado TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                )
+            """)
+
+            # Estado del bot (conversaciones y user_data) que debe sobrevivir a reinicios
+            await cur.execute("""
+                CREATE TABLE IF NOT EXISTS bot_persistencia (
+                    tipo TEXT NOT NULL,
+                    clave TEXT NOT NULL,
+                    datos BYTEA NOT NULL,
+                    actualizado TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (tipo, clave)
+                )
+            """)
+
             # --- Migración para añadir columna dia_pago a inquilinos ---
             await cur.execute("SELECT column_name FROM information_schema.columns WHERE table_name='inquilinos' AND column_name='dia_pago'")
             if not await cur.fetchone():
@@ -129,6 +164,7 @@ async def inicializar_db():
 
 # --- Funciones para registrar ---
 
+@trazar()
 async def registrar_pago(fecha: str, inquilino: str, monto: Decimal, mes_alquiler: int = None, anio_alquiler: int = None) -> int:
     """Registra un nuevo pago en la base de datos con fecha real y período adeudado."""
     if mes_alquiler is None or anio_alquiler is None:
@@ -148,9 +184,10 @@ async def registrar_pago(fecha: str, inquilino: str, monto: Decimal, mes_alquile
             )
             pago_id = await cur.fetchone()
             await cur.execute("COMMIT")
-            logger.info(f"Pago registrado con ID: {pago_id[0]} para período {mes_alquiler}/{anio_alquiler}")
+            logger.info("Pago registrado con ID: %s para período %s/%s", pago_id[0], mes_alquiler, anio_alquiler)
             return pago_id[0]
 
+@trazar()
 async def registrar_gasto(fecha: str, descripcion: str, monto: Decimal) -> int:
     """Registra un nuevo gasto en la base de datos."""
     async with pool.acquire() as conn:
@@ -158,13 +195,14 @@ async def registrar_gasto(fecha: str, descripcion: str, monto: Decimal) -> int:
             await cur.execute("INSERT INTO gastos (fecha, descripcion, monto) VALUES (%s, %s, %s) RETURNING id", (fecha, descripcion, monto))
             gasto_id = await cur.fetchone()
             await cur.execute("COMMIT")
-            logger.info(f"Gasto registrado con ID: {gasto_id[0]}")
+            logger.info("Gasto registrado con ID: %s", gasto_id[0])
             return gasto_id[0]
 
 # --- Funciones para deshacer ---
 
+@trazar()
 async def deshacer_ultimo_pago() -> tuple:
-    """Elimina el último pago registrado y devuelve sus detalles de forma atómica."""
+    """Elimina el último pago registrado y devuelve (inquilino, monto, id) de forma atómica."""
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
             await cur.execute("SELECT id, inquilino, monto FROM pagos ORDER BY id DESC LIMIT 1")
@@ -174,11 +212,12 @@ async def deshacer_ultimo_pago() -> tuple:
                 pago_id, inquilino, monto = ultimo_pago
                 await cur.execute("DELETE FROM pagos WHERE id = %s", (pago_id,))
                 await cur.execute("COMMIT")
-                logger.info(f"Pago con ID {pago_id} eliminado.")
-                return inquilino, monto
+                logger.info("Pago con ID %s eliminado.", pago_id)
+                return inquilino, monto, pago_id
             
-            return None, None
+            return None, None, None
 
+@trazar()
 async def deshacer_ultimo_gasto() -> tuple:
     """Elimina el último gasto registrado y devuelve sus detalles de forma atómica."""
     async with pool.acquire() as conn:
@@ -190,11 +229,12 @@ async def deshacer_ultimo_gasto() -> tuple:
                 gasto_id, descripcion, monto = ultimo_gasto
                 await cur.execute("DELETE FROM gastos WHERE id = %s", (gasto_id,))
                 await cur.execute("COMMIT")
-                logger.info(f"Gasto con ID {gasto_id} eliminado.")
+                logger.info("Gasto con ID %s eliminado.", gasto_id)
                 return descripcion, monto
             
             return None, None
 
+@trazar()
 async def delete_pago_by_id(pago_id: int) -> bool:
     """Elimina un pago específico por su ID."""
     async with pool.acquire() as conn:
@@ -202,10 +242,11 @@ async def delete_pago_by_id(pago_id: int) -> bool:
             await cur.execute("DELETE FROM pagos WHERE id = %s", (pago_id,))
             if cur.rowcount > 0:
                 await cur.execute("COMMIT")
-                logger.info(f"Pago con ID {pago_id} eliminado.")
+                logger.info("Pago con ID %s eliminado.", pago_id)
                 return True
             return False
 
+@trazar()
 async def delete_gasto_by_id(gasto_id: int) -> bool:
     """Elimina un gasto específico por su ID."""
     async with pool.acquire() as conn:
@@ -213,12 +254,13 @@ async def delete_gasto_by_id(gasto_id: int) -> bool:
             await cur.execute("DELETE FROM gastos WHERE id = %s", (gasto_id,))
             if cur.rowcount > 0:
                 await cur.execute("COMMIT")
-                logger.info(f"Gasto con ID {gasto_id} eliminado.")
+                logger.info("Gasto con ID %s eliminado.", gasto_id)
                 return True
             return False
 
 # --- Funciones para informes ---
 
+@trazar()
 async def obtener_resumen() -> dict:
     """Calcula el resumen de ingresos, gastos, comisión y neto."""
     async with pool.acquire() as conn:
@@ -244,18 +286,39 @@ async def obtener_resumen() -> dict:
         "ultimos_gastos": ultimos_gastos
     }
 
-async def obtener_informe_mensual(mes: int, anio: int) -> dict:
-    """Calcula el informe mensual de ingresos, gastos, comisión y neto."""
+# Filas de detalle del informe mensual: pagos por período adeudado y gastos por fecha
+_SQL_PAGOS_MES = (
+    "SELECT id, fecha, inquilino, monto FROM pagos "
+    "WHERE COALESCE(mes_alquiler, EXTRACT(MONTH FROM fecha::date)::int) = %s "
+    "AND COALESCE(anio_alquiler, EXTRACT(YEAR FROM fecha::date)::int) = %s ORDER BY id ASC"
+)
+_SQL_GASTOS_MES = (
+    "SELECT id, fecha, descripcion, monto FROM gastos "
+    "WHERE EXTRACT(MONTH FROM fecha::date) = %s AND EXTRACT(YEAR FROM fecha::date) = %s ORDER BY id ASC"
+)
+
+@trazar()
+async def obtener_informe_mensual(mes: int, anio: int, limite_detalle: int | None = None) -> dict:
+    """
+    Calcula el informe mensual de ingresos, gastos, comisión y neto, con cuántas filas
+    hay (`filas_pagos`, `filas_gastos`) y su detalle (`pagos_mes`, `gastos_mes`).
+    Si entre pagos y gastos hay más de `limite_detalle` filas, el detalle no se trae:
+    quien lo necesite puede leerlo en streaming con iterar_detalle_informe.
+    """
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
-            await cur.execute("SELECT SUM(monto) FROM pagos WHERE COALESCE(mes_alquiler, EXTRACT(MONTH FROM fecha::date)::int) = %s AND COALESCE(anio_alquiler, EXTRACT(YEAR FROM fecha::date)::int) = %s", (mes, anio))
-            total_pagos_mes = (await cur.fetchone())[0] or Decimal('0.0')
-            await cur.execute("SELECT SUM(monto) FROM gastos WHERE EXTRACT(MONTH FROM fecha::date) = %s AND EXTRACT(YEAR FROM fecha::date) = %s", (mes, anio))
-            total_gastos_mes = (await cur.fetchone())[0] or Decimal('0.0')
-            await cur.execute("SELECT id, fecha, inquilino, monto FROM pagos WHERE COALESCE(mes_alquiler, EXTRACT(MONTH FROM fecha::date)::int) = %s AND COALESCE(anio_alquiler, EXTRACT(YEAR FROM fecha::date)::int) = %s ORDER BY id ASC", (mes, anio))
-            pagos_mes = await cur.fetchall()
-            await cur.execute("SELECT id, fecha, descripcion, monto FROM gastos WHERE EXTRACT(MONTH FROM fecha::date) = %s AND EXTRACT(YEAR FROM fecha::date) = %s ORDER BY id ASC", (mes, anio))
-            gastos_mes = await cur.fetchall()
+            await cur.execute("SELECT SUM(monto), COUNT(*) FROM pagos WHERE COALESCE(mes_alquiler, EXTRACT(MONTH FROM fecha::date)::int) = %s AND COALESCE(anio_alquiler, EXTRACT(YEAR FROM fecha::date)::int) = %s", (mes, anio))
+            total_pagos_mes, filas_pagos = await cur.fetchone()
+            await cur.execute("SELECT SUM(monto), COUNT(*) FROM gastos WHERE EXTRACT(MONTH FROM fecha::date) = %s AND EXTRACT(YEAR FROM fecha::date) = %s", (mes, anio))
+            total_gastos_mes, filas_gastos = await cur.fetchone()
+            total_pagos_mes = total_pagos_mes or Decimal('0.0')
+            total_gastos_mes = total_gastos_mes or Decimal('0.0')
+            informe = {"filas_pagos": filas_pagos, "filas_gastos": filas_gastos}
+            if limite_detalle is None or filas_pagos + filas_gastos <= limite_detalle:
+                await cur.execute(_SQL_PAGOS_MES, (mes, anio))
+                informe["pagos_mes"] = await cur.fetchall()
+                await cur.execute(_SQL_GASTOS_MES, (mes, anio))
+                informe["gastos_mes"] = await cur.fetchall()
 
     total_comision_mes = total_pagos_mes * Decimal(str(COMMISSION_RATE))
     monto_neto_mes = total_pagos_mes - total_comision_mes - total_gastos_mes
@@ -265,12 +328,29 @@ async def obtener_informe_mensual(mes: int, anio: int) -> dict:
         "total_comision": total_comision_mes,
         "total_gastos": total_gastos_mes,
         "monto_neto": monto_neto_mes,
-        "pagos_mes": pagos_mes,
-        "gastos_mes": gastos_mes
+        **informe
     }
 
+def iterar_detalle_informe(mes: int, anio: int, tabla: str, tamano_lote: int = 2000):
+    """
+    Generador con las filas (id, fecha, texto, monto) de los pagos o gastos del mes,
+    leídas con un cursor del servidor en lotes de `tamano_lote`, de modo que nunca hay
+    más de un lote en memoria. Usa su propia conexión psycopg2 síncrona: debe consumirse
+    fuera del event loop (por ejemplo dentro de asyncio.to_thread).
+    """
+    consulta = {"pagos": _SQL_PAGOS_MES, "gastos": _SQL_GASTOS_MES}[tabla]
+    conn = psycopg2.connect(_construir_dsn())
+    try:
+        with conn.cursor(name=f"detalle_{tabla}") as cur:
+            cur.itersize = tamano_lote
+            cur.execute(consulta, (mes, anio))
+            yield from cur
+    finally:
+        conn.close()
+
 # --- Funciones para Inquilinos ---
 
+@trazar()
 async def crear_inquilino(nombre: str) -> int:
     """Crea un nuevo inquilino en la base de datos."""
     async with pool.acquire() as conn:
@@ -278,9 +358,10 @@ async def crear_inquilino(nombre: str) -> int:
             await cur.execute("INSERT INTO inquilinos (nombre) VALUES (%s) RETURNING id", (nombre,))
             inquilino_id = await cur.fetchone()
             await cur.execute("COMMIT")
-            logger.info(f"Inquilino '{nombre}' creado con ID: {inquilino_id[0]}")
+            logger.info("Inquilino '%s' creado con ID: %s", nombre, inquilino_id[0])
             return inquilino_id[0]
 
+@trazar()
 async def obtener_inquilinos(activos_only: bool = True) -> list:
     """Obtiene una lista de inquilinos con su día de pago. Por defecto, solo los activos."""
     query = "SELECT id, nombre, activo, dia_pago FROM inquilinos"
@@ -293,6 +374,7 @@ async def obtener_inquilinos(activos_only: bool = True) -> list:
             await cur.execute(query)
             return await cur.fetchall()
 
+@trazar()
 async def obtener_inquilino_por_id(inquilino_id: int) -> tuple:
     """Obtiene un inquilino por su ID."""
     async with pool.acquire() as conn:
@@ -300,6 +382,7 @@ async def obtener_inquilino_por_id(inquilino_id: int) -> tuple:
             await cur.execute("SELECT id, nombre, activo, dia_pago FROM inquilinos WHERE id = %s", (inquilino_id,))
             return await cur.fetchone()
 
+@trazar()
 async def cambiar_estado_inquilino(inquilino_id: int, estado: bool) -> bool:
     """Cambia el estado de un inquilino (activo/inactivo)."""
     async with pool.acquire() as conn:
@@ -309,6 +392,7 @@ async def cambiar_estado_inquilino(inquilino_id: int, estado: bool) -> bool:
                 await cur.execute("COMMIT")
             return cur.rowcount > 0
 
+@trazar()
 async def actualizar_dia_pago_inquilino(inquilino_id: int, dia_pago: int) -> bool:
     """Actualiza el día de pago para un inquilino específico."""
     async with pool.acquire() as conn:
@@ -316,10 +400,11 @@ async def actualizar_dia_pago_inquilino(inquilino_id: int, dia_pago: int) -> boo
             await cur.execute("UPDATE inquilinos SET dia_pago = %s WHERE id = %s", (dia_pago, inquilino_id))
             if cur.rowcount > 0:
                 await cur.execute("COMMIT")
-                logger.info(f"Día de pago actualizado para inquilino ID {inquilino_id}.")
+                logger.info("Día de pago actualizado para inquilino ID %s.", inquilino_id)
                 return True
             return False
 
+@trazar()
 async def eliminar_inquilino(inquilino_id: int) -> bool:
     """Elimina un inquilino permanentemente de la base de datos."""
     async with pool.acquire() as conn:
@@ -327,10 +412,11 @@ async def eliminar_inquilino(inquilino_id: int) -> bool:
             await cur.execute("DELETE FROM inquilinos WHERE id = %s", (inquilino_id,))
             if cur.rowcount > 0:
                 await cur.execute("COMMIT")
-                logger.info(f"Inquilino con ID {inquilino_id} eliminado permanentemente.")
+                logger.info("Inquilino con ID %s eliminado permanentemente.", inquilino_id)
                 return True
             return False
 
+@trazar()
 async def obtener_mes_pago_pendiente(inquilino_nombre: str) -> date | None:
     """
     Determina la fecha de pago para el próximo mes pendiente de un inquilino.
@@ -387,6 +473,7 @@ async def obtener_mes_pago_pendiente(inquilino_nombre: str) -> date | None:
 
 # --- Funciones para Borrar Específicos ---
 
+@trazar()
 async def borrar_transaccion(trans_id: int, tipo: str) -> bool:
     """Elimina una transacción por su ID y tipo ('pago' o 'gasto')."""
     async with pool.acquire() as conn:
@@ -395,10 +482,11 @@ async def borrar_transaccion(trans_id: int, tipo: str) -> bool:
             await cur.execute(f"DELETE FROM {tabla} WHERE id = %s", (trans_id,))
             if cur.rowcount > 0:
                 await cur.execute("COMMIT")
-                logger.info(f"Transacción {trans_id} ({tipo}) eliminada.")
+                logger.info("Transacción %s (%s) eliminada.", trans_id, tipo)
                 return True
             return False
 
+@trazar()
 async def obtener_inquilinos_para_recordatorio(dia_objetivo: int = None) -> dict:
     """Devuelve inquilinos activos categorizados en 'vencidos' (mes anterior o día ya pasado) y 'proximos' pendientes de pago."""
     hoy = datetime.now(DO_TZ).date()
@@ -443,6 +531,7 @@ async def obtener_inquilinos_para_recordatorio(dia_objetivo: int = None) -> dict
         "proximos": proximos
     }
 
+@trazar()
 async def obtener_estado_cuenta_inquilino(nombre: str, anio: int) -> dict:
     """Obtiene el historial de pagos y estado financiero de un inquilino en un año."""
     async with pool.acquire() as conn:
@@ -472,6 +561,7 @@ async def obtener_estado_cuenta_inquilino(nombre: str, anio: int) -> dict:
         "fecha_pendiente": fecha_pendiente
     }
 
+@trazar()
 async def obtener_inquilinos_pendientes_mes(mes: int, anio: int) -> list:
     """Devuelve inquilinos activos sin pago registrado para el mes/año adeudado indicado."""
     async with pool.acquire() as conn:
@@ -491,4 +581,217 @@ async def obtener_inquilinos_pendientes_mes(mes: int, anio: int) -> list:
                 """,
                 (mes, anio)
             )
-            return await cur.fetchall()
\ No newline at end of file
+            return await cur.fetchall()
+
+@trazar()
+async def obtener_pagos_periodo(mes: int, anio: int) -> list:
+    """Devuelve en una sola consulta todos los pagos (id, fecha, inquilino, monto) del mes/año adeudado."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT id, fecha, inquilino, monto FROM pagos "
+                "WHERE COALESCE(mes_alquiler, EXTRACT(MONTH FROM fecha::date)::int) = %s "
+                "AND COALESCE(anio_alquiler, EXTRACT(YEAR FROM fecha::date)::int) = %s "
+                "ORDER BY id ASC",
+                (mes, anio)
+            )
+            return await cur.fetchall()
+
+@trazar()
+async def obtener_pago_por_id(pago_id: int) -> tuple | None:
+    """Devuelve (id, fecha, inquilino, monto, mes_alquiler, anio_alquiler) de un pago, o None si no existe."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT id, fecha, inquilino, monto, "
+                "COALESCE(mes_alquiler, EXTRACT(MONTH FROM fecha::date)::int), "
+                "COALESCE(anio_alquiler, EXTRACT(YEAR FROM fecha::date)::int) "
+                "FROM pagos WHERE id = %s",
+                (pago_id,)
+            )
+            return await cur.fetchone()
+
+# --- Persistencia del estado del bot ---
+
+async def cargar_persistencia(tipo: str, clave: str) -> bytes | None:
+    """Devuelve los datos serializados guardados para (tipo, clave), o None si no hay."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT datos FROM bot_persistencia WHERE tipo = %s AND clave = %s", (tipo, clave))
+            fila = await cur.fetchone()
+            return bytes(fila[0]) if fila else None
+
+async def cargar_persistencia_prefijo(prefijo: str) -> list:
+    """Devuelve (tipo, clave, datos) de todas las filas cuyo tipo empieza por `prefijo`."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT tipo, clave, datos FROM bot_persistencia WHERE tipo LIKE %s",
+                (prefijo.replace("%", "\\%").replace("_", "\\_") + "%",)
+            )
+            return [(tipo, clave, bytes(datos)) for tipo, clave, datos in await cur.fetchall()]
+
+async def guardar_persistencia_lote(filas: list, borrados: list) -> None:
+    """
+    Escribe en una sola transacción un lote de filas (tipo, clave, datos) con un único
+    INSERT ... ON CONFLICT de varias filas, y elimina las claves (tipo, clave) de `borrados`.
+    """
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("BEGIN")
+            try:
+                if filas:
+                    valores = ", ".join(["(%s, %s, %s, NOW())"] * len(filas))
+                    parametros = [v for tipo, clave, datos in filas for v in (tipo, clave, psycopg2.Binary(datos))]
+                    await cur.execute(
+                        f"INSERT INTO bot_persistencia (tipo, clave, datos, actualizado) VALUES {valores} "
+                        "ON CONFLICT (tipo, clave) DO UPDATE SET datos = EXCLUDED.datos, actualizado = EXCLUDED.actualizado",
+                        parametros
+                    )
+                if borrados:
+                    valores = ", ".join(["(%s, %s)"] * len(borrados))
+                    parametros = [v for par in borrados for v in par]
+                    await cur.execute(f"DELETE FROM bot_persistencia WHERE (tipo, clave) IN ({valores})", parametros)
+                await cur.execute("COMMIT")
+            except Exception:
+                await cur.execute("ROLLBACK")
+                raise
+
+# --- Cola de envíos pendientes ---
+
+async def guardar_envios_pendientes(filas: list) -> list:
+    """Inserta en un solo INSERT las filas (chat_id, metodo, datos) y devuelve sus ids en el mismo orden."""
+    valores = ", ".join(["(%s, %s, %s)"] * len(filas))
+    parametros = [v for chat_id, metodo, datos in filas for v in (chat_id, metodo, psycopg2.Binary(datos))]
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"INSERT INTO envios_pendientes (chat_id, metodo, datos) VALUES {valores} RETURNING id",
+                parametros
+            )
+            ids = [fila[0] for fila in await cur.fetchall()]
+            await cur.execute("COMMIT")
+            return ids
+
+async def borrar_envios_pendientes(ids: list) -> None:
+    """Elimina los envíos ya resueltos (entregados o descartados)."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("DELETE FROM envios_pendientes WHERE id = ANY(%s)", (list(ids),))
+            await cur.execute("COMMIT")
+
+async def cargar_envios_pendientes() -> list:
+    """Devuelve (id, chat_id, metodo, datos) de los envíos pendientes, en orden de llegada."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT id, chat_id, metodo, datos FROM envios_pendientes ORDER BY id ASC")
+            return [(id_, chat_id, metodo, bytes(datos)) for id_, chat_id, metodo, datos in await cur.fetchall()]
+
+# --- Exportación del Libro Mayor ---
+
+def _copiar_libro_mayor(dsn: str, destino: str, desde: date = None, hasta: date = None, inquilino: str = None) -> int:
+    """
+    Ejecuta COPY ... TO STDOUT sobre una conexión psycopg2 síncrona y escribe el
+    CSV comprimido directamente en `destino`. PostgreSQL envía los datos en
+    bloques, por lo que las filas nunca se materializan en Python.
+    """
+    filtros_pagos, params_pagos = [], []
+    filtros_gastos, params_gastos = [], []
+    if desde:
+        filtros_pagos.append("fecha >= %s")
+        params_pagos.append(desde)
+        filtros_gastos.append("fecha >= %s")
+        params_gastos.append(desde)
+    if hasta:
+        filtros_pagos.append("fecha <= %s")
+        params_pagos.append(hasta)
+        filtros_gastos.append("fecha <= %s")
+        params_gastos.append(hasta)
+    if inquilino:
+        filtros_pagos.append("inquilino = %s")
+        params_pagos.append(inquilino)
+
+    where_pagos = f" WHERE {' AND '.join(filtros_pagos)}" if filtros_pagos else ""
+    consulta = (
+        "SELECT 'pago' AS tipo, id, fecha, inquilino AS concepto, monto, "
+        "COALESCE(mes_alquiler, EXTRACT(MONTH FROM fecha::date)::int) AS mes_alquiler, "
+        "COALESCE(anio_alquiler, EXTRACT(YEAR FROM fecha::date)::int) AS anio_alquiler "
+        f"FROM pagos{where_pagos}"
+    )
+    params = list(params_pagos)
+    # Los gastos no pertenecen a ningún inquilino: se omiten al filtrar por inquilino
+    if not inquilino:
+        where_gastos = f" WHERE {' AND '.join(filtros_gastos)}" if filtros_gastos else ""
+        consulta += (
+            " UNION ALL "
+            "SELECT 'gasto' AS tipo, id, fecha, descripcion AS concepto, monto, NULL::int, NULL::int "
+            f"FROM gastos{where_gastos}"
+        )
+        params += params_gastos
+    consulta += " ORDER BY fecha, tipo, id"
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            # COPY no admite parámetros: se interpolan de forma segura con mogrify
+            consulta_segura = cur.mogrify(consulta, params).decode('utf-8')
+            with gzip.open(destino, 'wb') as archivo:
+                cur.copy_expert(f"COPY ({consulta_segura}) TO STDOUT WITH CSV HEADER", archivo)
+            return cur.rowcount
+    finally:
+        conn.close()
+
+@trazar()
+async def exportar_libro_mayor_csv(destino: str, desde: date = None, hasta: date = None, inquilino: str = None) -> int:
+    """
+    Exporta el historial completo de pagos y gastos (libro mayor) a un CSV
+    comprimido con gzip en `destino`. Los filtros de rango de fechas e
+    inquilino son opcionales. Devuelve el número de filas exportadas.
+    """
+    filas = await asyncio.to_thread(_copiar_libro_mayor, _construir_dsn(), destino, desde, hasta, inquilino)
+    logger.info(f"Libro mayor exportado: {filas} filas")
+    return filas
+
+# --- Carga masiva (datos sintéticos, ver dataset_generator.py) ---
+
+# Tablas y columnas que se cargan con COPY, en orden (los pagos referencian al inquilino por nombre)
+COLUMNAS_CARGA = {
+    "inquilinos": ("nombre", "activo", "dia_pago"),
+    "pagos": ("fecha", "inquilino", "monto", "mes_alquiler", "anio_alquiler"),
+    "gastos": ("fecha", "descripcion", "monto"),
+}
+
+def _cargar_csv(dsn: str, archivos: dict, vaciar: bool = False) -> dict:
+    """
+    Carga con COPY ... FROM STDIN los CSV (con cabecera) de `archivos` ({tabla: ruta}),
+    en una sola transacción: si una tabla falla no queda nada a medias. Con `vaciar`
+    se truncan antes inquilinos, pagos y gastos. Devuelve las filas cargadas por tabla.
+    """
+    conn = psycopg2.connect(dsn)
+    try:
+        filas = {}
+        with conn.cursor() as cur:
+            if vaciar:
+                cur.execute("TRUNCATE inquilinos, pagos, gastos RESTART IDENTITY")
+            for tabla, columnas in COLUMNAS_CARGA.items():
+                if tabla not in archivos:
+                    continue
+                with open(archivos[tabla], 'rb') as archivo:
+                    cur.copy_expert(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN WITH CSV HEADER", archivo)
+                filas[tabla] = cur.rowcount
+            # Estadísticas al día para que los planes de consulta reflejen el nuevo volumen
+            for tabla in filas:
+                cur.execute(f"ANALYZE {tabla}")
+        conn.commit()
+        return filas
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+async def cargar_csv_masivo(archivos: dict, vaciar: bool = False) -> dict:
+    """Carga en bloque los CSV de inquilinos, pagos y gastos (ver `_cargar_csv`)."""
+    filas = await asyncio.to_thread(_cargar_csv, _construir_dsn(), archivos, vaciar)
+    logger.info(f"Carga masiva completada: {filas}")
+    return filas
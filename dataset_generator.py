@@ -0,0 +1,265 @@
+"""
+Generador de datos sintéticos (inquilinos, pagos y gastos) para benchmarks de las
+consultas de database.py y de los generadores de informes, y para pruebas de capacidad.
+
+Con la misma semilla y los mismos parámetros produce exactamente los mismos datos. Cada
+inquilino tiene un perfil de pago (puntual, irregular o moroso) que decide cuánto se
+atrasa, cuándo paga en dos partes y qué meses deja sin pagar; hay altas escalonadas,
+bajas (inquilinos inactivos) y subidas anuales del alquiler.
+
+Uso:
+    python dataset_generator.py --inquilinos 1000 --anios 10 --semilla 7 --vaciar
+    python dataset_generator.py --inquilinos 50 --anios 2 --hasta 2026-06-30 --csv datos/
+
+Sin --csv los datos se cargan con COPY en la base configurada (DATABASE_URL o PG*),
+creando el esquema si hace falta. Con --csv solo se escriben inquilinos.csv, pagos.csv y
+gastos.csv (con cabecera, columnas de database.COLUMNAS_CARGA) para cargarlos aparte.
+"""
+import os
+import csv
+import heapq
+import random
+import asyncio
+import logging
+import argparse
+import calendar
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import database
+
+logger = logging.getLogger(__name__)
+
+NOMBRES = (
+    "Ana", "Carlos", "María", "José", "Luis", "Carmen", "Pedro", "Rosa", "Juan", "Elena",
+    "Miguel", "Lucía", "Rafael", "Isabel", "Manuel", "Teresa", "Francisco", "Patricia", "Ramón", "Julia",
+    "Andrés", "Sofía", "Héctor", "Yolanda", "Víctor", "Marisol", "Ángel", "Daniela", "Félix", "Altagracia",
+)
+APELLIDOS = (
+    "Pérez", "Rodríguez", "Gómez", "Martínez", "Peña", "Santana", "Reyes", "Núñez", "Jiménez", "Castillo",
+    "Díaz", "Báez", "Féliz", "Almonte", "Vásquez", "Mejía", "Rosario", "Tavárez", "Polanco", "Guzmán",
+    "Ureña", "Cabrera", "Medina", "Cruz", "Encarnación", "Hernández", "Batista", "Taveras", "Ortiz", "Lora",
+)
+# Descripción y rango de monto (RD$) de los gastos habituales de un edificio
+GASTOS = (
+    ("Mantenimiento de áreas comunes", 1500, 6000),
+    ("Reparación de plomería", 800, 9000),
+    ("Reparación eléctrica", 700, 12000),
+    ("Factura de luz áreas comunes", 2500, 9000),
+    ("Factura de agua", 600, 2500),
+    ("Servicio de seguridad", 8000, 15000),
+    ("Limpieza", 2000, 5000),
+    ("Jardinería", 1000, 3500),
+    ("Fumigación", 1500, 4500),
+    ("Pintura", 5000, 40000),
+    ("Cerrajería", 500, 3000),
+    ("Recogida de basura", 400, 1200),
+)
+# Perfil: (peso, prob. de atraso, rango de días de atraso, prob. de pago en dos partes, prob. de no pagar el mes)
+PERFILES = {
+    "puntual": (0.55, 0.05, (1, 5), 0.02, 0.0),
+    "irregular": (0.30, 0.35, (3, 25), 0.12, 0.02),
+    "moroso": (0.15, 0.70, (10, 60), 0.30, 0.08),
+}
+# Un pago nunca se adelanta más de estos días a la fecha del mes que cubre
+ADELANTO_MAXIMO_DIAS = 3
+
+
+class _Inquilino:
+    __slots__ = ("nombre", "dia_pago", "perfil", "alta", "baja", "alquiler", "fechas")
+
+    def __init__(self, nombre: str, dia_pago: int, perfil: str, alta: int, baja: int | None, alquiler: Decimal):
+        self.nombre = nombre
+        self.dia_pago = dia_pago
+        self.perfil = perfil
+        self.alta = alta
+        self.baja = baja
+        self.alquiler = alquiler
+        # Fechas ya usadas (no dos pagos del mismo inquilino el mismo día); solo las que aún
+        # pueden coincidir con un pago nuevo, las anteriores se olvidan mes a mes
+        self.fechas: set[date] = set()
+
+
+def _sumar_meses(anio: int, mes: int, meses: int) -> tuple[int, int]:
+    total = anio * 12 + mes - 1 + meses
+    return total // 12, total % 12 + 1
+
+def _dia_del_mes(anio: int, mes: int, dia: int) -> date:
+    return date(anio, mes, min(dia, calendar.monthrange(anio, mes)[1]))
+
+def _nombres_unicos(rng: random.Random, cantidad: int) -> list[str]:
+    """Nombre y dos apellidos; si se repite, se numera (las combinaciones se agotan a partir de ~27.000)."""
+    vistos, nombres = set(), []
+    for _ in range(cantidad):
+        nombre = f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}"
+        base, n = nombre, 2
+        while nombre in vistos:
+            nombre, n = f"{base} {n}", n + 1
+        vistos.add(nombre)
+        nombres.append(nombre)
+    return nombres
+
+def _crear_inquilinos(rng: random.Random, cantidad: int, meses: int, tasa_bajas: float) -> list[_Inquilino]:
+    perfiles, pesos = list(PERFILES), [p[0] for p in PERFILES.values()]
+    inquilinos = []
+    for nombre in _nombres_unicos(rng, cantidad):
+        # Cerca de la mitad ya estaba al inicio del período; el resto entra en cualquier mes
+        alta = 0 if rng.random() < 0.45 else rng.randrange(meses)
+        baja = rng.randrange(alta, meses) if rng.random() < tasa_bajas else None
+        inquilinos.append(_Inquilino(
+            nombre=nombre,
+            dia_pago=rng.choice((1, 1, 5, 5, 10, 15, 15, 20, 25, 30, 31)) if rng.random() < 0.6 else rng.randint(1, 31),
+            perfil=rng.choices(perfiles, pesos)[0],
+            alta=alta,
+            baja=baja,
+            alquiler=Decimal(rng.randrange(8000, 35001, 500)),
+        ))
+    return inquilinos
+
+def _fecha_libre(inquilino: _Inquilino, fecha: date) -> date:
+    while fecha in inquilino.fechas:
+        fecha += timedelta(days=1)
+    inquilino.fechas.add(fecha)
+    return fecha
+
+def _pagos_del_mes(rng: random.Random, inquilino: _Inquilino, anio: int, mes: int) -> list[tuple]:
+    """Filas (fecha, inquilino, monto, mes_alquiler, anio_alquiler) que cubren `mes`/`anio`."""
+    _, prob_atraso, (atraso_min, atraso_max), prob_parcial, prob_impago = PERFILES[inquilino.perfil]
+    if rng.random() < prob_impago:
+        return []
+    vence = _dia_del_mes(anio, mes, inquilino.dia_pago)
+    if rng.random() < prob_atraso:
+        fecha = vence + timedelta(days=rng.randint(atraso_min, atraso_max))
+    else:
+        fecha = vence + timedelta(days=rng.randint(-ADELANTO_MAXIMO_DIAS, 2))
+    if rng.random() < prob_parcial:
+        primera = (inquilino.alquiler * Decimal(rng.randint(40, 70)) / 100).quantize(Decimal("1"))
+        partes = [(fecha, primera), (fecha + timedelta(days=rng.randint(5, 20)), inquilino.alquiler - primera)]
+    else:
+        partes = [(fecha, inquilino.alquiler)]
+    return [(_fecha_libre(inquilino, f), inquilino.nombre, monto, mes, anio) for f, monto in partes]
+
+def generar(directorio: str, semilla: int | None = None, inquilinos: int = 1000, anios: float = 10,
+            gastos_mes: int = 25, hasta: date | None = None, tasa_bajas: float = 0.15) -> dict:
+    """
+    Escribe inquilinos.csv, pagos.csv y gastos.csv en `directorio` y devuelve
+    {tabla: (ruta, filas)}. Cubre los `anios` anteriores a `hasta` (por defecto, hoy);
+    los pagos posteriores a `hasta` quedan pendientes, como en la base real.
+
+    Los pagos se escriben en orden de fecha (como se habrían registrado) sin tenerlos
+    todos en memoria: se generan mes a mes y se retienen en un heap solo hasta que ningún
+    mes posterior puede producir uno anterior.
+    """
+    rng = random.Random(semilla)
+    hasta = hasta or datetime.now(database.DO_TZ).date()
+    meses = max(1, round(anios * 12))
+    anio_inicio, mes_inicio = _sumar_meses(hasta.year, hasta.month, -(meses - 1))
+    lista = _crear_inquilinos(rng, inquilinos, meses, tasa_bajas)
+    rutas = {tabla: os.path.join(directorio, f"{tabla}.csv") for tabla in database.COLUMNAS_CARGA}
+    filas = dict.fromkeys(rutas, 0)
+
+    with open(rutas["inquilinos"], "w", newline="", encoding="utf-8") as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(database.COLUMNAS_CARGA["inquilinos"])
+        for inquilino in lista:
+            escritor.writerow((inquilino.nombre, inquilino.baja is None, inquilino.dia_pago))
+        filas["inquilinos"] = len(lista)
+
+    with open(rutas["pagos"], "w", newline="", encoding="utf-8") as archivo_pagos, \
+            open(rutas["gastos"], "w", newline="", encoding="utf-8") as archivo_gastos:
+        pagos, gastos = csv.writer(archivo_pagos), csv.writer(archivo_gastos)
+        pagos.writerow(database.COLUMNAS_CARGA["pagos"])
+        gastos.writerow(database.COLUMNAS_CARGA["gastos"])
+        pendientes = []  # heap de (fecha, orden, fila)
+        orden = 0
+
+        for indice in range(meses):
+            anio, mes = _sumar_meses(anio_inicio, mes_inicio, indice)
+            # Ningún pago de este mes ni de los siguientes puede caer antes de esta fecha
+            corte = date(anio, mes, 1) - timedelta(days=ADELANTO_MAXIMO_DIAS)
+            for inquilino in lista:
+                if inquilino.alta > indice or (inquilino.baja is not None and inquilino.baja < indice):
+                    continue
+                if inquilino.fechas:
+                    inquilino.fechas = {fecha for fecha in inquilino.fechas if fecha >= corte}
+                # Subida anual en el aniversario de la entrada: 0-8 %, redondeada a 100
+                if indice > inquilino.alta and (indice - inquilino.alta) % 12 == 0:
+                    subida = inquilino.alquiler * Decimal(rng.randint(0, 8)) / 100
+                    inquilino.alquiler = ((inquilino.alquiler + subida) / 100).quantize(Decimal("1")) * 100
+                for fila in _pagos_del_mes(rng, inquilino, anio, mes):
+                    if fila[0] <= hasta:
+                        heapq.heappush(pendientes, (fila[0], orden, fila))
+                        orden += 1
+
+            # Ningún mes posterior puede generar un pago anterior a esta fecha
+            siguiente = date(*_sumar_meses(anio, mes, 1), 1) - timedelta(days=ADELANTO_MAXIMO_DIAS)
+            while pendientes and pendientes[0][0] < siguiente:
+                fecha, _, (_, nombre, monto, mes_alquiler, anio_alquiler) = heapq.heappop(pendientes)
+                pagos.writerow((fecha.isoformat(), nombre, f"{monto:.2f}", mes_alquiler, anio_alquiler))
+                filas["pagos"] += 1
+
+            ultimo_dia = hasta.day if (anio, mes) == (hasta.year, hasta.month) else calendar.monthrange(anio, mes)[1]
+            cantidad = rng.randint(gastos_mes // 2, gastos_mes + gastos_mes // 2) if gastos_mes else 0
+            for dia in sorted(rng.randint(1, ultimo_dia) for _ in range(cantidad)):
+                descripcion, minimo, maximo = rng.choice(GASTOS)
+                gastos.writerow((date(anio, mes, dia).isoformat(), descripcion, f"{rng.randint(minimo, maximo)}.00"))
+                filas["gastos"] += 1
+
+        while pendientes:
+            fecha, _, (_, nombre, monto, mes_alquiler, anio_alquiler) = heapq.heappop(pendientes)
+            pagos.writerow((fecha.isoformat(), nombre, f"{monto:.2f}", mes_alquiler, anio_alquiler))
+            filas["pagos"] += 1
+
+    return {tabla: (rutas[tabla], filas[tabla]) for tabla in rutas}
+
+
+async def _cargar(args, directorio: str) -> None:
+    inicio = time.perf_counter()
+    archivos = generar(directorio, args.semilla, args.inquilinos, args.anios, args.gastos_mes, args.hasta, args.tasa_bajas)
+    generado = time.perf_counter()
+    print(f"Generado en {generado - inicio:.1f} s: " + ", ".join(f"{n} {tabla}" for tabla, (_, n) in archivos.items()))
+    if args.csv:
+        print(f"CSV en {args.csv}")
+        return
+
+    await database.init_pool()
+    try:
+        await database.inicializar_db()
+        filas = await database.cargar_csv_masivo({tabla: ruta for tabla, (ruta, _) in archivos.items()}, vaciar=args.vaciar)
+    finally:
+        await database.close_pool()
+    print(f"Cargado en {time.perf_counter() - generado:.1f} s: " + ", ".join(f"{n} {tabla}" for tabla, n in filas.items()))
+
+
+def _parsear_fecha(texto: str) -> date:
+    try:
+        return datetime.strptime(texto, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Fecha inválida: {texto} (formato AAAA-MM-DD)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera un conjunto de datos sintético y lo carga en bloque.")
+    parser.add_argument("--inquilinos", type=int, default=1000, help="Número de inquilinos.")
+    parser.add_argument("--anios", type=float, default=10, help="Años de historial de pagos y gastos.")
+    parser.add_argument("--gastos-mes", type=int, default=25, help="Gastos por mes (en promedio).")
+    parser.add_argument("--tasa-bajas", type=float, default=0.15, help="Proporción de inquilinos dados de baja.")
+    parser.add_argument("--hasta", type=_parsear_fecha, help="Último día con datos (AAAA-MM-DD); por defecto hoy.")
+    parser.add_argument("--semilla", type=int, default=1, help="Semilla: los mismos parámetros dan los mismos datos.")
+    parser.add_argument("--csv", help="Solo escribe los CSV en este directorio, sin tocar la base.")
+    parser.add_argument("--vaciar", action="store_true", help="Trunca inquilinos, pagos y gastos antes de cargar.")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    try:
+        if args.csv:
+            os.makedirs(args.csv, exist_ok=True)
+            asyncio.run(_cargar(args, args.csv))
+        else:
+            with tempfile.TemporaryDirectory(prefix="alqui_bot_datos_") as temporal:
+                asyncio.run(_cargar(args, temporal))
+    except Exception as e:
+        logger.error(f"No se pudo generar o cargar el conjunto de datos: {e}", exc_info=True)
+        raise SystemExit(1)
@@ -1,68 +1,162 @@
 import io
+from itertools import chain, islice
 from datetime import datetime, date
 from decimal import Decimal
 import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
+from tracing import trazar
 
 MESES_NOMBRES = [
     "", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
     "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
 ]
 
-def exportar_informe_excel(mes: int, anio: int, datos: dict) -> io.BytesIO:
+# En modo write-only openpyxl escribe las columnas (<cols>) antes de la primera
+# fila, por lo que los anchos se estiman sobre este número máximo de filas
+# iniciales de cada hoja; el resto de filas se escribe sin retenerse en memoria.
+FILAS_MUESTRA_ANCHOS = 500
+
+# A partir de estas filas (pagos + gastos) el detalle se lee de la base en streaming y el
+# libro se escribe en un archivo temporal (ver descargar_excel_callback). Es mucho mayor
+# que el umbral del PDF: en modo write-only cada fila cuesta poco más que la tupla leída.
+UMBRAL_EXCEL_GRANDE = 5000
+
+# Colores corporativos
+_HEADER_FILL = PatternFill(start_color="1A365D", end_color="1A365D", fill_type="solid")
+_SUB_HEADER_FILL = PatternFill(start_color="2B6CB0", end_color="2B6CB0", fill_type="solid")
+_ACCENT_FILL = PatternFill(start_color="EDF2F7", end_color="EDF2F7", fill_type="solid")
+_TOTAL_FILL = PatternFill(start_color="E2E8F0", end_color="E2E8F0", fill_type="solid")
+
+_FONT_HEADER = Font(name="Calibri", size=11, bold=True, color="FFFFFF")
+_FONT_BOLD = Font(name="Calibri", size=11, bold=True)
+_FONT_NORMAL = Font(name="Calibri", size=11)
+
+_BORDER_THIN = Border(
+    left=Side(style='thin', color='CBD5E0'),
+    right=Side(style='thin', color='CBD5E0'),
+    top=Side(style='thin', color='CBD5E0'),
+    bottom=Side(style='thin', color='CBD5E0')
+)
+_BORDER_DOUBLE = Border(
+    top=Side(style='thin', color='CBD5E0'),
+    bottom=Side(style='double', color='1A365D')
+)
+
+CURRENCY_FORMAT = '"RD$"#,##0.00'
+DATE_FORMAT = 'DD/MM/YYYY'
+
+def _estilos_compartidos() -> list:
+    """
+    Define los estilos con nombre que comparten todas las celdas del libro.
+    Cada celda referencia uno de estos estilos en lugar de crear su propia
+    combinación de fuente, relleno y borde.
+    """
+    estilos = [
+        NamedStyle(name="alqui_titulo", font=Font(name="Calibri", size=16, bold=True, color="1A365D")),
+        NamedStyle(name="alqui_subtitulo", font=Font(name="Calibri", size=14, bold=True, color="1A365D")),
+        NamedStyle(name="alqui_cabecera_resumen", font=_FONT_HEADER, fill=_HEADER_FILL, alignment=Alignment(horizontal="center")),
+        NamedStyle(name="alqui_cabecera", font=_FONT_HEADER, fill=_SUB_HEADER_FILL, alignment=Alignment(horizontal="center")),
+        NamedStyle(name="alqui_total_etiqueta", font=_FONT_BOLD),
+        NamedStyle(name="alqui_total_monto", font=_FONT_BOLD, border=_BORDER_DOUBLE, number_format=CURRENCY_FORMAT),
+        NamedStyle(name="alqui_neto_etiqueta", font=_FONT_BOLD, fill=_TOTAL_FILL, border=_BORDER_THIN),
+        NamedStyle(name="alqui_neto_monto", font=_FONT_BOLD, fill=_TOTAL_FILL, border=_BORDER_DOUBLE, number_format=CURRENCY_FORMAT),
+    ]
+    # Celdas de detalle, en versión normal y con banda de color alterna
+    for sufijo, fill in (("", None), ("_banda", _ACCENT_FILL)):
+        extra = {"fill": fill} if fill else {}
+        estilos += [
+            NamedStyle(name=f"alqui_texto{sufijo}", font=_FONT_NORMAL, border=_BORDER_THIN, **extra),
+            NamedStyle(name=f"alqui_id{sufijo}", font=_FONT_NORMAL, border=_BORDER_THIN, alignment=Alignment(horizontal="center"), **extra),
+            NamedStyle(name=f"alqui_fecha{sufijo}", font=_FONT_NORMAL, border=_BORDER_THIN, number_format=DATE_FORMAT, **extra),
+            NamedStyle(name=f"alqui_monto{sufijo}", font=_FONT_NORMAL, border=_BORDER_THIN, number_format=CURRENCY_FORMAT, **extra),
+        ]
+    return estilos
+
+def _celda(ws, valor, estilo: str) -> WriteOnlyCell:
+    """Crea una celda de escritura en streaming con un estilo con nombre."""
+    cell = WriteOnlyCell(ws, value=valor)
+    cell.style = estilo
+    return cell
+
+def _actualizar_anchos(anchos: list, valores) -> None:
+    """Actualiza incrementalmente el ancho máximo de cada columna con una fila."""
+    for idx, valor in enumerate(valores):
+        largo = len(str(valor if valor is not None else ''))
+        if largo > anchos[idx]:
+            anchos[idx] = largo
+
+def _aplicar_anchos(ws, anchos: list, columna_inicial: int = 1) -> None:
+    """Fija los anchos de columna (debe llamarse antes de escribir la primera fila)."""
+    for offset, ancho in enumerate(anchos):
+        ws.column_dimensions[get_column_letter(columna_inicial + offset)].width = max(ancho + 3, 14)
+
+def _escribir_hoja_detalle(ws, titulo: str, encabezados: list, filas, etiqueta_total: str) -> None:
+    """
+    Escribe una hoja de detalle (pagos o gastos) en streaming.
+    `filas` puede ser cualquier iterable de tuplas (id, fecha, texto, monto);
+    solo las primeras FILAS_MUESTRA_ANCHOS se retienen para calcular anchos.
+    """
+    filas = iter(filas)
+    muestra = list(islice(filas, FILAS_MUESTRA_ANCHOS))
+
+    anchos = [len(h) for h in encabezados]
+    for f_id, f_fecha, f_texto, f_monto in muestra:
+        fecha_txt = f_fecha.strftime('%d/%m/%Y') if isinstance(f_fecha, (datetime, date)) else f_fecha
+        _actualizar_anchos(anchos, (f_id, fecha_txt, f_texto, f"RD${float(f_monto):,.2f}"))
+    _aplicar_anchos(ws, anchos)
+    ws.sheet_view.showGridLines = True
+
+    ws.append([_celda(ws, titulo, "alqui_subtitulo")])
+    ws.append([])
+    ws.append([_celda(ws, h, "alqui_cabecera") for h in encabezados])
+
+    row_idx = 4
+    for f_id, f_fecha, f_texto, f_monto in chain(muestra, filas):
+        # Banda de color en filas impares, igual que el diseño original
+        sufijo = "_banda" if row_idx % 2 == 1 else ""
+        es_fecha = isinstance(f_fecha, (datetime, date))
+        ws.append([
+            _celda(ws, f_id, f"alqui_id{sufijo}"),
+            _celda(ws, f_fecha if es_fecha else str(f_fecha), f"alqui_fecha{sufijo}" if es_fecha else f"alqui_texto{sufijo}"),
+            _celda(ws, f_texto, f"alqui_texto{sufijo}"),
+            _celda(ws, float(f_monto), f"alqui_monto{sufijo}"),
+        ])
+        row_idx += 1
+
+    # Fila de Total
+    if row_idx > 4:
+        ws.append([
+            None, None,
+            _celda(ws, etiqueta_total, "alqui_total_etiqueta"),
+            _celda(ws, f"=SUM(D4:D{row_idx-1})", "alqui_total_monto"),
+        ])
+
+@trazar()
+def exportar_informe_excel(mes: int, anio: int, datos: dict, destino: str = None):
     """
     Genera un archivo Excel (.xlsx) estructurado con el reporte financiero del mes.
     Contiene pestañas de Resumen, Pagos y Gastos.
-    Devuelve un buffer io.BytesIO listo para ser descargado/enviado.
-    """
-    wb = openpyxl.Workbook()
-    
-    # Colores corporativos
-    header_fill = PatternFill(start_color="1A365D", end_color="1A365D", fill_type="solid")
-    sub_header_fill = PatternFill(start_color="2B6CB0", end_color="2B6CB0", fill_type="solid")
-    accent_fill = PatternFill(start_color="EDF2F7", end_color="EDF2F7", fill_type="solid")
-    total_fill = PatternFill(start_color="E2E8F0", end_color="E2E8F0", fill_type="solid")
-    
-    font_header = Font(name="Calibri", size=11, bold=True, color="FFFFFF")
-    font_title = Font(name="Calibri", size=16, bold=True, color="1A365D")
-    font_bold = Font(name="Calibri", size=11, bold=True)
-    font_normal = Font(name="Calibri", size=11)
-    
-    border_thin = Border(
-        left=Side(style='thin', color='CBD5E0'),
-        right=Side(style='thin', color='CBD5E0'),
-        top=Side(style='thin', color='CBD5E0'),
-        bottom=Side(style='thin', color='CBD5E0')
-    )
-    border_double = Border(
-        top=Side(style='thin', color='CBD5E0'),
-        bottom=Side(style='double', color='1A365D')
-    )
 
-    currency_format = '"RD$"#,##0.00'
-    date_format = 'DD/MM/YYYY'
+    El libro se escribe en modo write-only de openpyxl con estilos con nombre
+    compartidos, de modo que `pagos_mes` y `gastos_mes` pueden ser iteradores
+    y la memoria se mantiene plana aunque el período tenga miles de filas.
+    Si se indica `destino` (ruta de archivo) el libro se guarda en disco y se
+    devuelve la ruta; en caso contrario devuelve un buffer io.BytesIO listo
+    para ser descargado/enviado.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    for estilo in _estilos_compartidos():
+        wb.add_named_style(estilo)
 
     nombre_mes = MESES_NOMBRES[mes] if 1 <= mes <= 12 else str(mes)
 
     # ----------------------------------------------------
     # Pestaña 1: Resumen General
     # ----------------------------------------------------
-    ws_resumen = wb.active
-    ws_resumen.title = "Resumen General"
-    ws_resumen.views.sheetView[0].showGridLines = True
-
-    ws_resumen["B2"] = f"INFORME FINANCIERO MENSUAL — {nombre_mes.upper()} {anio}"
-    ws_resumen["B2"].font = font_title
-
-    ws_resumen["B4"] = "Concepto Financiero"
-    ws_resumen["C4"] = "Monto (RD$)"
-    ws_resumen["B4"].font = font_header
-    ws_resumen["C4"].font = font_header
-    ws_resumen["B4"].fill = header_fill
-    ws_resumen["C4"].fill = header_fill
-    ws_resumen["B4"].alignment = Alignment(horizontal="center")
-    ws_resumen["C4"].alignment = Alignment(horizontal="center")
+    ws_resumen = wb.create_sheet(title="Resumen General")
+    ws_resumen.sheet_view.showGridLines = True
 
     kpis = [
         ("Ingresos Totales (Pagos)", float(datos.get("total_ingresos", 0))),
@@ -71,127 +165,56 @@ def exportar_informe_excel(mes: int, anio: int, datos: dict) -> io.BytesIO:
         ("Monto Neto a Entregar", float(datos.get("monto_neto", 0)))
     ]
 
+    anchos = [len("Concepto Financiero"), len("Monto (RD$)")]
+    for concepto, monto in kpis:
+        _actualizar_anchos(anchos, (concepto, f"{monto:,.2f}"))
+    _aplicar_anchos(ws_resumen, anchos, columna_inicial=2)
+
+    ws_resumen.append([])
+    ws_resumen.append([None, _celda(ws_resumen, f"INFORME FINANCIERO MENSUAL — {nombre_mes.upper()} {anio}", "alqui_titulo")])
+    ws_resumen.append([])
+    ws_resumen.append([
+        None,
+        _celda(ws_resumen, "Concepto Financiero", "alqui_cabecera_resumen"),
+        _celda(ws_resumen, "Monto (RD$)", "alqui_cabecera_resumen"),
+    ])
+
     row_idx = 5
     for concepto, monto in kpis:
-        cell_b = ws_resumen.cell(row=row_idx, column=2, value=concepto)
-        cell_c = ws_resumen.cell(row=row_idx, column=3, value=monto)
-        
-        cell_b.font = font_bold if "Neto" in concepto else font_normal
-        cell_c.font = font_bold if "Neto" in concepto else font_normal
-        cell_c.number_format = currency_format
-        
-        cell_b.border = border_thin
-        cell_c.border = border_thin
-        
         if "Neto" in concepto:
-            cell_b.fill = total_fill
-            cell_c.fill = total_fill
-            cell_c.border = border_double
+            estilo_concepto, estilo_monto = "alqui_neto_etiqueta", "alqui_neto_monto"
         elif row_idx % 2 == 0:
-            cell_b.fill = accent_fill
-            cell_c.fill = accent_fill
-            
+            estilo_concepto, estilo_monto = "alqui_texto_banda", "alqui_monto_banda"
+        else:
+            estilo_concepto, estilo_monto = "alqui_texto", "alqui_monto"
+        ws_resumen.append([None, _celda(ws_resumen, concepto, estilo_concepto), _celda(ws_resumen, monto, estilo_monto)])
         row_idx += 1
 
     # ----------------------------------------------------
     # Pestaña 2: Pagos del Mes
     # ----------------------------------------------------
-    ws_pagos = wb.create_sheet(title="Pagos del Mes")
-    ws_pagos.views.sheetView[0].showGridLines = True
-    
-    ws_pagos["A1"] = f"DETALLE DE INGRESOS — {nombre_mes.upper()} {anio}"
-    ws_pagos["A1"].font = Font(name="Calibri", size=14, bold=True, color="1A365D")
-
-    headers_pagos = ["ID", "Fecha de Pago", "Inquilino", "Monto (RD$)"]
-    for col_idx, header in enumerate(headers_pagos, start=1):
-        cell = ws_pagos.cell(row=3, column=col_idx, value=header)
-        cell.font = font_header
-        cell.fill = sub_header_fill
-        cell.alignment = Alignment(horizontal="center")
-
-    pagos = datos.get("pagos_mes", [])
-    row_idx = 4
-    for pago in pagos:
-        p_id, p_fecha, p_inq, p_monto = pago[0], pago[1], pago[2], float(pago[3])
-        
-        c_id = ws_pagos.cell(row=row_idx, column=1, value=p_id)
-        c_fecha = ws_pagos.cell(row=row_idx, column=2, value=p_fecha if isinstance(p_fecha, (datetime, date)) else str(p_fecha))
-        c_inq = ws_pagos.cell(row=row_idx, column=3, value=p_inq)
-        c_monto = ws_pagos.cell(row=row_idx, column=4, value=p_monto)
-        
-        c_id.alignment = Alignment(horizontal="center")
-        if isinstance(p_fecha, (datetime, date)):
-            c_fecha.number_format = date_format
-        c_monto.number_format = currency_format
-        
-        for col in range(1, 5):
-            ws_pagos.cell(row=row_idx, column=col).border = border_thin
-            if row_idx % 2 == 1:
-                ws_pagos.cell(row=row_idx, column=col).fill = accent_fill
-        row_idx += 1
-
-    # Fila de Total en Pagos
-    if pagos:
-        ws_pagos.cell(row=row_idx, column=3, value="Total Ingresos").font = font_bold
-        total_p = ws_pagos.cell(row=row_idx, column=4, value=f"=SUM(D4:D{row_idx-1})")
-        total_p.font = font_bold
-        total_p.number_format = currency_format
-        total_p.border = border_double
+    _escribir_hoja_detalle(
+        wb.create_sheet(title="Pagos del Mes"),
+        f"DETALLE DE INGRESOS — {nombre_mes.upper()} {anio}",
+        ["ID", "Fecha de Pago", "Inquilino", "Monto (RD$)"],
+        datos.get("pagos_mes", []),
+        "Total Ingresos"
+    )
 
     # ----------------------------------------------------
     # Pestaña 3: Gastos del Mes
     # ----------------------------------------------------
-    ws_gastos = wb.create_sheet(title="Gastos del Mes")
-    ws_gastos.views.sheetView[0].showGridLines = True
-    
-    ws_gastos["A1"] = f"DETALLE DE GASTOS — {nombre_mes.upper()} {anio}"
-    ws_gastos["A1"].font = Font(name="Calibri", size=14, bold=True, color="1A365D")
-
-    headers_gastos = ["ID", "Fecha del Gasto", "Descripción", "Monto (RD$)"]
-    for col_idx, header in enumerate(headers_gastos, start=1):
-        cell = ws_gastos.cell(row=3, column=col_idx, value=header)
-        cell.font = font_header
-        cell.fill = sub_header_fill
-        cell.alignment = Alignment(horizontal="center")
-
-    gastos = datos.get("gastos_mes", [])
-    row_idx = 4
-    for gasto in gastos:
-        g_id, g_fecha, g_desc, g_monto = gasto[0], gasto[1], gasto[2], float(gasto[3])
-        
-        c_id = ws_gastos.cell(row=row_idx, column=1, value=g_id)
-        c_fecha = ws_gastos.cell(row=row_idx, column=2, value=g_fecha if isinstance(g_fecha, (datetime, date)) else str(g_fecha))
-        c_desc = ws_gastos.cell(row=row_idx, column=3, value=g_desc)
-        c_monto = ws_gastos.cell(row=row_idx, column=4, value=g_monto)
-        
-        c_id.alignment = Alignment(horizontal="center")
-        if isinstance(g_fecha, (datetime, date)):
-            c_fecha.number_format = date_format
-        c_monto.number_format = currency_format
-        
-        for col in range(1, 5):
-            ws_gastos.cell(row=row_idx, column=col).border = border_thin
-            if row_idx % 2 == 1:
-                ws_gastos.cell(row=row_idx, column=col).fill = accent_fill
-        row_idx += 1
+    _escribir_hoja_detalle(
+        wb.create_sheet(title="Gastos del Mes"),
+        f"DETALLE DE GASTOS — {nombre_mes.upper()} {anio}",
+        ["ID", "Fecha del Gasto", "Descripción", "Monto (RD$)"],
+        datos.get("gastos_mes", []),
+        "Total Gastos"
+    )
 
-    if gastos:
-        ws_gastos.cell(row=row_idx, column=3, value="Total Gastos").font = font_bold
-        total_g = ws_gastos.cell(row=row_idx, column=4, value=f"=SUM(D4:D{row_idx-1})")
-        total_g.font = font_bold
-        total_g.number_format = currency_format
-        total_g.border = border_double
-
-    # Autoajustar anchos de columna en todas las hojas
-    for sheet in wb.worksheets:
-        for col in sheet.columns:
-            max_len = 0
-            col_letter = get_column_letter(col[0].column)
-            for cell in col:
-                val_str = str(cell.value or '')
-                if len(val_str) > max_len:
-                    max_len = len(val_str)
-            sheet.column_dimensions[col_letter].width = max(max_len + 3, 14)
+    if destino:
+        wb.save(destino)
+        return destino
 
     buffer = io.BytesIO()
     wb.save(buffer)
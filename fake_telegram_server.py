@@ -0,0 +1,295 @@
+"""
+Sustituto local de la Bot API de Telegram para pruebas de extremo a extremo y benchmarks
+sin red. Implementa los métodos que usa el bot (getUpdates, sendMessage, sendPhoto,
+sendDocument, editMessageText, answerCallbackQuery y algunos auxiliares), acepta
+parámetros por query string, formulario, JSON o multipart (archivos subidos), y puede
+añadir latencia y errores (429, 5xx, 400, 403) para probar reintentos.
+
+Uso:
+    python fake_telegram_server.py --puerto 8081 --latencia-ms 40 --tasa-error 0.02
+    TELEGRAM_API_URL=http://127.0.0.1:8081/bot python main.py
+
+Rutas de control para dirigir la prueba desde fuera del proceso:
+    POST /_control/actualizaciones   Encola una actualización (JSON, update_id opcional) para getUpdates.
+    GET  /_control/enviados          Mensajes y archivos enviados por el bot (?chat_id= para filtrar).
+"""
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import itertools
+from collections import Counter, deque
+from email import policy
+from email.parser import BytesParser
+from urllib.parse import parse_qsl
+from http_server import ServidorHTTP, ErrorHTTP
+
+logger = logging.getLogger(__name__)
+
+ID_BOT = 999000001
+METODOS_ENVIO = ("sendMessage", "sendPhoto", "sendDocument", "editMessageText", "answerCallbackQuery")
+# Descripciones con el mismo formato que las de Telegram (python-telegram-bot las traduce a excepciones)
+_ERRORES = {
+    "429": (429, "Too Many Requests: retry after {espera}"),
+    "500": (500, "Internal Server Error"),
+    "502": (502, "Bad Gateway"),
+    "400": (400, "Bad Request: message to edit not found"),
+    "403": (403, "Forbidden: bot was blocked by the user"),
+}
+
+
+def _decodificar(valor):
+    """Los objetos (reply_markup, results...) llegan como JSON dentro de campos de formulario."""
+    if isinstance(valor, str) and valor[:1] in ("{", "["):
+        try:
+            return json.loads(valor)
+        except ValueError:
+            pass
+    return valor
+
+
+class ApiTelegramSimulada:
+    """
+    Estado y respuestas de la Bot API simulada, independiente del transporte: la usan el
+    servidor HTTP de este módulo y el transporte en memoria de load_harness.py.
+
+    - `latencia_ms` ± `variacion_ms` de espera por llamada.
+    - `tasa_error`: probabilidad de responder con uno de `errores` ("429", "500", "502",
+      "400", "403") en los métodos de `metodos_error` (por defecto, los de envío).
+    - Guarda los últimos envíos, los teclados inline recientes de cada chat (para pulsar
+      sus botones) y los resultados de answerInlineQuery.
+    """
+
+    TECLADOS_POR_CHAT = 5
+
+    def __init__(self, latencia_ms: float = 0.0, variacion_ms: float = 0.0, tasa_error: float = 0.0,
+                 errores=("429", "500"), metodos_error=METODOS_ENVIO, espera_429: int = 1,
+                 semilla: int | None = None, max_enviados: int = 10000):
+        for codigo in errores:
+            if codigo not in _ERRORES:
+                raise ValueError(f"Error simulado desconocido: {codigo} (opciones: {', '.join(_ERRORES)})")
+        self.latencia = latencia_ms / 1000
+        self.variacion = variacion_ms / 1000
+        self.tasa_error = tasa_error
+        self.errores = tuple(errores)
+        self.metodos_error = set(metodos_error)
+        self.espera_429 = espera_429
+        self._rng = random.Random(semilla)
+        self.llamadas = Counter()
+        self.errores_inyectados = Counter()
+        self.bytes_subidos = 0
+        self.enviados: deque = deque(maxlen=max_enviados)
+        self.resultados_inline: dict[str, list] = {}
+        self._teclados: dict[int, list] = {}
+        self._ids_mensaje = itertools.count(1)
+        self._ids_actualizacion = itertools.count(1)
+        self._actualizaciones: list[dict] = []
+        self._aviso: asyncio.Event | None = None
+
+    # --- Actualizaciones para getUpdates ---
+
+    def encolar_actualizacion(self, datos: dict) -> int:
+        """Añade una actualización para el próximo getUpdates; devuelve su update_id."""
+        datos = dict(datos)
+        datos.setdefault("update_id", next(self._ids_actualizacion))
+        self._actualizaciones.append(datos)
+        self.despertar()
+        return datos["update_id"]
+
+    def despertar(self) -> None:
+        """Responde ya a los getUpdates en espera (al llegar actualizaciones o al detener el servidor)."""
+        if self._aviso is not None:
+            self._aviso.set()
+
+    async def _get_updates(self, parametros: dict) -> list:
+        offset = int(parametros.get("offset") or 0)
+        limite = int(parametros.get("limit") or 100)
+        fin = time.monotonic() + float(parametros.get("timeout") or 0)
+        if self._aviso is None:
+            self._aviso = asyncio.Event()
+        while True:
+            # Como en Telegram, pedir desde `offset` confirma las anteriores
+            self._actualizaciones = [a for a in self._actualizaciones if a["update_id"] >= offset]
+            restante = fin - time.monotonic()
+            if self._actualizaciones or restante <= 0:
+                return self._actualizaciones[:limite]
+            self._aviso.clear()
+            try:
+                await asyncio.wait_for(self._aviso.wait(), restante)
+            except asyncio.TimeoutError:
+                pass
+            if self._aviso.is_set() and not self._actualizaciones:
+                return []
+
+    # --- Llamadas a la API ---
+
+    async def llamar(self, metodo: str, parametros: dict, archivos: dict | None = None) -> tuple[int, dict]:
+        """Atiende `metodo` y devuelve (estado HTTP, respuesta JSON de la Bot API)."""
+        self.llamadas[metodo] += 1
+        archivos = archivos or {}
+        self.bytes_subidos += sum(len(contenido) for _, contenido in archivos.values())
+        if self.latencia or self.variacion:
+            await asyncio.sleep(max(0.0, self.latencia + self._rng.uniform(-self.variacion, self.variacion)))
+
+        if self.tasa_error and metodo in self.metodos_error and self._rng.random() < self.tasa_error:
+            codigo = self._rng.choice(self.errores)
+            self.errores_inyectados[codigo] += 1
+            estado, descripcion = _ERRORES[codigo]
+            respuesta = {"ok": False, "error_code": estado, "description": descripcion.format(espera=self.espera_429)}
+            if estado == 429:
+                respuesta["parameters"] = {"retry_after": self.espera_429}
+            return estado, respuesta
+
+        parametros = {clave: _decodificar(valor) for clave, valor in parametros.items()}
+        if metodo == "getUpdates":
+            return 200, {"ok": True, "result": await self._get_updates(parametros)}
+        if metodo == "getMe":
+            resultado = {"id": ID_BOT, "is_bot": True, "first_name": "Bot de Pruebas", "username": "alqui_pruebas_bot"}
+        elif metodo in ("sendMessage", "sendPhoto", "sendDocument", "editMessageText"):
+            resultado = self._mensaje(metodo, parametros, archivos)
+        elif metodo == "answerInlineQuery":
+            self.resultados_inline[str(parametros.get("inline_query_id"))] = [
+                r["input_message_content"]["message_text"]
+                for r in parametros.get("results") or [] if "input_message_content" in r
+            ]
+            resultado = True
+        elif metodo in ("answerCallbackQuery", "deleteWebhook", "setWebhook", "setMyCommands", "close", "logOut"):
+            resultado = True
+        else:
+            return 404, {"ok": False, "error_code": 404, "description": "Not Found: method not found"}
+        return 200, {"ok": True, "result": resultado}
+
+    def _mensaje(self, metodo: str, parametros: dict, archivos: dict) -> dict:
+        try:
+            chat_id = int(parametros.get("chat_id", 0))
+        except (TypeError, ValueError):
+            chat_id = 0
+        message_id = int(parametros.get("message_id") or next(self._ids_mensaje))
+        mensaje = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": ID_BOT, "is_bot": True, "first_name": "Bot de Pruebas"},
+        }
+        texto = parametros.get("text") or parametros.get("caption")
+        if texto:
+            mensaje["text" if metodo in ("sendMessage", "editMessageText") else "caption"] = texto
+        teclado = parametros.get("reply_markup")
+        if isinstance(teclado, dict) and "inline_keyboard" in teclado:
+            datos = [b["callback_data"] for fila in teclado["inline_keyboard"] for b in fila if "callback_data" in b]
+            recientes = self._teclados.setdefault(chat_id, [])
+            recientes.append((message_id, datos))
+            del recientes[:-self.TECLADOS_POR_CHAT]
+            mensaje["reply_markup"] = teclado
+        self.enviados.append({
+            "metodo": metodo, "chat_id": chat_id, "message_id": message_id, "texto": texto,
+            "archivos": {campo: {"nombre": nombre, "bytes": len(contenido)} for campo, (nombre, contenido) in archivos.items()},
+        })
+        return mensaje
+
+    def boton(self, chat_id: int, prefijo: str, rng: random.Random) -> tuple[int, str] | None:
+        """(message_id, callback_data) de un botón reciente del chat cuyo callback empieza por `prefijo`."""
+        for message_id, datos in reversed(self._teclados.get(chat_id, [])):
+            candidatos = [d for d in datos if d.startswith(prefijo)]
+            if candidatos:
+                return message_id, rng.choice(candidatos)
+        return None
+
+
+def _leer_multipart(tipo: str, cuerpo: bytes) -> tuple[dict, dict]:
+    """Separa un cuerpo multipart/form-data en (parámetros, {campo: (nombre de archivo, contenido)})."""
+    mensaje = BytesParser(policy=policy.HTTP).parsebytes(f"Content-Type: {tipo}\r\n\r\n".encode("latin-1") + cuerpo)
+    parametros, archivos = {}, {}
+    for parte in mensaje.iter_parts():
+        campo = parte.get_param("name", header="content-disposition")
+        if not campo:
+            continue
+        contenido = parte.get_payload(decode=True) or b""
+        nombre_archivo = parte.get_filename()
+        if nombre_archivo is not None:
+            archivos[campo] = (nombre_archivo, contenido)
+        else:
+            parametros[campo] = contenido.decode(parte.get_content_charset() or "utf-8")
+    return parametros, archivos
+
+
+class ServidorTelegramFalso(ServidorHTTP):
+    """Expone una ApiTelegramSimulada por HTTP en /bot<token>/<método>, como api.telegram.org."""
+
+    nombre = "Bot API simulada"
+    max_cuerpo = 50 * 1024 * 1024  # límite de subida de la Bot API
+
+    def __init__(self, api: ApiTelegramSimulada | None = None, host: str = "127.0.0.1", puerto: int = 8081,
+                 timeout_lectura: float = 10.0):
+        super().__init__(host, puerto, timeout_lectura)
+        self.api = api or ApiTelegramSimulada()
+
+    @property
+    def url_base(self) -> str:
+        """Valor para TELEGRAM_API_URL (Application.builder().base_url)."""
+        return f"http://{self.host}:{self.puerto}/bot"
+
+    async def detener(self, timeout: float = 30.0) -> None:
+        self.api.despertar()  # que los getUpdates en espera respondan ya
+        await super().detener(timeout)
+
+    async def _procesar(self, metodo: str, ruta: str, cabeceras: dict, cuerpo: bytes) -> tuple[int, bytes, str]:
+        ruta, _, query = ruta.partition("?")
+        parametros = dict(parse_qsl(query))
+        tipo = cabeceras.get("content-type", "")
+        archivos = {}
+        try:
+            if tipo.startswith("multipart/form-data"):
+                datos, archivos = _leer_multipart(tipo, cuerpo)
+                parametros.update(datos)
+            elif tipo.startswith("application/json") and cuerpo:
+                parametros.update(json.loads(cuerpo))
+            elif cuerpo:
+                parametros.update(parse_qsl(cuerpo.decode("utf-8")))
+        except Exception as e:
+            raise ErrorHTTP(400, f"Cuerpo inválido: {e}")
+
+        if ruta == "/_control/actualizaciones" and metodo == "POST":
+            estado, respuesta = 200, {"ok": True, "result": self.api.encolar_actualizacion(parametros)}
+        elif ruta == "/_control/enviados":
+            enviados = [e for e in self.api.enviados if "chat_id" not in parametros or str(e["chat_id"]) == parametros["chat_id"]]
+            estado, respuesta = 200, {"ok": True, "result": enviados}
+        elif ruta.startswith("/bot") and ruta.count("/") == 2:
+            estado, respuesta = await self.api.llamar(ruta.rsplit("/", 1)[1], parametros, archivos)
+        else:
+            raise ErrorHTTP(404)
+        return estado, json.dumps(respuesta, ensure_ascii=False).encode("utf-8"), "application/json"
+
+
+async def _servir(args) -> None:
+    api = ApiTelegramSimulada(
+        latencia_ms=args.latencia_ms, variacion_ms=args.variacion_ms, tasa_error=args.tasa_error,
+        errores=args.errores.split(","), espera_429=args.espera_429, semilla=args.semilla,
+    )
+    servidor = ServidorTelegramFalso(api, host=args.host, puerto=args.puerto)
+    await servidor.iniciar()
+    print(f"Bot API simulada en {servidor.url_base} (TELEGRAM_API_URL={servidor.url_base})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await servidor.detener(timeout=5)
+        print(f"Llamadas: {dict(api.llamadas)}; errores inyectados: {dict(api.errores_inyectados)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local que simula la Bot API de Telegram.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8081)
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Latencia añadida a cada llamada.")
+    parser.add_argument("--variacion-ms", type=float, default=0.0, help="Variación aleatoria (±) de la latencia.")
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="Probabilidad de error en los métodos de envío.")
+    parser.add_argument("--errores", default="429,500", help=f"Errores a inyectar, separados por coma ({', '.join(_ERRORES)}).")
+    parser.add_argument("--espera-429", type=int, default=1, help="retry_after de los errores 429, en segundos.")
+    parser.add_argument("--semilla", type=int, help="Semilla de latencias y errores reproducibles.")
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    try:
+        asyncio.run(_servir(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,189 @@
+import math
+import time
+import asyncio
+import functools
+import threading
+import weakref
+from collections import Counter, deque
+from contextvars import ContextVar
+from telegram import Update
+from telegram.ext import ContextTypes, ConversationHandler
+from config import LATENCIAS_VENTANA
+from tracing import trazador
+
+# Grupos donde se registran los TypeHandler de medición: antes y después de todos los demás
+GRUPO_INICIO = -1
+GRUPO_FIN = 1000
+# Etiqueta del agregado de todas las actualizaciones y de las que ningún handler atendió
+ETIQUETA_TOTAL = "(todas)"
+ETIQUETA_SIN_HANDLER = "(sin handler)"
+
+# Instante en que el procesador de actualizaciones recibió la actualización (ver update_processor.py)
+_recepcion: ContextVar[float | None] = ContextVar("recepcion_actualizacion", default=None)
+# Medición en curso de la actualización que procesa esta tarea
+_medicion: ContextVar["_Medicion | None"] = ContextVar("medicion_actualizacion", default=None)
+# Las mismas mediciones por tarea, para consultarlas desde fuera de ella (ver loop_monitor.py)
+_por_tarea: "weakref.WeakKeyDictionary[asyncio.Task, _Medicion]" = weakref.WeakKeyDictionary()
+
+
+class _Medicion:
+    __slots__ = ("inicio", "etiqueta", "update_id", "error")
+
+    def __init__(self, inicio: float, etiqueta: str, update_id: int | None = None):
+        self.inicio = inicio
+        self.etiqueta = etiqueta
+        self.update_id = update_id
+        self.error = False
+
+
+def _percentil(ordenados: list, p: float) -> float:
+    """Percentil `p` (0-100) por rango más cercano sobre una lista ya ordenada."""
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+class RegistroLatencias:
+    """
+    Latencias por handler en memoria, desde que se recibe la actualización hasta que
+    termina su último handler (incluida la última respuesta enviada).
+
+    Por etiqueta se guardan las últimas `ventana` duraciones (percentiles móviles p50,
+    p95 y p99) y los totales de actualizaciones y errores desde el arranque.
+    """
+
+    def __init__(self, ventana: int = 500):
+        self.ventana = ventana
+        self._lock = threading.Lock()
+        self._muestras: dict[str, deque] = {}
+        self._totales = Counter()
+        self._errores = Counter()
+
+    def registrar(self, etiqueta: str, ms: float, error: bool = False) -> None:
+        with self._lock:
+            for clave in (etiqueta, ETIQUETA_TOTAL):
+                muestras = self._muestras.get(clave)
+                if muestras is None:
+                    muestras = self._muestras[clave] = deque(maxlen=self.ventana)
+                muestras.append(ms)
+                self._totales[clave] += 1
+                if error:
+                    self._errores[clave] += 1
+
+    def resumen(self) -> list[dict]:
+        """Devuelve por etiqueta {etiqueta, cantidad, errores, p50, p95, p99, maximo}, de más a menos usada."""
+        with self._lock:
+            copia = {etiqueta: sorted(muestras) for etiqueta, muestras in self._muestras.items()}
+            totales, errores = dict(self._totales), dict(self._errores)
+        filas = [
+            {
+                "etiqueta": etiqueta,
+                "cantidad": totales[etiqueta],
+                "errores": errores.get(etiqueta, 0),
+                "p50": _percentil(ordenados, 50),
+                "p95": _percentil(ordenados, 95),
+                "p99": _percentil(ordenados, 99),
+                "maximo": ordenados[-1],
+            }
+            for etiqueta, ordenados in copia.items()
+        ]
+        filas.sort(key=lambda f: (f["etiqueta"] != ETIQUETA_TOTAL, -f["cantidad"], f["etiqueta"]))
+        return filas
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self._muestras.clear()
+            self._totales.clear()
+            self._errores.clear()
+
+
+def _nombre_callback(handler) -> str:
+    return getattr(handler.callback, "__name__", type(handler).__name__)
+
+
+def _con_etiqueta(callback, etiqueta: str):
+    """Envuelve `callback` para que, al ejecutarse, dé nombre a la actualización en curso."""
+    @functools.wraps(callback)
+    async def envoltura(update, context):
+        medicion = _medicion.get()
+        # Solo el primer handler que atiende la actualización le da nombre
+        if medicion is not None and medicion.etiqueta == ETIQUETA_SIN_HANDLER:
+            medicion.etiqueta = etiqueta
+            trazador.anotar_raiz(handler=etiqueta)
+        return await callback(update, context)
+    envoltura.etiqueta_medicion = etiqueta
+    return envoltura
+
+
+def _etiquetar_handler(handler, prefijo: str = "") -> None:
+    if isinstance(handler, ConversationHandler):
+        prefijo = f"{prefijo}{handler.name or 'conversacion'}."
+        for estado in (handler.entry_points, *handler.states.values(), handler.fallbacks):
+            for interno in estado:
+                _etiquetar_handler(interno, prefijo)
+    elif not hasattr(handler.callback, "etiqueta_medicion"):
+        handler.callback = _con_etiqueta(handler.callback, prefijo + _nombre_callback(handler))
+
+
+def etiquetar_handlers(application) -> None:
+    """
+    Envuelve los callbacks de los handlers registrados (también los de cada
+    ConversationHandler) para que la actualización tome el nombre del que de verdad la
+    atiende: el callback, precedido del nombre de la conversación (ej.
+    "registrar_pago.pago_monto"). Así no hay que repetir check_update de todos los
+    handlers en cada actualización. Llamar después de registrarlos todos.
+    """
+    for grupo, handlers in application.handlers.items():
+        if GRUPO_INICIO < grupo < GRUPO_FIN:
+            for handler in handlers:
+                _etiquetar_handler(handler)
+
+
+def marcar_recepcion() -> None:
+    """Anota el instante de recepción de la actualización que procesa la tarea actual."""
+    _recepcion.set(time.perf_counter())
+
+
+async def iniciar_medicion(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    TypeHandler del grupo GRUPO_INICIO: empieza a medir la actualización. La etiqueta la
+    pone el handler que la atienda (ver etiquetar_handlers); si ninguno, queda sin handler.
+    """
+    inicio = _recepcion.get() or time.perf_counter()
+    _recepcion.set(None)
+    medicion = _Medicion(inicio, ETIQUETA_SIN_HANDLER, getattr(update, "update_id", None))
+    _medicion.set(medicion)
+    tarea = asyncio.current_task()
+    if tarea is not None:
+        _por_tarea[tarea] = medicion
+
+
+async def finalizar_medicion(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """TypeHandler del grupo GRUPO_FIN: corre tras el último handler y registra la duración."""
+    medicion = _medicion.get()
+    if medicion is None:
+        return
+    _medicion.set(None)
+    tarea = asyncio.current_task()
+    if tarea is not None:
+        _por_tarea.pop(tarea, None)
+    registro_latencias.registrar(medicion.etiqueta, (time.perf_counter() - medicion.inicio) * 1000, medicion.error)
+
+
+async def marcar_error_medicion(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Error handler: cuenta la actualización en curso como fallida (los errores de jobs se ignoran)."""
+    medicion = _medicion.get()
+    if medicion is not None:
+        medicion.error = True
+        trazador.anotar_raiz(error=True)
+
+
+def medicion_actual() -> "_Medicion | None":
+    """Medición de la actualización que procesa la tarea actual (para los logs, ver structured_logging.py)."""
+    return _medicion.get()
+
+
+def medicion_de_tarea(tarea: asyncio.Task | None) -> "_Medicion | None":
+    """Medición en curso de la actualización que procesa `tarea` (None si no procesa ninguna)."""
+    return _por_tarea.get(tarea) if tarea is not None else None
+
+
+registro_latencias = RegistroLatencias(LATENCIAS_VENTANA)
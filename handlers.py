@@ -1,4 +1,8 @@
+import asyncio
+import functools
 import logging
+import html
+import re
 import psycopg2
 from psycopg2.errors import UniqueViolation
 import tempfile
@@ -6,7 +10,10 @@ import os
 from io import BytesIO
 from decimal import Decimal, InvalidOperation
 from datetime import date, datetime, timedelta, timezone
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InputFile, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram import (
+    Update, ReplyKeyboardMarkup, KeyboardButton, InputFile, InlineKeyboardMarkup, InlineKeyboardButton,
+    InlineQueryResultArticle, InputTextMessageContent,
+)
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ParseMode
 from telegram.helpers import escape_markdown
@@ -15,13 +22,26 @@ from database import (
     deshacer_ultimo_pago, deshacer_ultimo_gasto, crear_inquilino, obtener_inquilinos,
     cambiar_estado_inquilino, obtener_inquilino_por_id, delete_pago_by_id, delete_gasto_by_id,
     obtener_inquilinos_para_recordatorio, actualizar_dia_pago_inquilino, obtener_mes_pago_pendiente,
-    eliminar_inquilino, obtener_estado_cuenta_inquilino, obtener_inquilinos_pendientes_mes
+    eliminar_inquilino, obtener_estado_cuenta_inquilino, obtener_inquilinos_pendientes_mes,
+    exportar_libro_mayor_csv, obtener_pagos_periodo, obtener_pago_por_id, iterar_detalle_informe
 )
-from config import AUTHORIZED_USERS
-from pdf_generator import crear_informe_pdf
+from config import AUTHORIZED_USERS, RECIBOS_LOTE_WORKERS, INQUILINOS_MAX_BOTONES
+from pdf_generator import crear_informe_pdf, es_informe_grande
 from chart_generator import generar_grafico_resumen, generar_grafico_mensual
-from receipt_generator import crear_recibo_pdf, crear_recibo_png
-from export_generator import exportar_informe_excel
+from receipt_generator import crear_recibo_pdf, crear_recibo_png, crear_recibos_lote_pdf, crear_recibos_lote_zip, VERSION_RECIBO
+from export_generator import exportar_informe_excel, UMBRAL_EXCEL_GRANDE
+from artifact_store import obtener_almacen
+from receipt_cache import cache_prerender
+from image_optimizer import vista_previa
+from outbound_queue import cola_salida
+from tenant_index import (
+    indice_inquilinos, extraer_id_seleccion, separar_flujo, texto_seleccion,
+    FLUJO_PAGO, FLUJO_ESTADO_CUENTA, FLUJO_DIA_PAGO,
+)
+from handler_timing import registro_latencias
+from loop_monitor import monitor_loop
+from update_profiler import perfilador
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +59,8 @@ MENU = ConversationHandler.END
     INQUILINO_ESTADO_CUENTA_SELECT
 ) = range(23)
 
+MESES_NOMBRES = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+
 # === Zona Horaria ===
 DO_TZ = timezone(timedelta(hours=-4)) # República Dominicana
 
@@ -134,6 +156,7 @@ async def _save_transaction(update: Update, context: ContextTypes.DEFAULT_TYPE,
                     'monto': str(monto),
                     'periodo': p_str
                 }
+                _programar_prerender_recibo(context, context.user_data['ultimo_recibo'])
                 mensaje = (
                     f"✅ Pago registrado correctamente:\n"
                     f"📅 Fecha de Pago Real: {md(fecha_registro.strftime('%d/%m/%Y'))}\n"
@@ -166,8 +189,8 @@ async def _save_transaction(update: Update, context: ContextTypes.DEFAULT_TYPE,
             if tipo == 'pago':
                 recibo_buttons = InlineKeyboardMarkup([
                     [
-                        InlineKeyboardButton("📄 Descargar PDF", callback_data="dl_recibo_pdf"),
-                        InlineKeyboardButton("🖼️ Descargar Imagen (PNG)", callback_data="dl_recibo_png")
+                        InlineKeyboardButton("📄 Descargar PDF", callback_data=f"dl_recibo_pdf_{pago_id}"),
+                        InlineKeyboardButton("🖼️ Descargar Imagen (PNG)", callback_data=f"dl_recibo_png_{pago_id}")
                     ]
                 ])
                 await update.message.reply_text(
@@ -175,7 +198,7 @@ async def _save_transaction(update: Update, context: ContextTypes.DEFAULT_TYPE,
                     parse_mode=ParseMode.MARKDOWN_V2,
                     reply_markup=recibo_buttons
                 )
-            logger.info(f"{tipo.capitalize()} registrado exitosamente para {detalle}")
+            logger.info("%s registrado exitosamente para %s", tipo.capitalize(), detalle)
 
         except UniqueViolation as e:
             # ✅ ARREGLADO: Mensaje dinámico según el tipo de transacción
@@ -223,7 +246,7 @@ async def _save_transaction(update: Update, context: ContextTypes.DEFAULT_TYPE,
             del context.user_data['detalle']
         if 'fecha_custom' in context.user_data:
             del context.user_data['fecha_custom']
-        logger.debug(f"Datos de usuario limpios después de registrar {tipo}")
+        logger.debug("Datos de usuario limpios después de registrar %s", tipo)
     
     # ✅ CORREGIDO: NO retornar nada - solo await
 
@@ -245,14 +268,60 @@ async def volver_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     await update.message.reply_text("Operación cancelada. Volviendo al menú principal.", reply_markup=create_main_menu_keyboard())
     return MENU
 
+# === Búsqueda Inline de Inquilinos ===
+def _boton_buscar_inquilino(flujo: str) -> InlineKeyboardButton:
+    """Botón que abre '@bot <flujo>: ' en el chat para buscar un inquilino por nombre desde `flujo`."""
+    return InlineKeyboardButton("🔎 Buscar", switch_inline_query_current_chat=f"{flujo}: ")
+
+async def _inquilino_desde_busqueda(update: Update) -> tuple | None:
+    """Devuelve el inquilino del texto '👤 Nombre (<flujo> #id)' enviado desde la búsqueda inline."""
+    inquilino_id = extraer_id_seleccion(update.message.text)
+    inquilino = await obtener_inquilino_por_id(inquilino_id) if inquilino_id is not None else None
+    if not inquilino:
+        await update.message.reply_text("❌ No se encontró el inquilino. Vuelve a buscarlo con 🔎 Buscar.")
+    return inquilino
+
+async def buscar_inquilino_inline(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Responde a '@bot [<flujo>: ]<nombre>' con los inquilinos que coinciden, desde el índice
+    en memoria. Las consultas inline no llevan chat ni estado de la conversación: el flujo
+    que abrió la búsqueda va en la consulta y decide qué inquilinos se ofrecen (en el de
+    pago, solo los activos, como sus botones) y qué conversación acepta el resultado.
+    """
+    consulta = update.inline_query
+    if consulta.from_user.id not in AUTHORIZED_USERS:
+        await consulta.answer([], cache_time=300, is_personal=True)
+        return
+    flujo, texto = separar_flujo(consulta.query)
+    try:
+        await indice_inquilinos.asegurar_cargado(obtener_inquilinos)
+        resultados = []
+        for inquilino_id, nombre, activo, dia_pago in indice_inquilinos.buscar(texto, limite=20, solo_activos=flujo == FLUJO_PAGO):
+            descripcion = "✅ Activo" if activo else "❌ Inactivo"
+            descripcion += f" • Día de pago: {dia_pago}" if dia_pago else " • Sin día de pago"
+            resultados.append(InlineQueryResultArticle(
+                id=str(inquilino_id),
+                title=nombre,
+                description=descripcion,
+                input_message_content=InputTextMessageContent(texto_seleccion(nombre, inquilino_id, flujo)),
+            ))
+        await consulta.answer(resultados, cache_time=5, is_personal=True)
+    except psycopg2.Error as e:
+        logger.error(f"Error de DB en la búsqueda inline de inquilinos: {e}", exc_info=True)
+    except Exception as e:
+        logger.error(f"Error en la búsqueda inline de inquilinos: {e}", exc_info=True)
+
 # === Flujo Registrar Pago ===
 async def pago_inicio(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Inicia el flujo de registrar pago - Muestra lista de inquilinos."""
     inquilinos = await obtener_inquilinos(activos_only=True)
     
     keyboard = []
-    for inquilino in inquilinos:
-        keyboard.append([InlineKeyboardButton(inquilino[1], callback_data=f"pago_tenant_{inquilino[0]}")])
+    if len(inquilinos) <= INQUILINOS_MAX_BOTONES:
+        for inquilino in inquilinos:
+            keyboard.append([InlineKeyboardButton(inquilino[1], callback_data=f"pago_tenant_{inquilino[0]}")])
+    if inquilinos:
+        keyboard.append([_boton_buscar_inquilino(FLUJO_PAGO)])
     keyboard.append([InlineKeyboardButton("🔤 Otro (Nombre personalizado)", callback_data="pago_otro")])
     keyboard.append([InlineKeyboardButton("❌ Cancelar", callback_data="pago_cancelar")])
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -298,6 +367,25 @@ async def pago_select_inquilino(update: Update, context: ContextTypes.DEFAULT_TY
         await context.bot.send_message(chat_id=query.message.chat_id, text="Ahora, escribe el monto del pago (ej: 3000):", reply_markup=create_cancel_keyboard())
         return PAGO_MONTO
 
+async def pago_inquilino_buscado(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Selección del inquilino del pago desde la búsqueda inline ('👤 Nombre (pago #id)')."""
+    inquilino = await _inquilino_desde_busqueda(update)
+    if not inquilino:
+        return PAGO_SELECT_INQUILINO
+    if not inquilino[2]:
+        await update.message.reply_text(
+            f"❌ {inquilino[1]} está inactivo. Selecciona un inquilino activo o reactívalo desde 'Gestionar Inquilinos'."
+        )
+        return PAGO_SELECT_INQUILINO
+
+    context.user_data['detalle'] = inquilino[1]
+    await update.message.reply_text(
+        f"✅ Inquilino seleccionado: *{md(inquilino[1])}*\nAhora, escribe el monto del pago \\(ej: 3000\\):",
+        parse_mode=ParseMode.MARKDOWN_V2,
+        reply_markup=create_cancel_keyboard()
+    )
+    return PAGO_MONTO
+
 async def pago_nombre_otro(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handler para ingresar nombre personalizado de pagador."""
     nombre = update.message.text.strip()
@@ -456,44 +544,186 @@ async def gasto_mes(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await _save_transaction(update, context, 'gasto')
     return MENU
 
+def _clave_recibo(pago_id: int, formato: str) -> str:
+    """Clave del recibo en el almacén de artefactos (incluye la versión del diseño)."""
+    return f"recibo_{pago_id}_v{VERSION_RECIBO}.{formato}"
+
+def _datos_recibo_desde_fila(fila: tuple) -> dict:
+    """Convierte la fila de obtener_pago_por_id al formato de `ultimo_recibo`."""
+    pago_id, fecha, inquilino, monto, mes_alquiler, anio_alquiler = fila
+    return {
+        'id': pago_id,
+        'fecha': fecha.strftime('%Y-%m-%d') if isinstance(fecha, (date, datetime)) else str(fecha),
+        'inquilino': inquilino,
+        'monto': str(monto),
+        'periodo': f"{MESES_NOMBRES[mes_alquiler]} {anio_alquiler}"
+    }
+
+def _renderizar_recibo(formato: str, recibo_data: dict) -> bytes:
+    """Genera el recibo en el formato indicado a partir de los datos de `ultimo_recibo`."""
+    crear = crear_recibo_pdf if formato == 'pdf' else crear_recibo_png
+    buffer = crear(recibo_data['id'], recibo_data['fecha'], recibo_data['inquilino'], Decimal(recibo_data['monto']), recibo_data.get('periodo'))
+    return buffer.getvalue()
+
+def _prerenderizar_recibo(recibo_data: dict) -> tuple:
+    """Renderiza ambos formatos del recibo (se ejecuta en un hilo). Devuelve (recibo_data, {formato: bytes})."""
+    return recibo_data, {formato: _renderizar_recibo(formato, recibo_data) for formato in ('pdf', 'png')}
+
+def _guardar_recibos(recibo_data: dict, archivos: dict) -> None:
+    almacen = obtener_almacen()
+    for formato, contenido in archivos.items():
+        almacen.guardar(_clave_recibo(recibo_data['id'], formato), contenido, recibo_data)
+
+async def _prerenderizar_y_guardar_recibo(recibo_data: dict) -> tuple:
+    """
+    Prerenderiza el recibo y lo guarda una sola vez en el almacén. Si el pago se borra
+    mientras tanto, la tarea se cancela (invalidar_recibos_pago) antes de llegar a guardarlo.
+    """
+    recibo_data, archivos = await asyncio.to_thread(_prerenderizar_recibo, recibo_data)
+    try:
+        await asyncio.to_thread(_guardar_recibos, recibo_data, archivos)
+    except Exception as e:
+        logger.warning(f"No se pudieron guardar los recibos prerenderizados del pago {recibo_data['id']}: {e}")
+    return recibo_data, archivos
+
+def _registrar_fallo_prerender(pago_id: int, tarea: asyncio.Task) -> None:
+    """Recupera el error de un prerenderizado aunque nadie llegue a esperar la tarea."""
+    if not tarea.cancelled() and tarea.exception() is not None:
+        logger.warning(f"Falló el prerenderizado del recibo {pago_id}: {tarea.exception()}")
+
+def _programar_prerender_recibo(context: ContextTypes.DEFAULT_TYPE, recibo_data: dict) -> None:
+    """
+    Lanza en segundo plano el renderizado de los recibos de un pago recién guardado,
+    ya que casi siempre se descargan a continuación.
+    """
+    if not cache_prerender.activa:
+        return
+    try:
+        tarea = context.application.create_task(_prerenderizar_y_guardar_recibo(dict(recibo_data)))
+        tarea.add_done_callback(functools.partial(_registrar_fallo_prerender, recibo_data['id']))
+        cache_prerender.programar(recibo_data['id'], tarea)
+    except Exception as e:
+        logger.warning(f"No se pudo programar el prerenderizado del recibo {recibo_data.get('id')}: {e}")
+
+def invalidar_recibos_pago(pago_id: int) -> None:
+    """Elimina del almacén los recibos guardados de un pago borrado."""
+    cache_prerender.descartar(pago_id)
+    try:
+        obtener_almacen().invalidar(_clave_recibo(pago_id, 'pdf'), _clave_recibo(pago_id, 'png'))
+    except Exception as e:
+        logger.warning(f"No se pudieron invalidar los recibos del pago {pago_id}: {e}")
+
 async def descargar_recibo_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Handler para botones inline de descarga de comprobante PDF / PNG."""
+    """
+    Handler para botones inline de descarga de comprobante PDF / PNG.
+    El callback `dl_recibo_<formato>_<pago_id>` funciona para cualquier pago histórico:
+    el recibo se sirve desde el almacén de artefactos y, si no está, se regenera a partir
+    del pago en la base de datos. Los botones antiguos sin id usan `ultimo_recibo`.
+    """
     query = update.callback_query
     await query.answer()
     data = query.data
 
-    recibo_data = context.user_data.get('ultimo_recibo')
-    if not recibo_data:
-        await query.edit_message_text("❌ Los datos del recibo han expirado o ya no están disponibles.")
+    match = re.fullmatch(r"dl_recibo_(pdf|png)(?:_(\d+))?", data or "")
+    if not match:
         return
+    formato = match.group(1)
+    ultimo_recibo = context.user_data.get('ultimo_recibo')
 
-    pago_id = recibo_data['id']
-    fecha_str = recibo_data['fecha']
-    inquilino = recibo_data['inquilino']
-    monto = Decimal(recibo_data['monto'])
-    periodo = recibo_data.get('periodo')
+    if match.group(2):
+        pago_id = int(match.group(2))
+        recibo_data = ultimo_recibo if ultimo_recibo and ultimo_recibo.get('id') == pago_id else None
+    else:
+        if not ultimo_recibo:
+            await query.edit_message_text("❌ Los datos del recibo han expirado o ya no están disponibles.")
+            return
+        recibo_data = ultimo_recibo
+        pago_id = recibo_data['id']
 
     try:
-        if data == "dl_recibo_pdf":
-            pdf_buffer = crear_recibo_pdf(pago_id, fecha_str, inquilino, monto, periodo)
+        almacen = obtener_almacen()
+        clave = _clave_recibo(pago_id, formato)
+        # 1) Prerenderizado en segundo plano tras registrar el pago (ya guardado en el
+        # almacén al terminar), 2) almacén en disco, 3) regenerar a partir de la fila del pago
+        encontrado = await cache_prerender.obtener(pago_id, formato)
+        if encontrado:
+            contenido, recibo_data = encontrado
+        else:
+            encontrado = await asyncio.to_thread(almacen.obtener, clave)
+            if encontrado:
+                contenido, recibo_data = encontrado
+        if not encontrado:
+            if recibo_data is None:
+                fila = await obtener_pago_por_id(pago_id)
+                if not fila:
+                    await query.edit_message_text(f"❌ El pago #{pago_id:04d} ya no existe.")
+                    return
+                recibo_data = _datos_recibo_desde_fila(fila)
+            contenido = await asyncio.to_thread(_renderizar_recibo, formato, recibo_data)
+            await asyncio.to_thread(almacen.guardar, clave, contenido, recibo_data)
+
+        fecha_str = recibo_data['fecha']
+        inquilino = recibo_data['inquilino']
+        monto = Decimal(recibo_data['monto'])
+        nombre_archivo = f"Recibo_{inquilino.replace(' ', '_')}_{fecha_str}.{formato}"
+        if formato == 'pdf':
             await context.bot.send_document(
                 chat_id=query.message.chat_id,
-                document=InputFile(pdf_buffer, filename=f"Recibo_{inquilino.replace(' ', '_')}_{fecha_str}.pdf"),
+                document=InputFile(BytesIO(contenido), filename=nombre_archivo),
                 caption=f"📄 <b>Comprobante PDF #{pago_id:04d}</b>\nInquilino: {inquilino}\nMonto: {format_currency(monto)}",
                 parse_mode=ParseMode.HTML
             )
-        elif data == "dl_recibo_png":
-            png_buffer = crear_recibo_png(pago_id, fecha_str, inquilino, monto, periodo)
+        else:
+            # El PNG original queda en el almacén; en el chat se envía la vista previa configurada
+            foto, extension = await asyncio.to_thread(vista_previa, BytesIO(contenido), "recibo_png")
             await context.bot.send_photo(
                 chat_id=query.message.chat_id,
-                photo=InputFile(png_buffer, filename=f"Recibo_{inquilino.replace(' ', '_')}_{fecha_str}.png"),
+                photo=InputFile(foto, filename=f"{nombre_archivo.rsplit('.', 1)[0]}.{extension}"),
                 caption=f"🖼️ <b>Comprobante Imagen #{pago_id:04d}</b>\nInquilino: {inquilino}\nMonto: {format_currency(monto)}",
                 parse_mode=ParseMode.HTML
             )
+    except psycopg2.Error as e:
+        logger.error(f"Error de base de datos al buscar el pago del recibo ({data}): {e}", exc_info=True)
+        await context.bot.send_message(chat_id=query.message.chat_id, text="❌ Hubo un error con la base de datos al buscar el pago.")
     except Exception as e:
         logger.error(f"Error generando recibo ({data}): {e}", exc_info=True)
         await context.bot.send_message(chat_id=query.message.chat_id, text="❌ Ocurrió un error al generar el archivo del comprobante.")
 
+async def recibo_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handler de /recibo <id> - Ofrece la descarga del recibo de cualquier pago registrado."""
+    try:
+        pago_id = int(context.args[0])
+    except (IndexError, ValueError, TypeError):
+        await update.message.reply_text("❌ Uso: /recibo <id del pago>\nEjemplo: /recibo 15")
+        return
+
+    try:
+        fila = await obtener_pago_por_id(pago_id)
+    except psycopg2.Error as e:
+        logger.error(f"Error de base de datos al buscar el pago {pago_id}: {e}", exc_info=True)
+        await update.message.reply_text("❌ Hubo un error con la base de datos al buscar el pago.")
+        return
+    if not fila:
+        await update.message.reply_text(f"❌ No existe un pago con el id {pago_id}.")
+        return
+
+    recibo_data = _datos_recibo_desde_fila(fila)
+    recibo_buttons = InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton("📄 Descargar PDF", callback_data=f"dl_recibo_pdf_{pago_id}"),
+            InlineKeyboardButton("🖼️ Descargar Imagen (PNG)", callback_data=f"dl_recibo_png_{pago_id}")
+        ]
+    ])
+    await update.message.reply_text(
+        f"📄 <b>Comprobante de Pago #{pago_id:04d}</b>\n"
+        f"Inquilino: {recibo_data['inquilino']}\n"
+        f"Monto: {format_currency(Decimal(recibo_data['monto']))}\n"
+        f"Período: {recibo_data['periodo']}\n"
+        "¿En qué formato deseas el recibo?",
+        parse_mode=ParseMode.HTML,
+        reply_markup=recibo_buttons
+    )
+
 # === Flujo Gestionar Inquilinos ===
 def create_inquilinos_menu_keyboard() -> ReplyKeyboardMarkup:
     """Crea el teclado del menú de inquilinos."""
@@ -535,6 +765,7 @@ async def add_inquilino_save(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     try:
         await crear_inquilino(nombre)
+        indice_inquilinos.invalidar()
         await update.message.reply_text(f"✅ Inquilino '{nombre}' añadido correctamente.", reply_markup=create_inquilinos_menu_keyboard())
         return INQUILINO_MENU
     except UniqueViolation:
@@ -581,14 +812,49 @@ async def estado_cuenta_prompt(update: Update, context: ContextTypes.DEFAULT_TYP
         return INQUILINO_MENU
     
     keyboard = []
-    for i in inquilinos:
-        estado = "✅" if i[2] else "❌"
-        keyboard.append([InlineKeyboardButton(f"{estado} {i[1]}", callback_data=f"ec_{i[1]}")])
+    if len(inquilinos) <= INQUILINOS_MAX_BOTONES:
+        for i in inquilinos:
+            estado = "✅" if i[2] else "❌"
+            keyboard.append([InlineKeyboardButton(f"{estado} {i[1]}", callback_data=f"ec_{i[1]}")])
+    keyboard.append([_boton_buscar_inquilino(FLUJO_ESTADO_CUENTA)])
     keyboard.append([InlineKeyboardButton("❌ Cancelar", callback_data="cancel_inquilino")])
     
     await update.message.reply_text("Selecciona el inquilino para ver su Estado de Cuenta:", reply_markup=InlineKeyboardMarkup(keyboard))
     return INQUILINO_ESTADO_CUENTA_SELECT
 
+async def _mensaje_estado_cuenta(nombre: str) -> str | None:
+    """Construye el estado de cuenta (MarkdownV2) del año en curso, o None si no hay datos del inquilino."""
+    anio = datetime.now(DO_TZ).year
+    ec = await obtener_estado_cuenta_inquilino(nombre, anio)
+    if not ec or not ec.get("inquilino"):
+        return None
+    
+    inq = ec["inquilino"]
+    pagos = ec.get("pagos", [])
+    total_pagado = ec.get("total_pagado", Decimal('0.0'))
+    dia_pago = inq.get("dia_pago")
+    fecha_pend = ec.get("fecha_pendiente")
+
+    mensaje = f"📑 *ESTADO DE CUENTA: {escape_markdown(inq['nombre'], 2)}*\n"
+    mensaje += f"📅 *Año:* {anio}\n"
+    mensaje += f"📌 *Estado:* {'✅ Activo' if inq['activo'] else '❌ Inactivo'}\n"
+    if dia_pago:
+        mensaje += f"🗓️ *Día de pago:* {dia_pago} de cada mes\n"
+    if fecha_pend:
+        meses_nombres = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+        nombre_mes = meses_nombres[fecha_pend.month]
+        mensaje += f"⏳ *Próximo período pendiente:* {nombre_mes} {fecha_pend.year}\n"
+    mensaje += f"\n💰 *Total Pagado en {anio}:* {escape_markdown(format_currency(total_pagado), 2)}\n\n"
+    mensaje += "*Historial de Pagos del Año:*\n"
+    if not pagos:
+        mensaje += rf"_No hay pagos registrados este año\._" + "\n"
+    else:
+        for p in pagos[-10:]: # últimos 10
+            f_str = p[1].strftime('%d/%m/%Y') if hasattr(p[1], 'strftime') else str(p[1])
+            mensaje += rf"▪️ {f_str} \— {escape_markdown(format_currency(p[2]), 2)}" + "\n"
+
+    return mensaje
+
 async def estado_cuenta_show(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Muestra el estado de cuenta del inquilino seleccionado."""
     query = update.callback_query
@@ -601,41 +867,29 @@ async def estado_cuenta_show(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     if data.startswith("ec_"):
         nombre = data.split("_", 1)[1]
-        anio = datetime.now(DO_TZ).year
-        ec = await obtener_estado_cuenta_inquilino(nombre, anio)
-        if not ec or not ec.get("inquilino"):
+        mensaje = await _mensaje_estado_cuenta(nombre)
+        if mensaje is None:
             await query.edit_message_text("❌ No se encontró información para el inquilino.")
             return INQUILINO_MENU
-        
-        inq = ec["inquilino"]
-        pagos = ec.get("pagos", [])
-        total_pagado = ec.get("total_pagado", Decimal('0.0'))
-        dia_pago = inq.get("dia_pago")
-        fecha_pend = ec.get("fecha_pendiente")
-
-        mensaje = f"📑 *ESTADO DE CUENTA: {escape_markdown(inq['nombre'], 2)}*\n"
-        mensaje += f"📅 *Año:* {anio}\n"
-        mensaje += f"📌 *Estado:* {'✅ Activo' if inq['activo'] else '❌ Inactivo'}\n"
-        if dia_pago:
-            mensaje += f"🗓️ *Día de pago:* {dia_pago} de cada mes\n"
-        if fecha_pend:
-            meses_nombres = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
-            nombre_mes = meses_nombres[fecha_pend.month]
-            mensaje += f"⏳ *Próximo período pendiente:* {nombre_mes} {fecha_pend.year}\n"
-        mensaje += f"\n💰 *Total Pagado en {anio}:* {escape_markdown(format_currency(total_pagado), 2)}\n\n"
-        mensaje += "*Historial de Pagos del Año:*\n"
-        if not pagos:
-            mensaje += rf"_No hay pagos registrados este año\._" + "\n"
-        else:
-            for p in pagos[-10:]: # últimos 10
-                f_str = p[1].strftime('%d/%m/%Y') if hasattr(p[1], 'strftime') else str(p[1])
-                mensaje += rf"▪️ {f_str} \— {escape_markdown(format_currency(p[2]), 2)}" + "\n"
 
         await query.edit_message_text(mensaje, parse_mode=ParseMode.MARKDOWN_V2)
         await context.bot.send_message(chat_id=query.message.chat_id, text="¿Qué más deseas hacer en Gestión de Inquilinos?", reply_markup=create_inquilinos_menu_keyboard())
         return INQUILINO_MENU
     return INQUILINO_MENU
 
+async def estado_cuenta_buscado(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Estado de cuenta del inquilino elegido desde la búsqueda inline."""
+    inquilino = await _inquilino_desde_busqueda(update)
+    if not inquilino:
+        return INQUILINO_ESTADO_CUENTA_SELECT
+
+    mensaje = await _mensaje_estado_cuenta(inquilino[1])
+    if mensaje is None:
+        await update.message.reply_text("❌ No se encontró información para el inquilino.", reply_markup=create_inquilinos_menu_keyboard())
+        return INQUILINO_MENU
+    await update.message.reply_text(mensaje, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=create_inquilinos_menu_keyboard())
+    return INQUILINO_MENU
+
 async def _generar_mensaje_pendientes(mes: int, anio: int) -> tuple[str, InlineKeyboardMarkup]:
     pendientes = await obtener_inquilinos_pendientes_mes(mes, anio)
     meses_nombres = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
@@ -716,6 +970,7 @@ async def deactivate_inquilino_update(update: Update, context: ContextTypes.DEFA
             return INQUILINO_MENU
         
         await cambiar_estado_inquilino(inquilino_id, False)
+        indice_inquilinos.invalidar()
         await query.edit_message_text(f"✅ Inquilino '{inquilino[1]}' ha sido desactivado.")
         await context.bot.send_message(chat_id=query.message.chat_id, text="¿Qué más deseas hacer?", reply_markup=create_inquilinos_menu_keyboard())
         return INQUILINO_MENU
@@ -755,6 +1010,7 @@ async def activate_inquilino_update(update: Update, context: ContextTypes.DEFAUL
             return INQUILINO_MENU
         
         await cambiar_estado_inquilino(inquilino_id, True)
+        indice_inquilinos.invalidar()
         await query.edit_message_text(f"✅ Inquilino '{inquilino[1]}' ha sido activado.")
         await context.bot.send_message(chat_id=query.message.chat_id, text="¿Qué más deseas hacer?", reply_markup=create_inquilinos_menu_keyboard())
         return INQUILINO_MENU
@@ -817,6 +1073,7 @@ async def delete_inquilino_update(update: Update, context: ContextTypes.DEFAULT_
 
         nombre = inquilino[1]
         exito = await eliminar_inquilino(inquilino_id)
+        indice_inquilinos.invalidar()
 
         if exito:
             await query.edit_message_text(f"🗑️ Inquilino '{nombre}' ha sido eliminado permanentemente.")
@@ -839,8 +1096,10 @@ async def set_dia_pago_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return INQUILINO_MENU
 
     keyboard = []
-    for i in inquilinos:
-        keyboard.append([InlineKeyboardButton(i[1], callback_data=f"diapago_{i[0]}")])
+    if len(inquilinos) <= INQUILINOS_MAX_BOTONES:
+        for i in inquilinos:
+            keyboard.append([InlineKeyboardButton(i[1], callback_data=f"diapago_{i[0]}")])
+    keyboard.append([_boton_buscar_inquilino(FLUJO_DIA_PAGO)])
     keyboard.append([InlineKeyboardButton("❌ Cancelar", callback_data="cancel_inquilino")])
     
     await update.message.reply_text("Selecciona el inquilino al que quieres asignar/editar el día de pago:", reply_markup=InlineKeyboardMarkup(keyboard))
@@ -876,6 +1135,21 @@ async def set_dia_pago_select_inquilino(update: Update, context: ContextTypes.DE
         )
         return INQUILINO_SET_DIA_PAGO_SAVE
 
+async def set_dia_pago_buscado(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Selección desde la búsqueda inline del inquilino al que se asigna el día de pago."""
+    inquilino = await _inquilino_desde_busqueda(update)
+    if not inquilino:
+        return INQUILINO_SET_DIA_PAGO_SELECT
+
+    context.user_data['selected_inquilino_id'] = inquilino[0]
+    context.user_data['selected_inquilino_nombre'] = inquilino[1]
+    await update.message.reply_text(
+        rf"Introduce el día de pago \(1\-31\) para {md(inquilino[1])}:",
+        parse_mode=ParseMode.MARKDOWN_V2,
+        reply_markup=create_cancel_keyboard()
+    )
+    return INQUILINO_SET_DIA_PAGO_SAVE
+
 async def set_dia_pago_save(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Guarda el día de pago para el inquilino seleccionado."""
     texto = update.message.text.strip()
@@ -894,6 +1168,7 @@ async def set_dia_pago_save(update: Update, context: ContextTypes.DEFAULT_TYPE)
         nombre_inquilino = context.user_data['selected_inquilino_nombre']
 
         success = await actualizar_dia_pago_inquilino(inquilino_id, dia_pago)
+        indice_inquilinos.invalidar()
 
         if success:
             await update.message.reply_text(
@@ -1076,6 +1351,8 @@ async def editar_ejecutar_borrado(update: Update, context: ContextTypes.DEFAULT_
     success = False
     if transaction['tipo'] == 'pago':
         success = await delete_pago_by_id(transaction['id'])
+        if success:
+            invalidar_recibos_pago(transaction['id'])
     elif transaction['tipo'] == 'gasto':
         success = await delete_gasto_by_id(transaction['id'])
 
@@ -1089,59 +1366,62 @@ async def editar_ejecutar_borrado(update: Update, context: ContextTypes.DEFAULT_
     return MENU
 
 # === Tareas Automáticas de Recordatorios ===
-async def enviar_recordatorios_pago(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Tarea automática para enviar recordatorios de pagos vencidos/próximos."""
-    try:
-        # ✅ CORREGIDO: Obtener chat_id del job context
-        job = context.job
-        if not job or getattr(job, 'chat_id', None) is None:
-            logger.error("No se pudo obtener chat_id para enviar recordatorios.")
-            return
-        
-        chat_id = job.chat_id
-        
-        recordatorios = await obtener_inquilinos_para_recordatorio()
-        vencidos = recordatorios.get("vencidos", [])
-        proximos = recordatorios.get("proximos", [])
+def _mensaje_recordatorios(recordatorios: dict) -> str:
+    """Construye el texto HTML del recordatorio diario a partir de los inquilinos vencidos/próximos."""
+    vencidos = recordatorios.get("vencidos", [])
+    proximos = recordatorios.get("proximos", [])
 
-        if not vencidos and not proximos:
-            logger.info("No hay recordatorios de pago para enviar hoy.")
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text="🔔 <b>Recordatorios de Pago</b> 🔔\n\n🎉 ¡Excelente! No tienes pagos vencidos ni pendientes por reportar en este momento.",
-                parse_mode=ParseMode.HTML
-            )
-            return
+    if not vencidos and not proximos:
+        return "🔔 <b>Recordatorios de Pago</b> 🔔\n\n🎉 ¡Excelente! No tienes pagos vencidos ni pendientes por reportar en este momento."
 
-        mensaje = "🔔 <b>Recordatorios de Pago</b> 🔔\n\n"
+    mensaje = "🔔 <b>Recordatorios de Pago</b> 🔔\n\n"
 
-        if vencidos:
-            mensaje += "<b>Pagos Vencidos</b> 😡\n"
-            for nombre in vencidos:
-                mensaje += f"• El pago de <b>{nombre}</b> está vencido y no se ha registrado.\n"
-            mensaje += "\n"
+    if vencidos:
+        mensaje += "<b>Pagos Vencidos</b> 😡\n"
+        for nombre in vencidos:
+            mensaje += f"• El pago de <b>{nombre}</b> está vencido y no se ha registrado.\n"
+        mensaje += "\n"
 
-        if proximos:
-            mensaje += "<b>Pagos Próximos a Vencer / Pendientes</b> ⚠️\n"
-            for nombre in proximos:
-                mensaje += f"• El pago de <b>{nombre}</b> está próximo o pendiente por reportar en este mes.\n"
-        
-        await context.bot.send_message(
-            chat_id=chat_id, 
-            text=mensaje, 
-            parse_mode=ParseMode.HTML
-        )
-        logger.info(f"Recordatorios de pago enviados a {chat_id}.")
+    if proximos:
+        mensaje += "<b>Pagos Próximos a Vencer / Pendientes</b> ⚠️\n"
+        for nombre in proximos:
+            mensaje += f"• El pago de <b>{nombre}</b> está próximo o pendiente por reportar en este mes.\n"
+    return mensaje
+
+async def enviar_recordatorios_pago(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Tarea automática para enviar recordatorios de pagos vencidos/próximos.
+    Calcula los recordatorios y el mensaje una sola vez y los reparte a través de la cola de
+    salida (límites de Telegram y reintentos) a los destinatarios del job: `data['destinatarios']`,
+    o su chat_id, o todos los AUTHORIZED_USERS. Un envío fallido no impide los demás.
+    """
+    job = context.job
+    if job and isinstance(job.data, dict) and job.data.get("destinatarios"):
+        destinatarios = list(job.data["destinatarios"])
+    elif job and getattr(job, 'chat_id', None) is not None:
+        destinatarios = [job.chat_id]
+    else:
+        destinatarios = list(AUTHORIZED_USERS)
+    if not destinatarios:
+        logger.error("No hay destinatarios para enviar recordatorios.")
+        return
 
+    try:
+        recordatorios = await obtener_inquilinos_para_recordatorio()
+        mensaje = _mensaje_recordatorios(recordatorios)
+        parse_mode = ParseMode.HTML
+        if not recordatorios.get("vencidos") and not recordatorios.get("proximos"):
+            logger.info("No hay recordatorios de pago para enviar hoy.")
     except Exception as e:
         logger.error(f"Error en la tarea de enviar recordatorios: {e}", exc_info=True)
-        try:
-            await context.bot.send_message(
-                chat_id=context.job.chat_id if context.job and hasattr(context.job, 'chat_id') else None,
-                text="Ocurrió un error inesperado al procesar los recordatorios de pago."
-            )
-        except Exception as send_e:
-            logger.error(f"No se pudo enviar el mensaje de error de recordatorio: {send_e}", exc_info=True)
+        mensaje = "Ocurrió un error inesperado al procesar los recordatorios de pago."
+        parse_mode = None
+
+    resultados = await asyncio.gather(*(
+        cola_salida.enviar(context.bot, chat_id, "send_message", text=mensaje, parse_mode=parse_mode)
+        for chat_id in destinatarios
+    ))
+    logger.info(f"Recordatorios de pago enviados a {sum(resultados)} de {len(destinatarios)} destinatarios.")
 
 # === Otros Handlers ===
 async def ver_resumen(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -1152,13 +1432,15 @@ async def ver_resumen(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
         mensaje = format_summary(resumen_data)
         
         # --- Generar y enviar gráfico visual ---
-        grafico_buffer = generar_grafico_resumen(
+        grafico_buffer = await asyncio.to_thread(
+            generar_grafico_resumen,
             resumen_data['total_ingresos'],
             resumen_data['total_gastos'],
             resumen_data['total_comision'],
             resumen_data['monto_neto']
         )
-        await update.message.reply_photo(photo=InputFile(grafico_buffer, filename='grafico_resumen.png'))
+        grafico_buffer, extension = await asyncio.to_thread(vista_previa, grafico_buffer, "grafico")
+        await update.message.reply_photo(photo=InputFile(grafico_buffer, filename=f'grafico_resumen.{extension}'))
         
         if len(mensaje) < 3000:
             await update.message.reply_text(
@@ -1279,10 +1561,20 @@ async def generar_informe_mensual_custom(update: Update, context: ContextTypes.D
 
 async def generar_informe_mensual(update: Update, context: ContextTypes.DEFAULT_TYPE, mes: int, anio: int) -> int:
     """Handler para generar informe mensual en PDF."""
+    temp_pdf_path = None
+    pdf_buffer = None
     try:
         report_data = await obtener_informe_mensual(mes, anio)
         
-        pdf_buffer = crear_informe_pdf(report_data, mes, anio)
+        if es_informe_grande(report_data):
+            # Meses con cientos de filas: el PDF se escribe en un archivo temporal
+            # en lugar de mantenerse completo en memoria.
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_pdf:
+                temp_pdf_path = temp_pdf.name
+            await asyncio.to_thread(crear_informe_pdf, report_data, mes, anio, destino=temp_pdf_path)
+            pdf_buffer = open(temp_pdf_path, 'rb')
+        else:
+            pdf_buffer = await asyncio.to_thread(crear_informe_pdf, report_data, mes, anio)
         
         meses = [
             "", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
@@ -1290,35 +1582,45 @@ async def generar_informe_mensual(update: Update, context: ContextTypes.DEFAULT_
         ]
         nombre_mes = meses[mes]
         nombre_archivo = f"Informe_{nombre_mes}_{anio}.pdf"
+        chat_id = update.effective_chat.id
 
         # --- Gráfica Visual FinTech del Mes ---
         try:
-            grafico_mes_buffer = generar_grafico_mensual(
+            grafico_mes_buffer = await asyncio.to_thread(
+                generar_grafico_mensual,
                 mes, anio,
                 report_data.get('total_ingresos', Decimal('0')),
                 report_data.get('total_gastos', Decimal('0')),
                 report_data.get('total_comision', Decimal('0')),
                 report_data.get('monto_neto', Decimal('0'))
             )
-            await update.message.reply_photo(
-                photo=InputFile(grafico_mes_buffer, filename=f"Grafico_{nombre_mes}_{anio}.png"),
+            grafico_mes_buffer, extension = await asyncio.to_thread(vista_previa, grafico_mes_buffer, "grafico")
+            await cola_salida.enviar(
+                context.bot, chat_id, "send_photo",
+                photo=InputFile(grafico_mes_buffer, filename=f"Grafico_{nombre_mes}_{anio}.{extension}"),
                 caption=f"📈 <b>Gráfico Financiero • {nombre_mes.upper()} {anio}</b>\nDesglose visual de cobros, gastos y neto.",
                 parse_mode=ParseMode.HTML
             )
         except Exception as graf_err:
             logger.warning(f"No se pudo generar/enviar gráfico mensual: {graf_err}")
         
-        await update.message.reply_document(
+        # El informe sale por la cola de salida: respeta los límites de Telegram y se
+        # reintenta si hay errores de red o RetryAfter.
+        enviado = await cola_salida.enviar(
+            context.bot, chat_id, "send_document",
             document=InputFile(pdf_buffer, filename=nombre_archivo),
             caption=f"📄 Aquí tienes el informe ejecutivo en PDF para {nombre_mes} de {anio}.",
             reply_markup=create_main_menu_keyboard()
         )
+        if not enviado:
+            raise RuntimeError(f"No se pudo entregar {nombre_archivo}")
 
         excel_btn = InlineKeyboardMarkup([
             [InlineKeyboardButton("📊 Descargar en Excel (.xlsx)", callback_data=f"dl_excel_{mes}_{anio}")]
         ])
-        await update.message.reply_text(
-            "💡 ¿Deseas descargar el reporte financiero completo en hoja de cálculo Excel?",
+        await cola_salida.enviar(
+            context.bot, chat_id, "send_message",
+            text="💡 ¿Deseas descargar el reporte financiero completo en hoja de cálculo Excel?",
             reply_markup=excel_btn
         )
     except psycopg2.Error as e:
@@ -1327,6 +1629,12 @@ async def generar_informe_mensual(update: Update, context: ContextTypes.DEFAULT_
     except Exception as e:
         logger.error(f"Error inesperado al generar informe: {e}", exc_info=True)
         await update.message.reply_text("❌ Hubo un error inesperado al generar el informe.", reply_markup=create_main_menu_keyboard())
+    finally:
+        if temp_pdf_path:
+            if pdf_buffer:
+                pdf_buffer.close()
+            if os.path.exists(temp_pdf_path):
+                os.remove(temp_pdf_path)
     return MENU
 
 async def descargar_excel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -1335,27 +1643,164 @@ async def descargar_excel_callback(update: Update, context: ContextTypes.DEFAULT
     await query.answer()
     data = query.data
 
+    temp_xlsx_path = None
+    excel_buffer = None
     try:
         parts = data.split("_")
         mes = int(parts[2])
         anio = int(parts[3])
-        report_data = await obtener_informe_mensual(mes, anio)
-        excel_buffer = exportar_informe_excel(mes, anio, report_data)
+        # Una sola consulta: totales y, si el informe no es grande, también el detalle
+        report_data = await obtener_informe_mensual(mes, anio, limite_detalle=UMBRAL_EXCEL_GRANDE)
+        if "pagos_mes" not in report_data:
+            # Las filas se leen de PostgreSQL por lotes mientras el hilo escribe el libro,
+            # que va a un archivo temporal: ni el detalle ni el .xlsx se tienen completos en memoria.
+            report_data["pagos_mes"] = iterar_detalle_informe(mes, anio, "pagos")
+            report_data["gastos_mes"] = iterar_detalle_informe(mes, anio, "gastos")
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as temp_xlsx:
+                temp_xlsx_path = temp_xlsx.name
+            await asyncio.to_thread(exportar_informe_excel, mes, anio, report_data, destino=temp_xlsx_path)
+            excel_buffer = open(temp_xlsx_path, 'rb')
+        else:
+            excel_buffer = await asyncio.to_thread(exportar_informe_excel, mes, anio, report_data)
 
         meses = [
             "", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
             "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
         ]
         nombre_mes = meses[mes]
-        await context.bot.send_document(
-            chat_id=query.message.chat_id,
+        enviado = await cola_salida.enviar(
+            context.bot, query.message.chat_id, "send_document",
             document=InputFile(excel_buffer, filename=f"Reporte_Financiero_{nombre_mes}_{anio}.xlsx"),
             caption=f"📊 <b>Reporte Financiero Excel</b> — {nombre_mes} {anio}",
             parse_mode=ParseMode.HTML
         )
+        if not enviado:
+            raise RuntimeError("No se pudo entregar el archivo Excel")
     except Exception as e:
         logger.error(f"Error generando Excel ({data}): {e}", exc_info=True)
         await context.bot.send_message(chat_id=query.message.chat_id, text="❌ Ocurrió un error al generar el archivo Excel.")
+    finally:
+        if temp_xlsx_path:
+            if excel_buffer:
+                excel_buffer.close()
+            if os.path.exists(temp_xlsx_path):
+                os.remove(temp_xlsx_path)
+
+def _parsear_fecha_argumento(texto: str) -> date | None:
+    """Interpreta una fecha escrita como YYYY-MM-DD o DD/MM/YYYY."""
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    return None
+
+async def libro_mayor_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handler de /libro - Envía el libro mayor completo (pagos y gastos) como CSV comprimido.
+    Uso: /libro [desde] [hasta] [inquilino], con fechas YYYY-MM-DD o DD/MM/YYYY.
+    """
+    args = list(context.args or [])
+    fechas = []
+    while args and len(fechas) < 2:
+        fecha = _parsear_fecha_argumento(args[0])
+        if not fecha:
+            break
+        fechas.append(fecha)
+        args.pop(0)
+    desde = fechas[0] if fechas else None
+    hasta = fechas[1] if len(fechas) > 1 else None
+    inquilino = " ".join(args).strip() or None
+
+    if desde and hasta and desde > hasta:
+        await update.message.reply_text("❌ La fecha inicial no puede ser posterior a la fecha final.")
+        return
+
+    temp_csv_path = None
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.csv.gz') as temp_csv:
+            temp_csv_path = temp_csv.name
+        filas = await exportar_libro_mayor_csv(temp_csv_path, desde, hasta, inquilino)
+
+        rango = f"{desde.strftime('%d/%m/%Y') if desde else 'inicio'} — {hasta.strftime('%d/%m/%Y') if hasta else 'hoy'}"
+        nombre_archivo = "Libro_Mayor"
+        if inquilino:
+            nombre_archivo += f"_{inquilino.replace(' ', '_')}"
+        with open(temp_csv_path, 'rb') as f:
+            await update.message.reply_document(
+                document=InputFile(f, filename=f"{nombre_archivo}.csv.gz"),
+                caption=f"📚 <b>Libro Mayor</b> ({rango})\nInquilino: {html.escape(inquilino or 'Todos')}\nMovimientos exportados: {filas}",
+                parse_mode=ParseMode.HTML
+            )
+    except psycopg2.Error as e:
+        logger.error(f"Error de base de datos al exportar libro mayor: {e}", exc_info=True)
+        await update.message.reply_text("❌ Hubo un error con la base de datos al exportar el libro mayor.")
+    except Exception as e:
+        logger.error(f"Error inesperado al exportar libro mayor: {e}", exc_info=True)
+        await update.message.reply_text("❌ Hubo un error inesperado al exportar el libro mayor.")
+    finally:
+        if temp_csv_path and os.path.exists(temp_csv_path):
+            os.remove(temp_csv_path)
+
+async def recibos_lote_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handler de /recibos - Genera los recibos de todos los pagos de un mes.
+    Uso: /recibos [MM] [AAAA] [pdf|zip|png]
+    pdf: un único PDF con un recibo por página (por defecto).
+    zip / png: un ZIP con un recibo PDF / PNG por pago.
+    """
+    hoy = datetime.now(DO_TZ).date()
+    mes, anio, formato = hoy.month, hoy.year, 'pdf'
+    args = list(context.args or [])
+    try:
+        if args and args[-1].lower() in ('pdf', 'zip', 'png'):
+            formato = args.pop().lower()
+        if args:
+            mes = int(args[0])
+        if len(args) > 1:
+            anio = int(args[1])
+        if not 1 <= mes <= 12 or not 1900 < anio < 2100 or len(args) > 2:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text("❌ Uso: /recibos [MM] [AAAA] [pdf|zip|png]\nEjemplo: /recibos 07 2026 zip")
+        return
+
+    periodo = f"{MESES_NOMBRES[mes]} {anio}"
+    extension = 'pdf' if formato == 'pdf' else 'zip'
+    temp_path = None
+    try:
+        pagos = await obtener_pagos_periodo(mes, anio)
+        if not pagos:
+            await update.message.reply_text(f"ℹ️ No hay pagos registrados para {periodo}.")
+            return
+
+        await update.message.reply_text(f"⏳ Generando {len(pagos)} recibos de {periodo}...")
+        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{extension}') as temp_file:
+            temp_path = temp_file.name
+        # El renderizado es CPU intensivo: se ejecuta fuera del event loop
+        if formato == 'pdf':
+            total = await asyncio.to_thread(crear_recibos_lote_pdf, pagos, temp_path, periodo)
+        else:
+            total = await asyncio.to_thread(
+                crear_recibos_lote_zip, pagos, temp_path,
+                'png' if formato == 'png' else 'pdf', periodo, RECIBOS_LOTE_WORKERS
+            )
+
+        with open(temp_path, 'rb') as f:
+            await update.message.reply_document(
+                document=InputFile(f, filename=f"Recibos_{MESES_NOMBRES[mes]}_{anio}.{extension}"),
+                caption=f"🧾 <b>Recibos de {periodo}</b>\nRecibos generados: {total}",
+                parse_mode=ParseMode.HTML
+            )
+    except psycopg2.Error as e:
+        logger.error(f"Error de base de datos al generar recibos en lote: {e}", exc_info=True)
+        await update.message.reply_text("❌ Hubo un error con la base de datos al generar los recibos.")
+    except Exception as e:
+        logger.error(f"Error inesperado al generar recibos en lote: {e}", exc_info=True)
+        await update.message.reply_text("❌ Hubo un error inesperado al generar los recibos.")
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
 
 async def deshacer_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handler del menú deshacer."""
@@ -1370,8 +1815,9 @@ async def deshacer_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
 async def deshacer_pago_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handler para deshacer último pago."""
     try:
-        inquilino, monto = await deshacer_ultimo_pago()
+        inquilino, monto, pago_id = await deshacer_ultimo_pago()
         if inquilino:
+            invalidar_recibos_pago(pago_id)
             mensaje = rf"✅ Último pago de *{md(inquilino)}* por *{md(format_currency(monto))}* ha sido eliminado\."
         else:
             mensaje = "No hay pagos para deshacer."
@@ -1462,4 +1908,91 @@ def format_summary(data: dict) -> str:
 
     gastos = data.get('ultimos_gastos', [])
     mensaje += _format_transaction_list("Últimos Gastos", gastos, "No hay gastos recientes.")
-    return mensaje
\ No newline at end of file
+    return mensaje
+
+# === Estadísticas (/stats) ===
+def _formatear_estadisticas() -> str:
+    """Texto de /stats: latencias por handler y métricas internas (contadores, valores, indicadores)."""
+    lineas = [f"⏱️ Latencia por handler en ms (últimas {registro_latencias.ventana})"]
+    filas = registro_latencias.resumen()
+    if filas:
+        lineas.append(f"{'handler':<34}{'n':>6}{'p50':>7}{'p95':>7}{'p99':>7}{'err':>5}")
+        for fila in filas:
+            lineas.append(
+                f"{fila['etiqueta'][:33]:<34}{fila['cantidad']:>6}{fila['p50']:>7.0f}"
+                f"{fila['p95']:>7.0f}{fila['p99']:>7.0f}{fila['errores']:>5}"
+            )
+    else:
+        lineas.append("Sin actualizaciones medidas todavía.")
+
+    if monitor_loop.recientes:
+        lineas += ["", "🧊 Bloqueos recientes del event loop"]
+        lineas += [
+            f"{b['ms']:>6.0f} ms {b['etiqueta'][:30]} @ {b['origen']}"
+            for b in reversed(list(monitor_loop.recientes)[-5:])
+        ]
+
+    indicadores = metrics.obtener_indicadores()
+    if indicadores:
+        lineas += ["", "📟 Indicadores"]
+        lineas += [f"{nombre:<34}{valor:>10}" for nombre, valor in sorted(indicadores.items())]
+    contadores = metrics.obtener_contadores()
+    if contadores:
+        lineas += ["", "🔢 Contadores"]
+        lineas += [f"{nombre:<34}{valor:>10}" for nombre, valor in sorted(contadores.items())]
+    valores = metrics.obtener_valores()
+    if valores:
+        lineas += ["", "📏 Valores (n / promedio / máximo)"]
+        lineas += [
+            f"{nombre[:33]:<34}{v['cantidad']:>6}{v['promedio']:>10.1f}{v['maximo']:>10.1f}"
+            for nombre, v in sorted(valores.items())
+        ]
+    return "\n".join(lineas)
+
+async def stats_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handler de /stats - Muestra percentiles de latencia por handler y estadísticas del pool y las cachés."""
+    try:
+        texto = _formatear_estadisticas()
+        if len(texto) < 3800:
+            await update.message.reply_text(f"<pre>{html.escape(texto)}</pre>", parse_mode=ParseMode.HTML)
+        else:
+            await update.message.reply_document(
+                document=InputFile(texto.encode('utf-8'), filename='estadisticas.txt'),
+                caption='📊 Las estadísticas son muy largas, por lo que se han enviado como archivo.'
+            )
+    except Exception as e:
+        logger.error(f"Error inesperado al generar estadísticas: {e}", exc_info=True)
+        await update.message.reply_text("❌ Hubo un error inesperado al generar las estadísticas.")
+
+# === Perfilado bajo Demanda (/profile) ===
+
+async def profile_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handler de /profile <next|N|off> - Perfila las próximas actualizaciones del usuario y envía el resultado."""
+    usuario_id = update.effective_user.id
+    argumento = (context.args[0].lower() if context.args else "next")
+    if argumento in ("off", "cancelar"):
+        restantes = perfilador.desarmar(usuario_id)
+        await update.message.reply_text(
+            f"🔬 Perfilado cancelado ({restantes} actualizaciones sin perfilar)." if restantes else "🔬 No había ningún perfilado pendiente."
+        )
+        return
+    try:
+        cantidad = 1 if argumento in ("next", "siguiente") else int(argumento)
+        if cantidad < 1:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text(
+            "❌ Uso: /profile [next|N|off]\n"
+            f"Ejemplo: /profile 3 perfila tus próximas 3 acciones (máximo {perfilador.max_actualizaciones})."
+        )
+        return
+
+    cantidad = perfilador.armar(usuario_id, cantidad)
+    await update.message.reply_text(
+        f"🔬 Se perfilarán tus próximas {cantidad} acciones. "
+        "Al terminar cada una recibirás un archivo con las pilas en formato colapsado "
+        "(ábrelo en speedscope.app o con flamegraph.pl)."
+        if cantidad > 1 else
+        "🔬 Se perfilará tu próxima acción. Al terminar recibirás un archivo con las pilas en formato "
+        "colapsado (ábrelo en speedscope.app o con flamegraph.pl)."
+    )
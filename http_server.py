@@ -0,0 +1,178 @@
+import abc
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_CUERPO_BYTES = 1024 * 1024
+MAX_CABECERAS = 100
+
+_RAZONES = {
+    200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+    405: "Method Not Allowed", 408: "Request Timeout", 411: "Length Required",
+    413: "Payload Too Large", 429: "Too Many Requests", 431: "Request Header Fields Too Large",
+    500: "Internal Server Error", 502: "Bad Gateway",
+}
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, estado: int, mensaje: str = ""):
+        super().__init__(mensaje or _RAZONES.get(estado, ""))
+        self.estado = estado
+
+
+class ServidorHTTP(abc.ABC):
+    """
+    Servidor HTTP/1.1 mínimo sobre asyncio, sin dependencias externas: conexiones
+    keep-alive, límites de cabeceras y cuerpo (`max_cuerpo`), timeouts de lectura y
+    parada ordenada. Las subclases implementan `_procesar`.
+
+    Es para herramientas locales (fake_telegram_server.py) y no debe exponerse a
+    internet: el webhook de producción usa el servidor de python-telegram-bot
+    (Updater.start_webhook, ver main.py).
+
+    `detener()` deja de aceptar conexiones, cierra las keep-alive inactivas y espera a
+    que terminen las peticiones en curso.
+    """
+
+    nombre = "Servidor HTTP"
+    max_cuerpo = MAX_CUERPO_BYTES
+
+    def __init__(self, host: str = "0.0.0.0", puerto: int = 8443, timeout_lectura: float = 10.0):
+        self.host = host
+        self.puerto = puerto
+        self.timeout_lectura = timeout_lectura
+        self._servidor: asyncio.AbstractServer | None = None
+        self._conexiones: set[asyncio.Task] = set()
+        self._ocupadas: set[asyncio.Task] = set()  # conexiones atendiendo una petición
+        self._drenando = False
+
+    @property
+    def activo(self) -> bool:
+        return self._servidor is not None and not self._drenando
+
+    @property
+    def direccion(self) -> str:
+        return f"{self.host}:{self.puerto}"
+
+    async def iniciar(self) -> None:
+        """Empieza a escuchar en host:puerto. Con puerto 0 se asigna uno libre (ver `self.puerto`)."""
+        self._drenando = False
+        self._servidor = await asyncio.start_server(self._atender_conexion, self.host, self.puerto)
+        self.puerto = self._servidor.sockets[0].getsockname()[1]
+        logger.info(f"{self.nombre} escuchando en {self.direccion}")
+
+    async def detener(self, timeout: float = 30.0) -> None:
+        """Deja de aceptar peticiones y espera (hasta `timeout` s) a las que están en curso."""
+        if self._servidor is None:
+            return
+        self._drenando = True
+        self._servidor.close()
+        # Las conexiones keep-alive inactivas se cierran ya; las que están atendiendo
+        # una petición terminan de procesarla y responder.
+        for tarea in self._conexiones - self._ocupadas:
+            tarea.cancel()
+        if self._ocupadas:
+            logger.info(f"Esperando a {len(self._ocupadas)} peticiones en curso ({self.nombre})...")
+            _, sin_terminar = await asyncio.wait(set(self._ocupadas), timeout=timeout)
+            for tarea in sin_terminar:
+                tarea.cancel()
+        await self._servidor.wait_closed()
+        self._servidor = None
+        logger.info(f"{self.nombre} detenido.")
+
+    async def _atender_conexion(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        tarea = asyncio.current_task()
+        self._conexiones.add(tarea)
+        try:
+            # Conexiones keep-alive: se atienden peticiones hasta que el cliente cierre
+            while not self._drenando:
+                try:
+                    linea = await asyncio.wait_for(reader.readline(), self.timeout_lectura)
+                except asyncio.TimeoutError:
+                    break
+                if not linea:
+                    break
+                self._ocupadas.add(tarea)
+                tipo = "text/plain; charset=utf-8"
+                try:
+                    metodo, ruta, cabeceras, cuerpo = await asyncio.wait_for(
+                        self._leer_peticion(linea, reader), self.timeout_lectura
+                    )
+                except asyncio.TimeoutError:
+                    estado, respuesta, mantener = 408, b"", False
+                except ErrorHTTP as e:
+                    # Tras un error de lectura el resto del flujo no es fiable: se cierra la conexión
+                    estado, respuesta, mantener = e.estado, str(e).encode("utf-8"), False
+                else:
+                    try:
+                        estado, respuesta, tipo = await self._procesar(metodo, ruta, cabeceras, cuerpo)
+                    except ErrorHTTP as e:
+                        estado, respuesta = e.estado, str(e).encode("utf-8")
+                    except Exception as e:
+                        logger.error(f"Error al procesar {metodo} {ruta} en {self.nombre}: {e}", exc_info=True)
+                        estado, respuesta = 500, _RAZONES[500].encode("utf-8")
+                    mantener = cabeceras.get("connection", "").lower() != "close" and not self._drenando
+                await self._responder(writer, estado, respuesta, tipo, mantener)
+                self._ocupadas.discard(tarea)
+                if not mantener:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            logger.error(f"Error inesperado en {self.nombre}: {e}", exc_info=True)
+        finally:
+            self._ocupadas.discard(tarea)
+            self._conexiones.discard(tarea)
+            writer.close()
+
+    async def _leer_peticion(self, linea: bytes, reader: asyncio.StreamReader):
+        """Lee el resto de una petición HTTP/1.1 y devuelve (método, ruta con query, cabeceras, cuerpo)."""
+        try:
+            metodo, ruta, _ = linea.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise ErrorHTTP(400, "Línea de petición inválida")
+
+        cabeceras = {}
+        while True:
+            linea = await reader.readline()
+            if linea in (b"\r\n", b"\n", b""):
+                break
+            if len(cabeceras) >= MAX_CABECERAS:
+                raise ErrorHTTP(431)
+            nombre, _, valor = linea.decode("latin-1").partition(":")
+            cabeceras[nombre.strip().lower()] = valor.strip()
+
+        cuerpo = b""
+        if metodo == "POST":
+            if "content-length" not in cabeceras:
+                raise ErrorHTTP(411)
+            try:
+                longitud = int(cabeceras["content-length"])
+            except ValueError:
+                raise ErrorHTTP(400, "Content-Length inválido")
+            if longitud < 0 or longitud > self.max_cuerpo:
+                raise ErrorHTTP(413)
+            cuerpo = await reader.readexactly(longitud)
+        return metodo, ruta, cabeceras, cuerpo
+
+    @abc.abstractmethod
+    async def _procesar(self, metodo: str, ruta: str, cabeceras: dict, cuerpo: bytes) -> tuple[int, bytes, str]:
+        """
+        Atiende una petición y devuelve (estado, cuerpo, Content-Type). ErrorHTTP se
+        responde con su estado; cualquier otra excepción, con 500.
+        """
+
+    @staticmethod
+    async def _responder(writer: asyncio.StreamWriter, estado: int, cuerpo: bytes, tipo: str, mantener: bool) -> None:
+        encabezado = (
+            f"HTTP/1.1 {estado} {_RAZONES.get(estado, '')}\r\n"
+            f"Content-Type: {tipo}\r\n"
+            f"Content-Length: {len(cuerpo)}\r\n"
+            f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n"
+        )
+        try:
+            writer.write(encabezado.encode("latin-1") + cuerpo)
+            await writer.drain()
+        except ConnectionError:
+            pass
@@ -0,0 +1,483 @@
+"""
+Arnés de carga: ejecuta la Application real de main.py (mismos handlers, procesador de
+actualizaciones, cola de salida y medición de latencias) con flujos de actualizaciones
+generados o grabados, contra la Bot API simulada de fake_telegram_server.py (en memoria o,
+con --http, por HTTP y long polling).
+
+Reporta actualizaciones por segundo, percentiles de latencia (totales y por handler) y
+el retardo del event loop, para medir capacidad y detectar regresiones.
+
+Uso:
+    python load_harness.py --usuarios 20 --duracion 30
+    python load_harness.py --usuarios 5 --iteraciones 10 --mezcla pago=3,informe=1 --grabar flujo.jsonl
+    python load_harness.py --reproducir flujo.jsonl --tasa 50 --json
+
+Por defecto las consultas que usan los flujos se resuelven con una base en memoria
+(`--db memoria`, con `--latencia-db-ms` de ida y vuelta simulada); con `--db real` se usa
+la base configurada (DATABASE_URL o PG*) y los pagos generados quedan registrados en ella.
+"""
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import itertools
+from datetime import date
+from decimal import Decimal
+
+from telegram import Update
+from telegram.ext import TypeHandler
+from telegram.request import BaseRequest
+import main
+import handlers
+import database
+import metrics
+import artifact_store
+from config import AUTHORIZED_USERS, COMMISSION_RATE, ARTIFACT_STORE_MAX_MB
+from handler_timing import registro_latencias, GRUPO_FIN, ETIQUETA_TOTAL
+from outbound_queue import cola_salida
+from fake_telegram_server import ApiTelegramSimulada, ServidorTelegramFalso, ID_BOT
+from tenant_index import indice_inquilinos
+
+logger = logging.getLogger(__name__)
+
+TOKEN_ARNES = "123456:ARNES-DE-CARGA"
+# Los usuarios virtuales usan ids a partir de aquí (se autorizan solo durante la ejecución)
+ID_USUARIO_BASE = 700000000
+MEZCLA_POR_DEFECTO = {"pago": 5, "informe": 1, "resumen": 2}
+
+
+def _percentiles(valores: list) -> dict:
+    """p50, p95, p99 y máximo (rango más cercano) de una lista de milisegundos."""
+    if not valores:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "maximo": 0.0}
+    ordenados = sorted(valores)
+    rango = lambda p: ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+    return {"p50": round(rango(50), 2), "p95": round(rango(95), 2), "p99": round(rango(99), 2), "maximo": round(ordenados[-1], 2)}
+
+
+class TransporteFalso(BaseRequest):
+    """Transporte de la Bot API que atiende cada llamada en memoria con una ApiTelegramSimulada."""
+
+    def __init__(self, api: ApiTelegramSimulada):
+        self.api = api
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None) -> tuple[int, bytes]:
+        parametros, archivos = {}, {}
+        if request_data:
+            parametros = request_data.parameters
+            if request_data.contains_files:
+                archivos = {campo: (datos[0], datos[1]) for campo, datos in request_data.multipart_data.items()}
+        estado, respuesta = await self.api.llamar(url.rsplit("/", 1)[-1], parametros, archivos)
+        return estado, json.dumps(respuesta).encode()
+
+
+class BaseDatosEnMemoria:
+    """
+    Reemplaza en handlers.py las consultas que usan los flujos del arnés por una versión
+    en memoria con `latencia_ms` simulada, para medir el bot sin depender de PostgreSQL.
+    """
+
+    FUNCIONES = (
+        "obtener_inquilinos", "obtener_inquilino_por_id", "obtener_mes_pago_pendiente",
+        "registrar_pago", "obtener_pago_por_id", "obtener_resumen", "obtener_informe_mensual",
+    )
+    NOMBRES = ["Ana", "José", "María", "Pedro", "Luisa", "Carlos", "Rosa", "Miguel", "Carmen", "Rafael"]
+    APELLIDOS = ["Peña", "Núñez", "Rodríguez", "Almonte", "Santos", "Guzmán", "Reyes", "Castillo"]
+
+    def __init__(self, inquilinos: int = 40, latencia_ms: float = 2.0, rng: random.Random = None):
+        rng = rng or random.Random()
+        self.latencia = latencia_ms / 1000
+        self.inquilinos = [
+            (i, f"{rng.choice(self.NOMBRES)} {rng.choice(self.APELLIDOS)} {i}", True, rng.randint(1, 28))
+            for i in range(1, inquilinos + 1)
+        ]
+        self.pagos: list[tuple] = []
+        self._originales = {}
+
+    def instalar(self) -> None:
+        for nombre in self.FUNCIONES:
+            self._originales[nombre] = getattr(handlers, nombre)
+            setattr(handlers, nombre, getattr(self, nombre))
+
+    def desinstalar(self) -> None:
+        for nombre, funcion in self._originales.items():
+            setattr(handlers, nombre, funcion)
+        self._originales.clear()
+
+    async def _ida_y_vuelta(self) -> None:
+        await asyncio.sleep(self.latencia)
+
+    async def obtener_inquilinos(self, activos_only: bool = True) -> list:
+        await self._ida_y_vuelta()
+        return sorted((i for i in self.inquilinos if i[2] or not activos_only), key=lambda i: i[1])
+
+    async def obtener_inquilino_por_id(self, inquilino_id: int) -> tuple | None:
+        await self._ida_y_vuelta()
+        return next((i for i in self.inquilinos if i[0] == inquilino_id), None)
+
+    async def obtener_mes_pago_pendiente(self, inquilino_nombre: str) -> date | None:
+        await self._ida_y_vuelta()
+        return None
+
+    async def registrar_pago(self, fecha, inquilino: str, monto: Decimal, mes_alquiler: int = None, anio_alquiler: int = None) -> int:
+        await self._ida_y_vuelta()
+        fecha = fecha if isinstance(fecha, date) else date.fromisoformat(str(fecha))
+        pago_id = len(self.pagos) + 1
+        self.pagos.append((pago_id, fecha, inquilino, monto, mes_alquiler or fecha.month, anio_alquiler or fecha.year))
+        return pago_id
+
+    async def obtener_pago_por_id(self, pago_id: int) -> tuple | None:
+        await self._ida_y_vuelta()
+        return self.pagos[pago_id - 1] if 0 < pago_id <= len(self.pagos) else None
+
+    def _totales(self, pagos: list) -> dict:
+        total = sum((p[3] for p in pagos), Decimal("0"))
+        comision = total * Decimal(str(COMMISSION_RATE))
+        return {"total_ingresos": total, "total_comision": comision, "total_gastos": Decimal("0"), "monto_neto": total - comision}
+
+    async def obtener_resumen(self) -> dict:
+        await self._ida_y_vuelta()
+        ultimos = [(p[1], p[2], p[3]) for p in self.pagos[-3:][::-1]]
+        return {**self._totales(self.pagos), "ultimos_pagos": ultimos, "ultimos_gastos": []}
+
+    async def obtener_informe_mensual(self, mes: int, anio: int, limite_detalle: int | None = None) -> dict:
+        await self._ida_y_vuelta()
+        pagos = [p for p in self.pagos if p[4] == mes and p[5] == anio]
+        informe = {**self._totales(pagos), "filas_pagos": len(pagos), "filas_gastos": 0}
+        if limite_detalle is None or len(pagos) <= limite_detalle:
+            informe.update(pagos_mes=[(p[0], p[1], p[2], p[3]) for p in pagos], gastos_mes=[])
+        return informe
+
+
+class Arnes:
+    """
+    Inyecta actualizaciones en la Application y espera a que terminen de procesarse:
+    directamente en `update_queue` o, con `por_http`, a través del getUpdates de la API
+    simulada (el Updater las recoge por long polling, como en producción).
+    """
+
+    def __init__(self, application, api: ApiTelegramSimulada, timeout: float = 60.0, grabacion=None, por_http: bool = False):
+        self.application = application
+        self.api = api
+        self.por_http = por_http
+        self.timeout = timeout
+        self.grabacion = grabacion
+        self.latencias: list[float] = []
+        self.sin_respuesta = 0
+        self._ids = itertools.count(1)
+        self._pendientes: dict[int, asyncio.Future] = {}
+        # Después del último grupo de handlers (incluida la medición de handler_timing)
+        application.add_handler(TypeHandler(Update, self._completada), group=GRUPO_FIN + 1)
+
+    async def _completada(self, update: Update, context) -> None:
+        futuro = self._pendientes.pop(update.update_id, None)
+        if futuro and not futuro.done():
+            futuro.set_result(None)
+
+    async def enviar(self, datos: dict) -> None:
+        """Encola una actualización (dict de la Bot API, sin update_id) y espera su procesamiento."""
+        datos = {**datos, "update_id": next(self._ids)}
+        if self.grabacion:
+            self.grabacion.write(json.dumps(datos, ensure_ascii=False) + "\n")
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendientes[datos["update_id"]] = futuro
+        inicio = time.perf_counter()
+        if self.por_http:
+            self.api.encolar_actualizacion(datos)
+        else:
+            await self.application.update_queue.put(Update.de_json(datos, self.application.bot))
+        try:
+            await asyncio.wait_for(futuro, self.timeout)
+        except asyncio.TimeoutError:
+            self._pendientes.pop(datos["update_id"], None)
+            self.sin_respuesta += 1
+            return
+        self.latencias.append((time.perf_counter() - inicio) * 1000)
+
+    @staticmethod
+    def _usuario(usuario_id: int) -> dict:
+        return {"id": usuario_id, "is_bot": False, "first_name": f"Usuario {usuario_id - ID_USUARIO_BASE}"}
+
+    def mensaje(self, usuario_id: int, texto: str) -> dict:
+        return {"message": {
+            "message_id": next(self._ids), "date": int(time.time()), "text": texto,
+            "chat": {"id": usuario_id, "type": "private"}, "from": self._usuario(usuario_id),
+        }}
+
+    def consulta_inline(self, usuario_id: int, texto: str) -> tuple[str, dict]:
+        consulta_id = str(next(self._ids))
+        return consulta_id, {"inline_query": {
+            "id": consulta_id, "from": self._usuario(usuario_id), "query": texto, "offset": "",
+        }}
+
+    def toque(self, usuario_id: int, message_id: int, callback_data: str) -> dict:
+        return {"callback_query": {
+            "id": str(next(self._ids)), "chat_instance": str(usuario_id), "data": callback_data,
+            "from": self._usuario(usuario_id),
+            "message": {
+                "message_id": message_id, "date": int(time.time()), "text": "",
+                "chat": {"id": usuario_id, "type": "private"},
+                "from": {"id": ID_BOT, "is_bot": True, "first_name": "Arnés"},
+            },
+        }}
+
+
+# === Flujos de usuario ===
+async def flujo_pago(arnes: Arnes, usuario_id: int, rng: random.Random, pausa: float) -> None:
+    """
+    Registrar pago: menú, elección del inquilino, monto y descarga del recibo. El
+    inquilino se toca en el teclado o, si hay demasiados para listarlos, se busca con
+    la búsqueda inline y se envía el resultado elegido.
+    """
+    await arnes.enviar(arnes.mensaje(usuario_id, "📥 Registrar Pago"))
+    await _pausar(rng, pausa)
+    boton = arnes.api.boton(usuario_id, "pago_tenant_", rng)
+    if boton:
+        await arnes.enviar(arnes.toque(usuario_id, *boton))
+    else:
+        consulta_id, consulta = arnes.consulta_inline(usuario_id, rng.choice("abcdjlmpr"))
+        await arnes.enviar(consulta)
+        resultados = arnes.api.resultados_inline.pop(consulta_id, [])
+        if not resultados:
+            return
+        await _pausar(rng, pausa)
+        await arnes.enviar(arnes.mensaje(usuario_id, rng.choice(resultados)))
+    await _pausar(rng, pausa)
+    await arnes.enviar(arnes.mensaje(usuario_id, str(rng.randrange(1000, 30000, 500))))
+    boton = arnes.api.boton(usuario_id, "dl_recibo_", rng)
+    if boton:
+        await _pausar(rng, pausa)
+        await arnes.enviar(arnes.toque(usuario_id, *boton))
+
+async def flujo_informe(arnes: Arnes, usuario_id: int, rng: random.Random, pausa: float) -> None:
+    """Generar informe del mes actual (gráfico, PDF) y descargar el Excel."""
+    await arnes.enviar(arnes.mensaje(usuario_id, "📈 Generar Informe"))
+    await _pausar(rng, pausa)
+    await arnes.enviar(arnes.mensaje(usuario_id, "Informe Mes Actual"))
+    boton = arnes.api.boton(usuario_id, "dl_excel_", rng)
+    if boton:
+        await _pausar(rng, pausa)
+        await arnes.enviar(arnes.toque(usuario_id, *boton))
+
+async def flujo_resumen(arnes: Arnes, usuario_id: int, rng: random.Random, pausa: float) -> None:
+    """Ver resumen general (consulta y gráfico)."""
+    await arnes.enviar(arnes.mensaje(usuario_id, "📊 Ver Resumen"))
+
+FLUJOS = {"pago": flujo_pago, "informe": flujo_informe, "resumen": flujo_resumen}
+
+async def _pausar(rng: random.Random, pausa: float) -> None:
+    """Tiempo de reflexión del usuario: uniforme entre 0 y 2×`pausa` segundos."""
+    if pausa > 0:
+        await asyncio.sleep(rng.uniform(0, 2 * pausa))
+
+async def _usuario_virtual(arnes: Arnes, usuario_id: int, rng: random.Random, mezcla: dict,
+                           pausa: float, fin: float, iteraciones: int | None) -> None:
+    nombres, pesos = list(mezcla), list(mezcla.values())
+    for n in itertools.count():
+        if (iteraciones is not None and n >= iteraciones) or (iteraciones is None and time.monotonic() >= fin):
+            return
+        await FLUJOS[rng.choices(nombres, pesos)[0]](arnes, usuario_id, rng, pausa)
+        await _pausar(rng, pausa)
+
+async def _reproducir(arnes: Arnes, actualizaciones: list, tasa: float) -> None:
+    """Reenvía actualizaciones grabadas en orden, a `tasa` por segundo (0 = todas de golpe)."""
+    tareas = []
+    inicio = time.monotonic()
+    for n, datos in enumerate(actualizaciones):
+        if tasa > 0:
+            await asyncio.sleep(max(0.0, inicio + n / tasa - time.monotonic()))
+        datos = {clave: valor for clave, valor in datos.items() if clave != "update_id"}
+        tareas.append(asyncio.create_task(arnes.enviar(datos)))
+        await asyncio.sleep(0)  # que cada una se encole antes que la siguiente
+    await asyncio.gather(*tareas)
+
+def _usuarios_de(actualizaciones: list) -> set[int]:
+    ids = set()
+    for datos in actualizaciones:
+        for clave in ("message", "callback_query", "inline_query"):
+            if clave in datos and "from" in datos[clave]:
+                ids.add(datos[clave]["from"]["id"])
+    return ids
+
+async def _medir_retardo_loop(muestras: list, intervalo: float = 0.01) -> None:
+    """Retardo del event loop: cuánto se pasa de `intervalo` cada sleep."""
+    while True:
+        inicio = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        muestras.append(max(0.0, (time.perf_counter() - inicio - intervalo) * 1000))
+
+
+async def ejecutar(usuarios: int = 10, duracion: float = 30.0, iteraciones: int | None = None,
+                   mezcla: dict | None = None, pausa: float = 0.5, latencia_api_ms: float = 30.0,
+                   db: str = "memoria", inquilinos: int = 40, latencia_db_ms: float = 2.0,
+                   reproducir: str | None = None, tasa: float = 0.0, grabar: str | None = None,
+                   semilla: int | None = None, timeout: float = 60.0, tasa_error: float = 0.0,
+                   http: bool = False) -> dict:
+    """
+    Ejecuta una prueba de carga y devuelve el reporte (ver `_imprimir_reporte`). Con `http`
+    el bot habla con fake_telegram_server.py por HTTPXRequest y recibe por long polling.
+    """
+    rng = random.Random(semilla)
+    actualizaciones = None
+    if reproducir:
+        with open(reproducir, encoding="utf-8") as f:
+            actualizaciones = [json.loads(linea) for linea in f if linea.strip()]
+        ids_usuarios = sorted(_usuarios_de(actualizaciones))
+    else:
+        ids_usuarios = [ID_USUARIO_BASE + i for i in range(1, usuarios + 1)]
+    autorizados = [i for i in ids_usuarios if i not in AUTHORIZED_USERS]
+    AUTHORIZED_USERS.extend(autorizados)
+
+    persistencia_activa = main.PERSISTENCIA_ACTIVA
+    base_memoria = None
+    if db == "memoria":
+        base_memoria = BaseDatosEnMemoria(inquilinos, latencia_db_ms, rng)
+        base_memoria.instalar()
+        main.PERSISTENCIA_ACTIVA = False  # el estado de conversación vive solo en memoria
+    else:
+        await database.init_pool()
+        await database.inicializar_db()
+
+    # Los recibos generados van a un almacén temporal, no al del bot (los ids de la base en memoria se repiten)
+    almacen_original = artifact_store._almacen
+    directorio_almacen = tempfile.TemporaryDirectory(prefix="alqui_bot_arnes_")
+    artifact_store._almacen = artifact_store.ArtifactStore(directorio_almacen.name, ARTIFACT_STORE_MAX_MB * 1024 * 1024)
+
+    grabacion = open(grabar, "w", encoding="utf-8") if grabar else None
+    api = ApiTelegramSimulada(latencia_ms=latencia_api_ms, tasa_error=tasa_error, semilla=semilla)
+    servidor = None
+    if http:
+        servidor = ServidorTelegramFalso(api, puerto=0)
+        await servidor.iniciar()
+        application = main.construir_aplicacion(token=TOKEN_ARNES, base_url=servidor.url_base)
+    else:
+        application = main.construir_aplicacion(request=TransporteFalso(api), token=TOKEN_ARNES)
+    for job in application.job_queue.jobs():  # sin recordatorios durante la prueba
+        job.schedule_removal()
+    arnes = Arnes(application, api, timeout, grabacion, por_http=http)
+    registro_latencias.reiniciar()
+    metrics.reiniciar()
+    indice_inquilinos.invalidar()
+
+    retardos: list[float] = []
+    try:
+        await application.initialize()
+        await application.start()
+        await cola_salida.iniciar(application.bot)
+        if http:
+            await application.updater.start_polling(allowed_updates=main.ACTUALIZACIONES_PERMITIDAS, timeout=10)
+        monitor = asyncio.create_task(_medir_retardo_loop(retardos))
+        inicio = time.perf_counter()
+        if actualizaciones is not None:
+            await _reproducir(arnes, actualizaciones, tasa)
+        else:
+            fin = time.monotonic() + duracion
+            await asyncio.gather(*(
+                _usuario_virtual(arnes, usuario_id, random.Random(rng.random()), mezcla or MEZCLA_POR_DEFECTO, pausa, fin, iteraciones)
+                for usuario_id in ids_usuarios
+            ))
+        transcurrido = time.perf_counter() - inicio
+        monitor.cancel()
+    finally:
+        if application.updater and application.updater.running:
+            await application.updater.stop()
+        await cola_salida.detener()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if servidor:
+            await servidor.detener(timeout=5)
+        if grabacion:
+            grabacion.close()
+        if base_memoria:
+            base_memoria.desinstalar()
+            indice_inquilinos.invalidar()
+        else:
+            await database.close_pool()
+        main.PERSISTENCIA_ACTIVA = persistencia_activa
+        artifact_store._almacen = almacen_original
+        directorio_almacen.cleanup()
+        for usuario_id in autorizados:
+            AUTHORIZED_USERS.remove(usuario_id)
+
+    return {
+        "actualizaciones": len(arnes.latencias),
+        "sin_respuesta": arnes.sin_respuesta,
+        "duracion_s": round(transcurrido, 3),
+        "por_segundo": round(len(arnes.latencias) / transcurrido, 2) if transcurrido else 0.0,
+        "latencia_ms": _percentiles(arnes.latencias),
+        "retardo_loop_ms": _percentiles(retardos),
+        "por_handler": registro_latencias.resumen(),
+        "llamadas_api": dict(api.llamadas),
+        "errores_inyectados": dict(api.errores_inyectados),
+        "bytes_subidos": api.bytes_subidos,
+        "errores": sum(f["errores"] for f in registro_latencias.resumen() if f["etiqueta"] == ETIQUETA_TOTAL),
+    }
+
+
+def _imprimir_reporte(reporte: dict) -> None:
+    latencia, retardo = reporte["latencia_ms"], reporte["retardo_loop_ms"]
+    print(f"Actualizaciones: {reporte['actualizaciones']} en {reporte['duracion_s']:.1f} s "
+          f"({reporte['por_segundo']:.1f}/s), sin respuesta: {reporte['sin_respuesta']}, errores: {reporte['errores']}")
+    print(f"Latencia (ms):       p50 {latencia['p50']:.0f}  p95 {latencia['p95']:.0f}  p99 {latencia['p99']:.0f}  máx {latencia['maximo']:.0f}")
+    print(f"Retardo loop (ms):   p50 {retardo['p50']:.1f}  p95 {retardo['p95']:.1f}  p99 {retardo['p99']:.1f}  máx {retardo['maximo']:.1f}")
+    print(f"Llamadas a la API:   {sum(reporte['llamadas_api'].values())} ({reporte['bytes_subidos'] / 1024:.0f} KB subidos)")
+    print()
+    print(f"{'handler':<42}{'n':>7}{'p50':>8}{'p95':>8}{'p99':>8}{'err':>6}")
+    for fila in reporte["por_handler"]:
+        print(f"{fila['etiqueta'][:41]:<42}{fila['cantidad']:>7}{fila['p50']:>8.0f}{fila['p95']:>8.0f}{fila['p99']:>8.0f}{fila['errores']:>6}")
+
+def _parsear_mezcla(texto: str) -> dict:
+    mezcla = {}
+    for parte in texto.split(","):
+        nombre, _, peso = parte.partition("=")
+        if nombre.strip() not in FLUJOS:
+            raise argparse.ArgumentTypeError(f"Flujo desconocido: {nombre} (opciones: {', '.join(FLUJOS)})")
+        mezcla[nombre.strip()] = float(peso or 1)
+    return mezcla
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de Alqui_bot con un transporte de Telegram falso.")
+    parser.add_argument("--usuarios", type=int, default=10, help="Usuarios virtuales concurrentes (un chat cada uno).")
+    parser.add_argument("--duracion", type=float, default=30.0, help="Segundos de prueba (si no se indica --iteraciones).")
+    parser.add_argument("--iteraciones", type=int, help="Flujos completos por usuario, en lugar de --duracion.")
+    parser.add_argument("--mezcla", type=_parsear_mezcla, help="Pesos de los flujos, ej. pago=5,informe=1,resumen=2.")
+    parser.add_argument("--pausa", type=float, default=0.5, help="Tiempo medio de reflexión entre pasos, en segundos.")
+    parser.add_argument("--latencia-api-ms", type=float, default=30.0, help="Latencia simulada de cada llamada a la Bot API.")
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="Probabilidad de error 429/500 en los envíos a la API.")
+    parser.add_argument("--http", action="store_true", help="Usa fake_telegram_server.py por HTTP y long polling (pila completa).")
+    parser.add_argument("--db", choices=["memoria", "real"], default="memoria", help="Base en memoria o la configurada.")
+    parser.add_argument("--inquilinos", type=int, default=40, help="Inquilinos de la base en memoria.")
+    parser.add_argument("--latencia-db-ms", type=float, default=2.0, help="Latencia simulada por consulta en memoria.")
+    parser.add_argument("--reproducir", help="Archivo JSONL de actualizaciones grabadas a reproducir.")
+    parser.add_argument("--tasa", type=float, default=0.0, help="Actualizaciones por segundo al reproducir (0 = sin límite).")
+    parser.add_argument("--grabar", help="Guarda las actualizaciones enviadas en este JSONL para reproducirlas.")
+    parser.add_argument("--semilla", type=int, help="Semilla para obtener la misma secuencia de acciones.")
+    parser.add_argument("--json", action="store_true", help="Imprime el reporte en JSON.")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    reporte = asyncio.run(ejecutar(
+        usuarios=args.usuarios, duracion=args.duracion, iteraciones=args.iteraciones, mezcla=args.mezcla,
+        pausa=args.pausa, latencia_api_ms=args.latencia_api_ms, db=args.db, inquilinos=args.inquilinos,
+        latencia_db_ms=args.latencia_db_ms, reproducir=args.reproducir, tasa=args.tasa, grabar=args.grabar,
+        semilla=args.semilla, tasa_error=args.tasa_error, http=args.http,
+    ))
+    if args.json:
+        print(json.dumps(reporte, indent=2, ensure_ascii=False))
+    else:
+        _imprimir_reporte(reporte)
+    sys.exit(1 if reporte["sin_respuesta"] or reporte["errores"] else 0)
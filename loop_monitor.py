@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from config import LOOP_INTERVALO_MS, LOOP_UMBRAL_MS
+from handler_timing import medicion_de_tarea
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Los marcos de este directorio (y no de la biblioteca estándar ni de site-packages)
+# indican qué línea del bot estaba bloqueando
+_DIRECTORIO_BOT = os.path.dirname(os.path.abspath(__file__))
+# Contador común de los bloqueos fuera de una actualización (jobs, cola de salida...): el
+# nombre de la tarea cambia en cada una y daría un contador nuevo por bloqueo
+ETIQUETA_FUERA_DE_ACTUALIZACIONES = "(fuera de actualizaciones)"
+
+
+class _Bloqueo:
+    __slots__ = ("latido", "etiqueta", "update_id", "origen", "pila")
+
+    def __init__(self, latido: float, etiqueta: str, update_id: int | None, origen: str, pila: str):
+        self.latido = latido
+        self.etiqueta = etiqueta
+        self.update_id = update_id
+        self.origen = origen
+        self.pila = pila
+
+
+class MonitorLoop:
+    """
+    Vigila el retardo del event loop y atribuye los bloqueos a quien los causa.
+
+    Una tarea del loop "late" cada `intervalo_ms` y registra cuánto se retrasó
+    (loop.retardo_ms). Un hilo vigía comprueba el último latido: si el loop lleva más de
+    `umbral_ms` sin latir, alguien lo está bloqueando con código síncrono (render, E/S de
+    archivos...), y el vigía captura en ese momento la pila del hilo del loop con
+    sys._current_frames() y la tarea en curso. Si la tarea procesa una actualización, el
+    bloqueo se atribuye a su handler y update_id (ver handler_timing.py).
+
+    Al terminar el bloqueo se registra loop.bloqueos, loop.bloqueos.<handler> (o
+    loop.bloqueos.(fuera de actualizaciones)) y loop.bloqueo_ms, se guarda en `recientes`
+    (para /stats, con el nombre de la tarea si no era una actualización) y se escribe un
+    warning con la línea del bot más interna de la pila y la pila completa.
+    """
+
+    def __init__(self, intervalo_ms: float = 50, umbral_ms: float = 250, max_recientes: int = 20, profundidad: int = 30):
+        self.intervalo = intervalo_ms / 1000
+        self.umbral = umbral_ms / 1000
+        self.profundidad = profundidad
+        self.recientes: deque = deque(maxlen=max_recientes)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._id_hilo_loop: int | None = None
+        self._latido = 0.0
+        self._tarea: asyncio.Task | None = None
+        self._vigia: threading.Thread | None = None
+        self._parar = threading.Event()
+
+    @property
+    def activo(self) -> bool:
+        return self._tarea is not None and not self._tarea.done()
+
+    async def iniciar(self) -> None:
+        if self.activo:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._id_hilo_loop = threading.get_ident()
+        self._latido = time.monotonic()
+        self._parar.clear()
+        self._tarea = asyncio.create_task(self._latir(), name="monitor_loop")
+        self._vigia = threading.Thread(target=self._vigilar, name="vigia-event-loop", daemon=True)
+        self._vigia.start()
+        logger.info(f"Monitor del event loop activo (umbral {self.umbral * 1000:.0f} ms).")
+
+    async def detener(self) -> None:
+        if not self.activo:
+            return
+        self._parar.set()
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        await asyncio.to_thread(self._vigia.join, 2)
+
+    async def _latir(self) -> None:
+        while True:
+            inicio = time.monotonic()
+            await asyncio.sleep(self.intervalo)
+            self._latido = ahora = time.monotonic()
+            metrics.observar("loop.retardo_ms", max(0.0, (ahora - inicio - self.intervalo) * 1000))
+
+    # --- Hilo vigía ---
+
+    def _vigilar(self) -> None:
+        bloqueo = None
+        while not self._parar.wait(self.intervalo / 2):
+            latido = self._latido
+            if bloqueo is None:
+                if time.monotonic() - latido - self.intervalo >= self.umbral:
+                    bloqueo = self._capturar(latido)
+            elif latido != bloqueo.latido:
+                # El loop volvió a latir: el bloqueo duró lo que tardó el latido de más
+                self._registrar(bloqueo, (latido - bloqueo.latido - self.intervalo) * 1000)
+                bloqueo = None
+
+    def _capturar(self, latido: float) -> _Bloqueo:
+        """Pila del hilo del loop y tarea en curso, tomadas mientras sigue bloqueado."""
+        marco = sys._current_frames().get(self._id_hilo_loop)
+        marcos = traceback.extract_stack(marco)[-self.profundidad:] if marco is not None else []
+        propios = [m for m in marcos if m.filename.startswith(_DIRECTORIO_BOT) and m.filename != __file__]
+        origen = f"{os.path.basename(propios[-1].filename)}:{propios[-1].lineno} {propios[-1].name}" if propios else "(desconocido)"
+
+        try:
+            tarea = asyncio.current_task(self._loop)
+        except RuntimeError:
+            tarea = None
+        medicion = medicion_de_tarea(tarea)
+        if medicion is not None:
+            etiqueta, update_id = medicion.etiqueta, medicion.update_id
+        elif tarea is not None:
+            etiqueta, update_id = f"tarea {tarea.get_name()}", None
+        else:
+            etiqueta, update_id = "(fuera de tareas)", None
+        return _Bloqueo(latido, etiqueta, update_id, origen, "".join(traceback.format_list(marcos)))
+
+    def _registrar(self, bloqueo: _Bloqueo, ms: float) -> None:
+        metrics.incrementar("loop.bloqueos")
+        contador = bloqueo.etiqueta if bloqueo.update_id is not None else ETIQUETA_FUERA_DE_ACTUALIZACIONES
+        metrics.incrementar(f"loop.bloqueos.{contador}")
+        metrics.observar("loop.bloqueo_ms", ms)
+        self.recientes.append({
+            "etiqueta": bloqueo.etiqueta, "update_id": bloqueo.update_id, "ms": ms,
+            "origen": bloqueo.origen, "instante": time.time(),
+        })
+        actualizacion = f" (update {bloqueo.update_id})" if bloqueo.update_id is not None else ""
+        logger.warning(
+            f"Event loop bloqueado {ms:.0f} ms por {bloqueo.etiqueta}{actualizacion} en {bloqueo.origen}. "
+            f"Pila al superar el umbral:\n{bloqueo.pila}"
+        )
+
+
+monitor_loop = MonitorLoop(LOOP_INTERVALO_MS, LOOP_UMBRAL_MS)
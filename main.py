@@ -1,6 +1,8 @@
 import os
 import sys
+import signal
 import logging
+import argparse
 import warnings
 from datetime import time, timezone, timedelta
 from telegram.request import HTTPXRequest
@@ -13,14 +15,27 @@ import asyncio
 if os.name == 'nt':
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler
-from config import BOT_TOKEN, AUTHORIZED_USERS
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler, InlineQueryHandler, TypeHandler
+from config import (
+    BOT_TOKEN, AUTHORIZED_USERS, ACTUALIZACIONES_CONCURRENTES, MODO_EJECUCION, TELEGRAM_API_URL,
+    PERSISTENCIA_ACTIVA, PERSISTENCIA_INTERVALO, LOOP_MONITOR_ACTIVO, LOG_NIVEL, LOG_JSON,
+    WEBHOOK_URL, WEBHOOK_RUTA, WEBHOOK_HOST, WEBHOOK_PUERTO, WEBHOOK_SECRETO,
+)
 from database import inicializar_db, init_pool, close_pool
+from update_processor import ProcesadorOrdenadoPorChat
+from persistence import PersistenciaPostgres
+from outbound_queue import cola_salida
+from loop_monitor import monitor_loop
+from structured_logging import configurar_logging
+from tracing import trazador
+from tenant_index import seleccion_regex, FLUJO_PAGO, FLUJO_ESTADO_CUENTA, FLUJO_DIA_PAGO
+from handler_timing import GRUPO_INICIO, GRUPO_FIN, iniciar_medicion, finalizar_medicion, marcar_error_medicion, etiquetar_handlers
 from handlers import (
     # Handlers principales
     start, volver_menu, error_handler,
     # Pago
-    pago_inicio, pago_select_inquilino, pago_nombre_otro, pago_monto,
+    pago_inicio, pago_select_inquilino, pago_inquilino_buscado, pago_nombre_otro, pago_monto,
     # Gasto
     gasto_inicio, gasto_monto, gasto_desc, gasto_mes,
     # Inquilinos
@@ -28,7 +43,12 @@ from handlers import (
     deactivate_inquilino_prompt, deactivate_inquilino_update, activate_inquilino_prompt, 
     activate_inquilino_update, set_dia_pago_start, set_dia_pago_select_inquilino, set_dia_pago_save,
     delete_inquilino_prompt, delete_inquilino_update,
-    estado_cuenta_prompt, estado_cuenta_show, inquilinos_pendientes_handler, inquilinos_pendientes_callback, descargar_recibo_callback, descargar_excel_callback,
+    estado_cuenta_prompt, estado_cuenta_show, estado_cuenta_buscado, set_dia_pago_buscado, buscar_inquilino_inline, inquilinos_pendientes_handler, inquilinos_pendientes_callback, descargar_recibo_callback, descargar_excel_callback,
+    libro_mayor_handler,
+    recibos_lote_handler,
+    recibo_handler,
+    stats_handler,
+    profile_handler,
     # Editar/Borrar
     editar_inicio, editar_mes_actual, editar_pedir_mes, editar_pedir_anio,
     editar_listar_transacciones_custom, editar_seleccionar_transaccion, editar_ejecutar_borrado,
@@ -46,47 +66,96 @@ from handlers import (
     INQUILINO_ESTADO_CUENTA_SELECT
 )
 
-# Configurar logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Configurar logging: los registros pasan por una cola y se escriben en un hilo aparte
+configurar_logging(LOG_NIVEL, LOG_JSON)
 logger = logging.getLogger(__name__)
 
-async def main():
-    """Función principal para iniciar el bot."""
-    # Inicializar pool de base de datos
-    await init_pool()
-    await inicializar_db()
+# Tipos de actualización que se piden a Telegram (polling y webhook)
+ACTUALIZACIONES_PERMITIDAS = ['message', 'callback_query', 'inline_query']
 
-    # ✅ CORREGIDO: Configurar HTTPXRequest con timeouts más largos
-    request = HTTPXRequest(
-        http_version="1.1",
-        connect_timeout=20,  # ✅ Aumentado de 5 a 20 segundos
-        read_timeout=20,     # ✅ Aumentado de 5 a 20 segundos
-        write_timeout=20,    # ✅ Aumentado de 5 a 20 segundos
-        pool_timeout=20,     # ✅ Aumentado de 5 a 20 segundos
-    )
+class RequestTrazado(HTTPXRequest):
+    """HTTPXRequest que registra cada llamada a la Bot API como span telegram.<método> (ver tracing.py)."""
+
+    async def do_request(self, url: str, method: str, request_data=None, *args, **kwargs):
+        if trazador.actual() is None:
+            return await super().do_request(url, method, request_data, *args, **kwargs)
+        with trazador.span(f"telegram.{url.rsplit('/', 1)[-1]}") as span:
+            estado, cuerpo = await super().do_request(url, method, request_data, *args, **kwargs)
+            span.atributos["estado"] = estado
+            if request_data is not None and request_data.contains_files:
+                span.atributos["bytes_subidos"] = sum(
+                    len(valor[1]) for valor in request_data.multipart_data.values() if isinstance(valor[1], bytes)
+                )
+            return estado, cuerpo
 
-    # Crear la aplicación
-    application = Application.builder()\
-        .token(BOT_TOKEN)\
-        .request(request)\
-        .build()
+def construir_aplicacion(request=None, token: str = None, base_url: str = None) -> Application:
+    """
+    Crea la aplicación de Telegram con todos los handlers y tareas programadas registrados.
+    `request` permite inyectar otra implementación de transporte (por defecto RequestTrazado),
+    `token` otro token (por defecto BOT_TOKEN) y `base_url` otra URL de la Bot API (por
+    defecto TELEGRAM_API_URL o la oficial), como hace load_harness.py.
+    """
+    if request is None:
+        # ✅ CORREGIDO: Configurar HTTPXRequest con timeouts más largos
+        request = RequestTrazado(
+            http_version="1.1",
+            connection_pool_size=ACTUALIZACIONES_CONCURRENTES + 2,  # Una conexión por actualización concurrente
+            connect_timeout=20,  # ✅ Aumentado de 5 a 20 segundos
+            read_timeout=20,     # ✅ Aumentado de 5 a 20 segundos
+            write_timeout=20,    # ✅ Aumentado de 5 a 20 segundos
+            pool_timeout=20,     # ✅ Aumentado de 5 a 20 segundos
+        )
+
+    # Crear la aplicación. Las actualizaciones de chats distintos se procesan en paralelo;
+    # las de un mismo chat, en orden (ver update_processor.py).
+    builder = Application.builder().token(token or BOT_TOKEN).request(request)
+    if base_url or TELEGRAM_API_URL:
+        # Por ejemplo fake_telegram_server.py para pruebas de extremo a extremo sin red
+        builder = builder.base_url(base_url or TELEGRAM_API_URL)
+    # Siempre, aunque el límite sea 1: de él dependen /profile y las trazas
+    builder = builder.concurrent_updates(ProcesadorOrdenadoPorChat(max(ACTUALIZACIONES_CONCURRENTES, 1)))
+    if PERSISTENCIA_ACTIVA:
+        # Conversaciones en curso y user_data sobreviven a reinicios (ver persistence.py)
+        builder = builder.persistence(PersistenciaPostgres(intervalo=PERSISTENCIA_INTERVALO))
+    application = builder.build()
 
     # ✅ SEGURIDAD: Filtro global para restringir el uso solo a usuarios autorizados
     auth_filter = filters.User(AUTHORIZED_USERS)
     main_menu_regex = "^(📥 Registrar Pago|💸 Registrar Gasto|👤 Gestionar Inquilinos|✏️ Editar/Borrar|📊 Ver Resumen|📈 Generar Informe|🗑️ Deshacer|❌ Cancelar)$"
     text_filter = filters.TEXT & ~filters.COMMAND & ~filters.Regex(main_menu_regex)
 
+    # === MEDICIÓN: latencia por handler (primer y último grupo, ver handler_timing.py) ===
+    application.add_handler(TypeHandler(Update, iniciar_medicion), group=GRUPO_INICIO)
+    application.add_handler(TypeHandler(Update, finalizar_medicion), group=GRUPO_FIN)
+
     # === HANDLER: /start ===
     application.add_handler(CommandHandler("start", start, filters=auth_filter))
 
+    # === HANDLER: /libro (Libro mayor completo en CSV comprimido) ===
+    application.add_handler(CommandHandler("libro", libro_mayor_handler, filters=auth_filter))
+
+    # === HANDLER: /stats (Latencias por handler, pool y cachés) ===
+    application.add_handler(CommandHandler("stats", stats_handler, filters=auth_filter))
+
+    # === HANDLER: /profile [next|N|off] (Perfil de las próximas acciones del usuario) ===
+    application.add_handler(CommandHandler("profile", profile_handler, filters=auth_filter))
+
+    # === HANDLER: /recibo <id> (Recibo de cualquier pago registrado) ===
+    application.add_handler(CommandHandler("recibo", recibo_handler, filters=auth_filter))
+
+    # === HANDLER: /recibos (Recibos de todos los pagos de un mes) ===
+    application.add_handler(CommandHandler("recibos", recibos_lote_handler, filters=auth_filter))
+
     # === HANDLER: Registrar Pago ===
     application.add_handler(ConversationHandler(
+        name="registrar_pago",
+        persistent=PERSISTENCIA_ACTIVA,
         entry_points=[MessageHandler(filters.Regex("^📥 Registrar Pago$") & auth_filter, pago_inicio)],
         states={
-            PAGO_SELECT_INQUILINO: [CallbackQueryHandler(pago_select_inquilino, pattern="^pago_")],
+            PAGO_SELECT_INQUILINO: [
+                CallbackQueryHandler(pago_select_inquilino, pattern="^pago_"),
+                MessageHandler(filters.Regex(seleccion_regex(FLUJO_PAGO)), pago_inquilino_buscado),
+            ],
             PAGO_NOMBRE_OTRO: [MessageHandler(text_filter, pago_nombre_otro)],
             PAGO_MONTO: [MessageHandler(text_filter, pago_monto)],
         },
@@ -97,6 +166,8 @@ async def main():
 
     # === HANDLER: Registrar Gasto ===
     application.add_handler(ConversationHandler(
+        name="registrar_gasto",
+        persistent=PERSISTENCIA_ACTIVA,
         entry_points=[MessageHandler(filters.Regex("^💸 Registrar Gasto$") & auth_filter, gasto_inicio)],
         states={
             GASTO_MONTO: [MessageHandler(text_filter, gasto_monto)],
@@ -109,6 +180,8 @@ async def main():
 
     # === HANDLER: Gestionar Inquilinos ===
     application.add_handler(ConversationHandler(
+        name="gestionar_inquilinos",
+        persistent=PERSISTENCIA_ACTIVA,
         entry_points=[MessageHandler(filters.Regex("^👤 Gestionar Inquilinos$") & auth_filter, gestionar_inquilinos_menu)],
         states={
             INQUILINO_MENU: [
@@ -125,16 +198,25 @@ async def main():
             INQUILINO_ADD_NOMBRE: [MessageHandler(text_filter, add_inquilino_save)],
             INQUILINO_DEACTIVATE_SELECT: [CallbackQueryHandler(deactivate_inquilino_update, pattern="^(deact_|cancel_inquilino)")],
             INQUILINO_ACTIVATE_SELECT: [CallbackQueryHandler(activate_inquilino_update, pattern="^(act_|cancel_inquilino)")],
-            INQUILINO_SET_DIA_PAGO_SELECT: [CallbackQueryHandler(set_dia_pago_select_inquilino, pattern="^(diapago_|cancel_inquilino)")],
+            INQUILINO_SET_DIA_PAGO_SELECT: [
+                CallbackQueryHandler(set_dia_pago_select_inquilino, pattern="^(diapago_|cancel_inquilino)"),
+                MessageHandler(filters.Regex(seleccion_regex(FLUJO_DIA_PAGO)), set_dia_pago_buscado),
+            ],
             INQUILINO_SET_DIA_PAGO_SAVE: [MessageHandler(text_filter, set_dia_pago_save)],
             INQUILINO_DELETE_SELECT: [CallbackQueryHandler(delete_inquilino_update, pattern="^(delinq_|cancel_inquilino)")],
-            INQUILINO_ESTADO_CUENTA_SELECT: [CallbackQueryHandler(estado_cuenta_show, pattern="^(ec_|cancel_inquilino)")],
+            INQUILINO_ESTADO_CUENTA_SELECT: [
+                CallbackQueryHandler(estado_cuenta_show, pattern="^(ec_|cancel_inquilino)"),
+                MessageHandler(filters.Regex(seleccion_regex(FLUJO_ESTADO_CUENTA)), estado_cuenta_buscado),
+            ],
         },
         fallbacks=[MessageHandler(filters.Regex("^❌ Cancelar$"), volver_menu)],
         allow_reentry=True,
         per_message=False,
     ))
 
+    # === HANDLER: Búsqueda inline de inquilinos (@bot <nombre>) ===
+    application.add_handler(InlineQueryHandler(buscar_inquilino_inline))
+
     # === HANDLERS de Callbacks Globales (Recibos, Excel y Pendientes) ===
     application.add_handler(CallbackQueryHandler(descargar_recibo_callback, pattern="^dl_recibo_"))
     application.add_handler(CallbackQueryHandler(descargar_excel_callback, pattern="^dl_excel_"))
@@ -142,6 +224,8 @@ async def main():
 
     # === HANDLER: Editar/Borrar ===
     application.add_handler(ConversationHandler(
+        name="editar_borrar",
+        persistent=PERSISTENCIA_ACTIVA,
         entry_points=[MessageHandler(filters.Regex("^✏️ Editar/Borrar$") & auth_filter, editar_inicio)],
         states={
             EDITAR_INICIO: [
@@ -163,6 +247,8 @@ async def main():
 
     # === HANDLER: Generar Informe ===
     application.add_handler(ConversationHandler(
+        name="generar_informe",
+        persistent=PERSISTENCIA_ACTIVA,
         entry_points=[MessageHandler(filters.Regex("^📈 Generar Informe$") & auth_filter, informe_inicio)],
         states={
             INFORME_MES: [
@@ -179,6 +265,8 @@ async def main():
 
     # === HANDLER: Deshacer ===
     application.add_handler(ConversationHandler(
+        name="deshacer",
+        persistent=PERSISTENCIA_ACTIVA,
         entry_points=[MessageHandler(filters.Regex("^🗑️ Deshacer$") & auth_filter, deshacer_menu)],
         states={
             DESHACER_MENU: [
@@ -191,59 +279,126 @@ async def main():
         allow_reentry=True,
     ))
 
+    # === MEDICIÓN: cada handler registrado etiqueta la actualización que atiende ===
+    etiquetar_handlers(application)
+
     # === HANDLER DE ERROR ===
     application.add_error_handler(error_handler)
+    application.add_error_handler(marcar_error_medicion)
 
     # === TAREA AUTOMÁTICA: Recordatorios diarios ===
     # Configurar zona horaria de República Dominicana (UTC-4)
     do_tz = timezone(timedelta(hours=-4))
+    # Un solo job calcula los recordatorios y los reparte a todos los usuarios autorizados
     if AUTHORIZED_USERS:
-        for user_id in AUTHORIZED_USERS:
-            application.job_queue.run_daily(
-                enviar_recordatorios_pago,
-                time=time(hour=8, minute=0, tzinfo=do_tz),
-                chat_id=user_id
-            )
-            # Recordatorio inmediato al reiniciar/iniciar el bot (3 segundos después de arrancar)
-            application.job_queue.run_once(
-                enviar_recordatorios_pago,
-                when=3,
-                chat_id=user_id
-            )
+        destinatarios = {"destinatarios": list(AUTHORIZED_USERS)}
+        application.job_queue.run_daily(
+            enviar_recordatorios_pago,
+            time=time(hour=8, minute=0, tzinfo=do_tz),
+            data=destinatarios,
+            name="recordatorios_pago",
+        )
+        # Recordatorio inmediato al reiniciar/iniciar el bot (3 segundos después de arrancar)
+        application.job_queue.run_once(
+            enviar_recordatorios_pago,
+            when=3,
+            data=destinatarios,
+            name="recordatorios_pago_inicio",
+        )
+
+    return application
+
+def _instalar_senales(stop_event: asyncio.Event) -> None:
+    """SIGTERM/SIGINT detienen el bot de forma ordenada (Railway envía SIGTERM al redesplegar)."""
+    loop = asyncio.get_running_loop()
+    for senal in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(senal, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows no admite add_signal_handler: Ctrl+C sigue llegando como KeyboardInterrupt
+            pass
+
+async def iniciar_webhook(application: Application) -> None:
+    """
+    Recibe las actualizaciones con el servidor webhook de python-telegram-bot (extra
+    [webhooks]), que las encola en `application.update_queue` igual que el long polling,
+    y registra el webhook en Telegram con WEBHOOK_URL.
+    """
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL es obligatoria en modo webhook (URL pública que se registra en Telegram).")
+    if not WEBHOOK_SECRETO:
+        logger.warning("WEBHOOK_SECRETO no está definido: el webhook acepta peticiones sin token secreto.")
+    ruta = WEBHOOK_RUTA.strip('/')
+    url = f"{WEBHOOK_URL.rstrip('/')}/{ruta}"
+    await application.updater.start_webhook(
+        listen=WEBHOOK_HOST,
+        port=WEBHOOK_PUERTO,
+        url_path=ruta,
+        webhook_url=url,
+        secret_token=WEBHOOK_SECRETO,
+        allowed_updates=ACTUALIZACIONES_PERMITIDAS,
+        max_connections=max(ACTUALIZACIONES_CONCURRENTES, 1),
+    )
+    logger.info(f"Webhook escuchando en {WEBHOOK_HOST}:{WEBHOOK_PUERTO} y registrado en {url}")
 
-    logger.info("Bot iniciado correctamente.")
+async def main(modo: str = "polling"):
+    """Función principal para iniciar el bot en modo polling o webhook."""
+    # Inicializar pool de base de datos
+    await init_pool()
+    await inicializar_db()
+
+    application = construir_aplicacion()
+    logger.info(f"Bot iniciado correctamente (modo {modo}).")
 
     # Iniciar el bot con reintentos automáticos
     await application.initialize()
     await application.start()
-    
+    # Cola de envíos salientes (recordatorios, informes); recupera lo pendiente del último arranque
+    await cola_salida.iniciar(application.bot)
+    if LOOP_MONITOR_ACTIVO:
+        await monitor_loop.iniciar()
+
+    stop_event = asyncio.Event()
+    _instalar_senales(stop_event)
     try:
-        await application.updater.start_polling(
-            allowed_updates=['message', 'callback_query'],
-            timeout=30,  # ✅ Timeout de polling aumentado
-            read_timeout=20,  # ✅ Timeout de lectura
-            write_timeout=20,  # ✅ Timeout de escritura
-            connect_timeout=20,  # ✅ Timeout de conexión
-        )
+        if modo == "webhook":
+            await iniciar_webhook(application)
+        else:
+            await application.updater.start_polling(
+                allowed_updates=ACTUALIZACIONES_PERMITIDAS,
+                timeout=30,  # ✅ Timeout de polling aumentado
+                read_timeout=20,  # ✅ Timeout de lectura
+                write_timeout=20,  # ✅ Timeout de escritura
+                connect_timeout=20,  # ✅ Timeout de conexión
+            )
         
         # ✅ CORREGIDO: start_polling no bloquea el hilo principal.
         # Necesitamos un evento que espere para que el script no termine y el bot siga escuchando.
         logger.info("El bot está escuchando mensajes...")
-        stop_event = asyncio.Event()
         await stop_event.wait()
+        logger.info("Deteniendo el bot...")
     except Exception as e:
-        logger.error(f"Error en polling: {e}", exc_info=True)
+        logger.error(f"Error en {modo}: {e}", exc_info=True)
     finally:
-        # Cerrar el pool de base de datos
-        await close_pool()
+        # Primero se deja de recibir actualizaciones (polling o webhook); Application.stop()
+        # procesa las ya encoladas, la cola de salida entrega o guarda lo pendiente, y solo
+        # después se cierra el pool que todo eso usa.
         if application.updater and application.updater.running:
             await application.updater.stop()
         await application.stop()
+        await cola_salida.detener()
+        await monitor_loop.detener()
+        await close_pool()
+        trazador.exportador.detener()
 
 if __name__ == '__main__':
     try:
         import asyncio
-        asyncio.run(main())
+        parser = argparse.ArgumentParser(description="Alqui_bot")
+        parser.add_argument("--mode", choices=["polling", "webhook"], default=MODO_EJECUCION,
+                            help="Cómo recibir las actualizaciones de Telegram (por defecto MODO_EJECUCION).")
+        args = parser.parse_args()
+        asyncio.run(main(args.mode))
     except KeyboardInterrupt:
         logger.info("Bot detenido por el usuario.")
         sys.exit(0)
@@ -0,0 +1,57 @@
+import threading
+from collections import Counter
+
+# Contadores internos del bot (en memoria, por proceso). Los nombres usan puntos
+# como separador de grupo, por ejemplo "prerender.usados".
+_lock = threading.Lock()
+_contadores = Counter()
+# Valores observados (tamaños, tiempos): nombre -> [cantidad, total, máximo]
+_valores = {}
+# Indicadores instantáneos (colas, conexiones en uso): nombre -> función que devuelve el valor actual
+_indicadores = {}
+
+def incrementar(nombre: str, cantidad: int = 1) -> None:
+    """Suma `cantidad` al contador `nombre`."""
+    with _lock:
+        _contadores[nombre] += cantidad
+
+def obtener_contadores(prefijo: str = "") -> dict:
+    """Devuelve una copia de los contadores, opcionalmente solo los que empiezan por `prefijo`."""
+    with _lock:
+        return {nombre: valor for nombre, valor in _contadores.items() if nombre.startswith(prefijo)}
+
+def observar(nombre: str, valor: float) -> None:
+    """Registra una observación numérica (bytes, milisegundos, etc.) bajo `nombre`."""
+    with _lock:
+        acumulado = _valores.get(nombre)
+        if acumulado is None:
+            _valores[nombre] = [1, valor, valor]
+        else:
+            acumulado[0] += 1
+            acumulado[1] += valor
+            acumulado[2] = max(acumulado[2], valor)
+
+def obtener_valores(prefijo: str = "") -> dict:
+    """Devuelve {nombre: {cantidad, total, promedio, maximo}} de los valores observados."""
+    with _lock:
+        return {
+            nombre: {"cantidad": cantidad, "total": total, "promedio": total / cantidad, "maximo": maximo}
+            for nombre, (cantidad, total, maximo) in _valores.items() if nombre.startswith(prefijo)
+        }
+
+def registrar_indicador(nombre: str, funcion) -> None:
+    """Registra un indicador cuyo valor se calcula con `funcion()` en el momento de consultarlo."""
+    with _lock:
+        _indicadores[nombre] = funcion
+
+def obtener_indicadores(prefijo: str = "") -> dict:
+    """Devuelve el valor actual de los indicadores registrados."""
+    with _lock:
+        funciones = {nombre: funcion for nombre, funcion in _indicadores.items() if nombre.startswith(prefijo)}
+    return {nombre: funcion() for nombre, funcion in funciones.items()}
+
+def reiniciar() -> None:
+    """Pone todos los contadores y valores a cero (usado en pruebas)."""
+    with _lock:
+        _contadores.clear()
+        _valores.clear()
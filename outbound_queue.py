@@ -0,0 +1,358 @@
+import time
+import pickle
+import asyncio
+import logging
+from collections import deque
+from telegram.error import RetryAfter, BadRequest, Forbidden, NetworkError
+from config import (
+    SALIDA_MENSAJES_POR_SEGUNDO, SALIDA_MENSAJES_POR_CHAT, SALIDA_RAFAGA_CHAT,
+    SALIDA_LOTE_MAXIMO, SALIDA_MAX_INTENTOS, SALIDA_PERSISTIR,
+)
+import database
+import metrics
+from tracing import trazador
+
+logger = logging.getLogger(__name__)
+
+METODOS_PERMITIDOS = ("send_message", "send_document", "send_photo")
+
+
+class _Cubeta:
+    """Cubeta de tokens: `tasa` envíos por segundo con ráfagas de hasta `capacidad`."""
+
+    __slots__ = ("tasa", "capacidad", "tokens", "instante", "pausa_hasta")
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self.instante = time.monotonic()
+        self.pausa_hasta = 0.0
+
+    def _rellenar(self, ahora: float) -> None:
+        if ahora > self.instante:
+            self.tokens = min(self.capacidad, self.tokens + (ahora - self.instante) * self.tasa)
+            self.instante = ahora
+
+    def disponible(self, ahora: float) -> bool:
+        if ahora < self.pausa_hasta:
+            return False
+        self._rellenar(ahora)
+        return self.tokens >= 1
+
+    def tomar(self) -> None:
+        self.tokens -= 1
+
+    def listo_en(self, ahora: float) -> float:
+        """Instante (monotonic) en que habrá un token disponible."""
+        self._rellenar(ahora)
+        faltante = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.tasa
+        return max(self.pausa_hasta, ahora + faltante)
+
+    def pausar(self, segundos: float, ahora: float) -> None:
+        self.pausa_hasta = max(self.pausa_hasta, ahora + segundos)
+
+    def llena(self, ahora: float) -> bool:
+        return ahora >= self.pausa_hasta and self.tokens + max(ahora - self.instante, 0) * self.tasa >= self.capacidad
+
+
+class _Envio:
+    __slots__ = ("chat_id", "metodo", "datos", "bot", "futuro", "intentos", "no_antes", "encolado", "id_db", "persistible", "span")
+
+    def __init__(self, chat_id: int, metodo: str, datos: dict, bot=None, futuro: asyncio.Future = None):
+        self.chat_id = chat_id
+        self.metodo = metodo
+        self.datos = datos
+        self.bot = bot
+        self.futuro = futuro
+        self.intentos = 0
+        self.no_antes = 0.0
+        self.encolado = time.monotonic()
+        self.id_db = None
+        # Solo los mensajes de texto se guardan en envios_pendientes: un documento o una foto
+        # llevarían el archivo entero (InputFile con el PDF/XLSX) en cada fila.
+        self.persistible = metodo == "send_message"
+        # Span de quien encoló: el envío, hecho luego por el despachador, cuelga de su traza
+        self.span = trazador.actual()
+
+    def resolver(self, enviado: bool) -> None:
+        if self.futuro and not self.futuro.done():
+            self.futuro.set_result(enviado)
+
+
+class ColaSalida:
+    """
+    Cola de envíos salientes a Telegram con límites de velocidad, para repartir
+    notificaciones a muchos chats sin chocar con los límites anti-flood.
+
+    - Cubeta global (`tasa_global` envíos/s) y una por chat (`tasa_chat` envíos/s con
+      ráfagas de `rafaga_chat`). Dentro de un chat los envíos salen de uno en uno y en orden.
+    - Hasta `lote_maximo` envíos en vuelo a la vez, cada uno en su propia tarea: un envío
+      lento (subir un documento) solo retiene a los de su chat, y su plaza se libera en
+      cuanto termina, sin esperar al resto.
+    - RetryAfter pausa la cubeta global el tiempo indicado y reencola el envío; los errores
+      de red se reintentan con espera exponencial hasta `max_intentos`. BadRequest/Forbidden
+      (chat inexistente, bot bloqueado) fallan sin reintentar.
+    - Los mensajes de texto que siguen pendientes al final de un ciclo se guardan en la
+      tabla envios_pendientes (en lote), y al arrancar se recuperan; los que salen en el
+      primer ciclo no llegan a escribirse. Documentos y fotos solo se mantienen en memoria. La entrega es "al menos una vez": si el proceso muere
+      en mitad de un envío, puede repetirse tras el reinicio.
+    - Si la cola no está iniciada (pruebas, scripts), `enviar` manda directamente con las
+      mismas reglas de reintento.
+
+    Métricas: salida.encolados, .enviados, .fallidos, .reintentos, .limitados (RetryAfter),
+    salida.espera_ms, salida.lote y los indicadores salida.pendientes y salida.persistidos.
+    """
+
+    def __init__(self, tasa_global: float = 25, tasa_chat: float = 1, rafaga_chat: int = 3,
+                 lote_maximo: int = 25, max_intentos: int = 5, persistir: bool = True):
+        self.tasa_global = tasa_global
+        self.tasa_chat = tasa_chat
+        self.rafaga_chat = rafaga_chat
+        self.lote_maximo = lote_maximo
+        self.max_intentos = max_intentos
+        self.persistir = persistir
+        self._cola: deque[_Envio] = deque()
+        self._global = _Cubeta(tasa_global, max(tasa_global, 1))
+        self._cubetas_chat: dict[int, _Cubeta] = {}
+        self._por_borrar: list[int] = []
+        self._en_vuelo: dict[_Envio, asyncio.Task] = {}
+        self._ultimo_borrado = 0.0
+        self._bot = None
+        self._trabajador: asyncio.Task | None = None
+        self._despertar: asyncio.Event | None = None
+        self._deteniendo = False
+        metrics.registrar_indicador("salida.pendientes", lambda: len(self._cola))
+        metrics.registrar_indicador("salida.persistidos", lambda: sum(1 for e in self._cola if e.id_db is not None))
+
+    @property
+    def activa(self) -> bool:
+        return self._trabajador is not None and not self._trabajador.done()
+
+    @property
+    def pendientes(self) -> int:
+        return len(self._cola)
+
+    # --- API pública ---
+
+    def encolar(self, bot, chat_id: int, metodo: str, **datos) -> asyncio.Future:
+        """Encola `bot.<metodo>(chat_id=chat_id, **datos)` y devuelve un futuro que se resuelve con True/False."""
+        if metodo not in METODOS_PERMITIDOS:
+            raise ValueError(f"Método de envío no admitido: {metodo}")
+        futuro = asyncio.get_running_loop().create_future()
+        self._cola.append(_Envio(chat_id, metodo, datos, bot, futuro))
+        metrics.incrementar("salida.encolados")
+        if self._despertar:
+            self._despertar.set()
+        return futuro
+
+    async def enviar(self, bot, chat_id: int, metodo: str = "send_message", **datos) -> bool:
+        """Envía a través de la cola (o directamente si no está iniciada) y devuelve si se entregó."""
+        if not self.activa:
+            return await self._enviar_directo(_Envio(chat_id, metodo, datos, bot))
+        return await self.encolar(bot, chat_id, metodo, **datos)
+
+    async def iniciar(self, bot) -> None:
+        """Recupera los envíos pendientes guardados y arranca el despachador."""
+        self._bot = bot
+        self._deteniendo = False
+        self._despertar = asyncio.Event()
+        if self.persistir and database.pool is not None:
+            try:
+                recuperados = 0
+                for id_db, chat_id, metodo, datos in await database.cargar_envios_pendientes():
+                    envio = _Envio(chat_id, metodo, pickle.loads(datos))
+                    envio.id_db = id_db
+                    self._cola.append(envio)
+                    recuperados += 1
+                if recuperados:
+                    logger.info(f"Cola de salida: {recuperados} envíos pendientes recuperados.")
+            except Exception as e:
+                logger.error(f"No se pudieron recuperar los envíos pendientes: {e}", exc_info=True)
+        self._trabajador = asyncio.create_task(self._trabajar())
+
+    async def detener(self, timeout: float = 10.0) -> None:
+        """Espera hasta `timeout` s a que se vacíe la cola; lo que quede se guarda para el próximo arranque."""
+        if not self.activa:
+            return
+        self._deteniendo = True
+        self._despertar.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._trabajador), timeout)
+        except asyncio.TimeoutError:
+            tareas = [self._trabajador, *self._en_vuelo.values()]
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+            # Los envíos interrumpidos se consideran pendientes (pueden llegar a repetirse)
+            self._cola.extendleft(reversed(list(self._en_vuelo)))
+            self._en_vuelo = {}
+        await self._persistir()
+        if self._cola:
+            logger.warning(f"Cola de salida detenida con {len(self._cola)} envíos pendientes (guardados).")
+        for envio in self._cola:
+            envio.resolver(False)
+
+    # --- Despacho ---
+
+    async def _trabajar(self) -> None:
+        while True:
+            self._despertar.clear()
+            try:
+                espera = await self._ciclo()
+            except Exception as e:
+                # Un ciclo fallido no debe dejar la cola sin despachador (los futuros quedarían colgados)
+                logger.error(f"Error en el ciclo de la cola de salida: {e}", exc_info=True)
+                espera = 1.0
+            if self._deteniendo and not self._cola and not self._en_vuelo:
+                return
+            try:
+                await asyncio.wait_for(self._despertar.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _ciclo(self) -> float | None:
+        """Lanza los envíos listos y devuelve cuántos segundos esperar al siguiente (None = hasta que haya novedades)."""
+        ahora = time.monotonic()
+        lanzados, restantes = 0, deque()
+        # Un chat con un envío en vuelo no puede lanzar el siguiente hasta que termine, para conservar el orden
+        chats_vistos = {envio.chat_id for envio in self._en_vuelo}
+        for envio in self._cola:
+            cubeta = self._cubeta_chat(envio.chat_id)
+            # Solo el primer envío pendiente de cada chat puede salir
+            if (envio.chat_id not in chats_vistos and len(self._en_vuelo) < self.lote_maximo and envio.no_antes <= ahora
+                    and self._global.disponible(ahora) and cubeta.disponible(ahora)):
+                self._global.tomar()
+                cubeta.tomar()
+                self._en_vuelo[envio] = asyncio.create_task(self._despachar(envio))
+                lanzados += 1
+            else:
+                restantes.append(envio)
+            chats_vistos.add(envio.chat_id)
+        self._cola = restantes
+        if lanzados:
+            metrics.observar("salida.lote", lanzados)
+
+        await self._persistir()
+
+        ahora = time.monotonic()
+        for chat_id in [c for c, cubeta in self._cubetas_chat.items() if c not in chats_vistos and cubeta.llena(ahora)]:
+            del self._cubetas_chat[chat_id]
+        if len(self._en_vuelo) >= self.lote_maximo:
+            return None
+        # Solo cuenta el primer envío de cada chat sin envío en vuelo: los demás esperan a que salga ese
+        primeros = {}
+        for envio in self._cola:
+            primeros.setdefault(envio.chat_id, envio)
+        for envio in self._en_vuelo:
+            primeros.pop(envio.chat_id, None)
+        if not primeros:
+            return None
+        # (los encolados durante un envío pueden ser de chats sin cubeta todavía)
+        proximo = min(max(envio.no_antes, self._cubeta_chat(chat_id).listo_en(ahora)) for chat_id, envio in primeros.items())
+        return max(max(proximo, self._global.listo_en(ahora)) - ahora, 0.005)
+
+    async def _despachar(self, envio: _Envio) -> None:
+        """Hace un envío en su propia tarea y, al terminar, libera su plaza y despierta al despachador."""
+        estado, demora = await self._intentar(envio)
+        # Si se cancela (detener con timeout), el envío sigue en _en_vuelo y detener() lo devuelve a la cola
+        del self._en_vuelo[envio]
+        if estado == "reintentar":
+            envio.no_antes = time.monotonic() + demora
+            # Vuelve al frente: era el primero de su chat
+            self._cola.appendleft(envio)
+        else:
+            envio.resolver(estado == "ok")
+            if envio.id_db is not None:
+                self._por_borrar.append(envio.id_db)
+        self._despertar.set()
+
+    def _cubeta_chat(self, chat_id: int) -> _Cubeta:
+        cubeta = self._cubetas_chat.get(chat_id)
+        if cubeta is None:
+            cubeta = self._cubetas_chat[chat_id] = _Cubeta(self.tasa_chat, self.rafaga_chat)
+        return cubeta
+
+    async def _intentar(self, envio: _Envio) -> tuple[str, float]:
+        """Hace un envío. Devuelve ("ok"|"fallo", 0) o ("reintentar", segundos de espera)."""
+        bot = envio.bot or self._bot
+        try:
+            with trazador.span(f"salida.{envio.metodo}", padre=envio.span, intento=envio.intentos + 1,
+                               espera_ms=round((time.monotonic() - envio.encolado) * 1000, 1)):
+                await getattr(bot, envio.metodo)(chat_id=envio.chat_id, **envio.datos)
+        except RetryAfter as e:
+            metrics.incrementar("salida.limitados")
+            self._global.pausar(e.retry_after, time.monotonic())
+            logger.warning(f"Límite de envíos de Telegram: pausa de {e.retry_after} s.")
+            return self._reintento(envio, e.retry_after, e)
+        except (BadRequest, Forbidden) as e:
+            logger.error(f"Envío a {envio.chat_id} rechazado por Telegram: {e}")
+            metrics.incrementar("salida.fallidos")
+            return "fallo", 0
+        except NetworkError as e:
+            return self._reintento(envio, min(2 ** envio.intentos, 60), e)
+        except Exception as e:
+            logger.error(f"No se pudo enviar a {envio.chat_id}: {e}", exc_info=True)
+            metrics.incrementar("salida.fallidos")
+            return "fallo", 0
+        metrics.incrementar("salida.enviados")
+        metrics.observar("salida.espera_ms", (time.monotonic() - envio.encolado) * 1000)
+        return "ok", 0
+
+    def _reintento(self, envio: _Envio, demora: float, error: Exception) -> tuple[str, float]:
+        envio.intentos += 1
+        if envio.intentos >= self.max_intentos:
+            logger.error(f"Envío a {envio.chat_id} descartado tras {envio.intentos} intentos: {error}")
+            metrics.incrementar("salida.fallidos")
+            return "fallo", 0
+        metrics.incrementar("salida.reintentos")
+        return "reintentar", demora
+
+    async def _enviar_directo(self, envio: _Envio) -> bool:
+        while True:
+            estado, demora = await self._intentar(envio)
+            if estado != "reintentar":
+                return estado == "ok"
+            await asyncio.sleep(demora)
+
+    async def _persistir(self) -> None:
+        """Guarda en un lote los envíos nuevos aún pendientes y borra los ya resueltos."""
+        if not self.persistir or database.pool is None:
+            return
+        nuevos = [envio for envio in self._cola if envio.id_db is None and envio.persistible]
+        filas = []
+        for envio in nuevos:
+            try:
+                filas.append((envio.chat_id, envio.metodo, pickle.dumps(envio.datos, protocol=pickle.HIGHEST_PROTOCOL)))
+            except Exception as e:
+                logger.warning(f"Envío a {envio.chat_id} no serializable; solo se mantendrá en memoria: {e}")
+                envio.persistible = False
+        nuevos = [envio for envio in nuevos if envio.persistible]
+        try:
+            if filas:
+                for envio, id_db in zip(nuevos, await database.guardar_envios_pendientes(filas)):
+                    envio.id_db = id_db
+            # Los borrados se agrupan: con la cola limitada a pocos envíos por ciclo, borrar
+            # en cada uno sería una sentencia por mensaje.
+            ahora = time.monotonic()
+            if self._por_borrar and (not self._cola or len(self._por_borrar) >= self.lote_maximo
+                                     or ahora - self._ultimo_borrado >= 1.0):
+                self._ultimo_borrado = ahora
+                ids, self._por_borrar = self._por_borrar, []
+                try:
+                    await database.borrar_envios_pendientes(ids)
+                except Exception:
+                    self._por_borrar.extend(ids)
+                    raise
+        except Exception as e:
+            logger.error(f"Error al guardar la cola de salida: {e}", exc_info=True)
+
+
+cola_salida = ColaSalida(
+    tasa_global=SALIDA_MENSAJES_POR_SEGUNDO,
+    tasa_chat=SALIDA_MENSAJES_POR_CHAT,
+    rafaga_chat=SALIDA_RAFAGA_CHAT,
+    lote_maximo=SALIDA_LOTE_MAXIMO,
+    max_intentos=SALIDA_MAX_INTENTOS,
+    persistir=SALIDA_PERSISTIR,
+)
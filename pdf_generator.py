@@ -1,11 +1,22 @@
 import io
 from datetime import datetime
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, KeepTogether
+from reportlab.platypus import SimpleDocTemplate, Table, LongTable, TableStyle, Paragraph, Spacer, KeepTogether
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.units import inch
+from reportlab.lib.utils import simpleSplit
 from decimal import Decimal
+from pdf_options import opciones_documento, perfil_salida
+from tracing import trazar
+
+# A partir de este número de filas (pagos + gastos) el informe usa el modo de
+# informe grande: LongTable con cabecera repetida y estilos por bandas.
+UMBRAL_INFORME_GRANDE = 150
+# Filas por bloque de LongTable en el modo de informe grande. Cada división de
+# página recalcula la tabla restante, así que acotar el bloque mantiene el coste
+# de maquetación lineal respecto al número total de filas.
+FILAS_POR_BLOQUE = 200
 
 def format_currency_pdf(value: float) -> str:
     """Formatea un valor numérico como moneda para el PDF."""
@@ -14,13 +25,68 @@ def format_currency_pdf(value: float) -> str:
     except (ValueError, TypeError):
         return "RD$ 0.00"
 
-def crear_informe_pdf(datos_informe: dict, mes: int, anio: int):
+def _formatear_fecha_pdf(fecha) -> str:
+    """Convierte una fecha (date o 'YYYY-MM-DD') al formato DD/MM/YYYY."""
+    fecha_obj = datetime.strptime(str(fecha), '%Y-%m-%d') if isinstance(fecha, str) else fecha
+    return fecha_obj.strftime('%d/%m/%Y')
+
+def es_informe_grande(datos_informe: dict) -> bool:
+    """Indica si el informe supera el umbral de filas del modo de informe grande."""
+    filas = len(datos_informe.get('pagos_mes', [])) + len(datos_informe.get('gastos_mes', []))
+    return filas > UMBRAL_INFORME_GRANDE
+
+def _tablas_detalle_grande(encabezados: list, filas: list, color_cabecera: str, color_banda: str) -> list:
+    """
+    Construye las tablas de detalle escalables para meses con cientos de filas.
+    Usa bloques LongTable de FILAS_POR_BLOQUE filas con la cabecera repetida en
+    cada página, un único comando de bandas (ROWBACKGROUNDS) y cadenas planas
+    en lugar de Paragraph; el texto libre se parte en líneas con simpleSplit.
+    """
+    # Ancho útil de la columna de texto (3.8 pulgadas menos el padding por defecto)
+    ancho_texto = 3.8*inch - 12
+    estilo = TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor(color_cabecera)),
+        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0,0), (-1,-1), 10),
+        ('LEADING', (0,0), (-1,-1), 13),
+        ('TEXTCOLOR', (0,1), (-1,-1), colors.HexColor('#334155')),
+        ('FONTNAME', (2,1), (2,-1), 'Helvetica-Bold'),
+        ('TEXTCOLOR', (2,1), (2,-1), colors.HexColor('#0F172A')),
+        ('ALIGN', (2,0), (2,-1), 'RIGHT'),
+        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+        ('TOPPADDING', (0,0), (-1,-1), 6),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 6),
+        ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.white, colors.HexColor(color_banda)]),
+        ('LINEBELOW', (0,1), (-1,-1), 0.5, colors.HexColor('#E2E8F0')),
+        ('BOX', (0,0), (-1,-1), 1, colors.HexColor(color_cabecera)),
+    ])
+
+    tablas = []
+    for inicio in range(0, len(filas), FILAS_POR_BLOQUE):
+        data = [list(encabezados)]
+        for _, fecha, texto, monto in filas[inicio:inicio + FILAS_POR_BLOQUE]:
+            lineas = simpleSplit(str(texto), 'Helvetica', 10, ancho_texto)
+            data.append([_formatear_fecha_pdf(fecha), '\n'.join(lineas), format_currency_pdf(monto)])
+        tabla = LongTable(data, colWidths=[1.5*inch, 3.8*inch, 1.7*inch], repeatRows=1)
+        tabla.setStyle(estilo)
+        tablas.append(tabla)
+    return tablas
+
+@trazar()
+def crear_informe_pdf(datos_informe: dict, mes: int, anio: int, destino: str = None):
     """
     Genera un informe mensual ejecutivo en formato PDF con diseño visual premium.
+
+    Si se indica `destino` (ruta de archivo), el PDF se escribe directamente en
+    disco y se devuelve la ruta; en caso contrario se devuelve un io.BytesIO.
+    Los meses que superan UMBRAL_INFORME_GRANDE filas se renderizan con tablas
+    LongTable paginables en lugar de bloques KeepTogether.
     """
-    buffer = io.BytesIO()
+    buffer = destino if destino else io.BytesIO()
     # Márgenes ejecutivos modernos (0.6 pulgadas)
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=45, leftMargin=45, topMargin=45, bottomMargin=45)
+    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=45, leftMargin=45, topMargin=45, bottomMargin=45, **opciones_documento())
+    informe_grande = es_informe_grande(datos_informe)
     
     styles = getSampleStyleSheet()
     elementos = []
@@ -127,7 +193,14 @@ def crear_informe_pdf(datos_informe: dict, mes: int, anio: int):
 
     # --- 3. Detalle de Pagos Recibidos ---
     pagos = datos_informe.get('pagos_mes', [])
-    if pagos:
+    if pagos and informe_grande:
+        elementos.append(Paragraph("DETALLE DE COBROS Y PAGOS RECIBIDOS", section_style))
+        elementos.append(Spacer(1, 6))
+        elementos.extend(_tablas_detalle_grande(
+            ['Fecha Cobro', 'Inquilino / Pagador', 'Monto Recibido'], pagos, '#059669', '#F0FDF4'
+        ))
+        elementos.append(Spacer(1, 16))
+    elif pagos:
         th_pago = ParagraphStyle('THPago', parent=body_bold, textColor=colors.white)
         elementos.append(Paragraph("DETALLE DE COBROS Y PAGOS RECIBIDOS", section_style))
         elementos.append(Spacer(1, 6))
@@ -159,7 +232,13 @@ def crear_informe_pdf(datos_informe: dict, mes: int, anio: int):
 
     # --- 4. Detalle de Gastos Realizados ---
     gastos = datos_informe.get('gastos_mes', [])
-    if gastos:
+    if gastos and informe_grande:
+        elementos.append(Paragraph("DETALLE DE GASTOS Y MANTENIMIENTOS", section_style))
+        elementos.append(Spacer(1, 6))
+        elementos.extend(_tablas_detalle_grande(
+            ['Fecha', 'Descripción del Gasto', 'Monto Gasto'], gastos, '#E11D48', '#FFF1F2'
+        ))
+    elif gastos:
         th_gasto = ParagraphStyle('THGasto', parent=body_bold, textColor=colors.white)
         elementos.append(Paragraph("DETALLE DE GASTOS Y MANTENIMIENTOS", section_style))
         elementos.append(Spacer(1, 6))
@@ -188,6 +267,9 @@ def crear_informe_pdf(datos_informe: dict, mes: int, anio: int):
         tabla_gastos.setStyle(TableStyle(t_style_g))
         elementos.append(KeepTogether(tabla_gastos))
 
-    doc.build(elementos)
+    with perfil_salida():
+        doc.build(elementos)
+    if destino:
+        return destino
     buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return buffer
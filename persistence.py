@@ -0,0 +1,157 @@
+import json
+import pickle
+import asyncio
+import logging
+from telegram.ext import BasePersistence, PersistenceInput
+import database
+import metrics
+
+logger = logging.getLogger(__name__)
+
+TIPO_USUARIO = "user"
+PREFIJO_CONVERSACION = "conv:"
+
+
+class PersistenciaPostgres(BasePersistence):
+    """
+    Persistencia de python-telegram-bot sobre la tabla bot_persistencia de PostgreSQL.
+
+    Guarda el estado de los ConversationHandler persistentes y el user_data de cada
+    usuario (serializados con pickle), para que un reinicio a mitad de un flujo no lo pierda.
+
+    - Escritura diferida: Application llama a update_* cada `intervalo` segundos con lo que
+      cambió; aquí solo se marca como pendiente, y todo lo pendiente se escribe después
+      en un único lote (un INSERT ... ON CONFLICT de varias filas y un DELETE) por transacción.
+    - Carga perezosa: al arrancar solo se leen las conversaciones (una consulta). El user_data
+      de cada usuario se lee la primera vez que llega una actualización suya; después no
+      hay más lecturas, así que la persistencia no añade ida y vuelta a la base por mensaje.
+
+    chat_data, bot_data y callback_data no se usan en el bot y no se guardan.
+    """
+
+    def __init__(self, intervalo: float = 10):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=intervalo,
+        )
+        # (tipo, clave) -> objeto a serializar, o None si hay que borrar la fila
+        self._pendientes: dict[tuple[str, str], object] = {}
+        self._escritura: asyncio.Task | None = None
+        self._cargas_usuario: dict[int, asyncio.Task] = {}
+        self._conversaciones: dict[str, dict] | None = None
+
+    # --- Escritura diferida ---
+
+    def _marcar(self, tipo: str, clave: str, datos: object) -> None:
+        self._pendientes[(tipo, clave)] = datos
+        if self._escritura is None or self._escritura.done():
+            self._escritura = asyncio.create_task(self._escribir_pendientes())
+
+    async def _escribir_pendientes(self) -> None:
+        # Se cede el turno para que las demás llamadas update_* de la misma ronda entren en el lote
+        await asyncio.sleep(0)
+        while self._pendientes:
+            lote, self._pendientes = self._pendientes, {}
+            filas, borrados = [], []
+            for (tipo, clave), datos in lote.items():
+                if datos is None:
+                    borrados.append((tipo, clave))
+                else:
+                    filas.append((tipo, clave, pickle.dumps(datos, protocol=pickle.HIGHEST_PROTOCOL)))
+            try:
+                await database.guardar_persistencia_lote(filas, borrados)
+                metrics.incrementar("persistencia.lotes")
+                metrics.observar("persistencia.filas_por_lote", len(filas) + len(borrados))
+            except Exception as e:
+                logger.error(f"Error al guardar el estado del bot ({len(lote)} cambios); se reintentará: {e}", exc_info=True)
+                metrics.incrementar("persistencia.errores")
+                # Se conservan para el próximo intento, salvo lo que se haya vuelto a modificar
+                for llave, datos in lote.items():
+                    self._pendientes.setdefault(llave, datos)
+                return
+
+    async def flush(self) -> None:
+        """Escribe todo lo pendiente (Application.stop() la llama al detener el bot)."""
+        if self._escritura and not self._escritura.done():
+            await self._escritura
+        if self._pendientes:
+            self._escritura = asyncio.create_task(self._escribir_pendientes())
+            await self._escritura
+        if self._pendientes:
+            logger.warning(f"Se detuvo el bot con {len(self._pendientes)} cambios de estado sin guardar.")
+
+    # --- user_data (carga perezosa por usuario) ---
+
+    async def get_user_data(self) -> dict:
+        # Nada al arrancar: cada usuario se carga en refresh_user_data con su primer mensaje
+        return {}
+
+    async def _cargar_usuario(self, user_id: int) -> dict:
+        datos = await database.cargar_persistencia(TIPO_USUARIO, str(user_id))
+        metrics.incrementar("persistencia.cargas_usuario")
+        return pickle.loads(datos) if datos else {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        tarea = self._cargas_usuario.get(user_id)
+        if tarea is None:
+            tarea = self._cargas_usuario[user_id] = asyncio.create_task(self._cargar_usuario(user_id))
+        elif tarea.done():
+            return
+        try:
+            guardado = await asyncio.shield(tarea)
+        except Exception as e:
+            logger.error(f"Error al cargar el estado del usuario {user_id}: {e}", exc_info=True)
+            # Se reintentará con su próxima actualización
+            self._cargas_usuario.pop(user_id, None)
+            return
+        for clave, valor in guardado.items():
+            user_data.setdefault(clave, valor)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._marcar(TIPO_USUARIO, str(user_id), data)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._marcar(TIPO_USUARIO, str(user_id), None)
+
+    # --- Conversaciones (una consulta al arrancar para todos los handlers) ---
+
+    async def get_conversations(self, name: str) -> dict:
+        if self._conversaciones is None:
+            self._conversaciones = {}
+            for tipo, clave, datos in await database.cargar_persistencia_prefijo(PREFIJO_CONVERSACION):
+                nombre = tipo[len(PREFIJO_CONVERSACION):]
+                self._conversaciones.setdefault(nombre, {})[tuple(json.loads(clave))] = pickle.loads(datos)
+            logger.info(f"Conversaciones restauradas: {sum(len(c) for c in self._conversaciones.values())}")
+        return self._conversaciones.pop(name, {})
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        self._marcar(f"{PREFIJO_CONVERSACION}{name}", json.dumps(list(key)), new_state)
+
+    # --- Datos no usados por el bot ---
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
@@ -0,0 +1,100 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from config import RECIBO_PRERENDER_TTL
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Entrada:
+    __slots__ = ("tarea", "creado", "usado")
+
+    def __init__(self, tarea: asyncio.Task):
+        self.tarea = tarea
+        self.creado = time.monotonic()
+        self.usado = False
+
+
+class CachePrerender:
+    """
+    Caché en memoria de recibos renderizados especulativamente, con TTL corto y
+    clave pago_id. Cada entrada guarda la tarea de renderizado: si el usuario pulsa
+    el botón antes de que termine, se espera esa misma tarea en lugar de renderizar
+    otra vez. La tarea devuelve (recibo_data, {formato: bytes}).
+
+    Métricas: prerender.programados, prerender.aciertos, prerender.usados,
+    prerender.desperdiciados (expirados sin usar) y prerender.fallidos.
+    """
+
+    def __init__(self, ttl_segundos: float, max_entradas: int = 32):
+        self.ttl = ttl_segundos
+        self.max_entradas = max_entradas
+        self._entradas: OrderedDict[int, _Entrada] = OrderedDict()
+        metrics.registrar_indicador("prerender.entradas", lambda: len(self._entradas))
+
+    @property
+    def activa(self) -> bool:
+        return self.ttl > 0
+
+    def _retirar(self, pago_id: int) -> None:
+        entrada = self._entradas.pop(pago_id, None)
+        if entrada is None:
+            return
+        if not entrada.usado:
+            metrics.incrementar("prerender.desperdiciados")
+        if not entrada.tarea.done():
+            entrada.tarea.cancel()
+
+    def _purgar(self) -> None:
+        """Retira las entradas expiradas y las más antiguas si se supera el máximo."""
+        limite = time.monotonic() - self.ttl
+        for pago_id in [p for p, e in self._entradas.items() if e.creado < limite]:
+            self._retirar(pago_id)
+        while len(self._entradas) > self.max_entradas:
+            self._retirar(next(iter(self._entradas)))
+
+    def programar(self, pago_id: int, tarea: asyncio.Task) -> None:
+        """Registra la tarea de prerenderizado de un pago recién guardado."""
+        self._retirar(pago_id)
+        self._entradas[pago_id] = _Entrada(tarea)
+        metrics.incrementar("prerender.programados")
+        self._purgar()
+
+    async def obtener(self, pago_id: int, formato: str) -> tuple[bytes, dict] | None:
+        """Devuelve (contenido, recibo_data) prerenderizados, o None si no hay entrada válida."""
+        self._purgar()
+        entrada = self._entradas.get(pago_id)
+        if entrada is None:
+            return None
+        try:
+            recibo_data, archivos = await asyncio.shield(entrada.tarea)
+        except asyncio.CancelledError:
+            # Si lo cancelado es el prerenderizado (descartar o purgar mientras se esperaba),
+            # quien llama sigue sin recibo y debe poder renderizarlo por su cuenta
+            if entrada.tarea.cancelled() and not asyncio.current_task().cancelling():
+                return None
+            raise
+        except Exception as e:
+            logger.warning(f"Falló el prerenderizado del recibo {pago_id}: {e}")
+            metrics.incrementar("prerender.fallidos")
+            self._entradas.pop(pago_id, None)
+            return None
+        contenido = archivos.get(formato)
+        if contenido is None:
+            return None
+        if not entrada.usado:
+            entrada.usado = True
+            metrics.incrementar("prerender.usados")
+        metrics.incrementar("prerender.aciertos")
+        return contenido, recibo_data
+
+    def descartar(self, pago_id: int) -> None:
+        """Elimina la entrada de un pago (por ejemplo, al borrarlo) sin contarla como desperdicio."""
+        entrada = self._entradas.pop(pago_id, None)
+        if entrada and not entrada.tarea.done():
+            entrada.tarea.cancel()
+
+
+cache_prerender = CachePrerender(RECIBO_PRERENDER_TTL)
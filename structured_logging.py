@@ -0,0 +1,90 @@
+import sys
+import json
+import atexit
+import queue
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from handler_timing import medicion_actual
+
+FORMATO_TEXTO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: QueueListener | None = None
+
+
+class FiltroContexto(logging.Filter):
+    """
+    Añade a cada registro el update_id y el handler de la actualización en curso
+    (handler_timing), o None fuera de una actualización. Debe correr donde se emite el
+    registro, no en el hilo que escribe, porque lee variables de contexto de la tarea.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        medicion = medicion_actual()
+        record.update_id = medicion.update_id if medicion else None
+        record.handler = medicion.etiqueta if medicion else None
+        return True
+
+
+class FormateadorJSON(logging.Formatter):
+    """Una línea JSON por registro: ts, nivel, logger, mensaje, update_id, handler y excepcion."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+            "update_id": getattr(record, "update_id", None),
+            "handler": getattr(record, "handler", None),
+        }
+        if record.exc_info:
+            datos["excepcion"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            datos["excepcion"] = record.exc_text
+        if record.stack_info:
+            datos["pila"] = self.formatStack(record.stack_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class _ManejadorCola(QueueHandler):
+    """
+    QueueHandler que deja el trabajo caro al hilo del listener: en el hilo que emite solo
+    se resuelve el mensaje (%-args) para fijar su valor; las trazas de `exc_info` se
+    formatean en el listener (formatearlas lee los archivos fuente del disco).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def configurar_logging(nivel: str | int = logging.INFO, formato_json: bool = False, destino=None) -> None:
+    """
+    Envía el logging raíz a una cola que un QueueListener vacía en un hilo aparte, de modo
+    que escribir (en `destino`, por defecto stderr) nunca bloquea el event loop. Como
+    basicConfig, no hace nada si el logger raíz ya tiene handlers.
+    """
+    global _listener
+    raiz = logging.getLogger()
+    if raiz.handlers:
+        return
+    salida = logging.StreamHandler(destino or sys.stderr)
+    salida.setFormatter(FormateadorJSON() if formato_json else logging.Formatter(FORMATO_TEXTO))
+    cola = queue.SimpleQueue()
+    manejador = _ManejadorCola(cola)
+    manejador.addFilter(FiltroContexto())
+    raiz.addHandler(manejador)
+    raiz.setLevel(nivel)
+    _listener = QueueListener(cola, salida, respect_handler_level=True)
+    _listener.start()
+    atexit.register(detener_logging)
+
+
+def detener_logging() -> None:
+    """Escribe lo que quede en la cola y detiene el hilo del listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,153 @@
+import re
+import time
+import logging
+import unicodedata
+from collections import defaultdict
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Flujos que abren la búsqueda inline: su botón escribe "@bot <flujo>: " y el flujo viaja en
+# el texto del resultado ('👤 Nombre (pago #12)'). Cada conversación solo reconoce el suyo
+# (seleccion_regex), así una conversación abandonada en otro flujo no se queda con la selección.
+FLUJO_PAGO = "pago"
+FLUJO_ESTADO_CUENTA = "ec"
+FLUJO_DIA_PAGO = "dia"
+FLUJOS_BUSQUEDA = (FLUJO_PAGO, FLUJO_ESTADO_CUENTA, FLUJO_DIA_PAGO)
+# Texto que envía el resultado inline al chat (sin flujo si la consulta no lo indica)
+FORMATO_SELECCION = "👤 {nombre} ({flujo} #{id})"
+SELECCION_INQUILINO_REGEX = r"^👤 .+ \((?:\w+ )?#(\d+)\)$"
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin acentos ni signos y con espacios simples: 'José  Peña' -> 'jose pena'."""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    sin_acentos = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s]", " ", sin_acentos.casefold()).split())
+
+
+def _trigramas(texto: str) -> set[str]:
+    relleno = f"  {texto} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def seleccion_regex(flujo: str) -> str:
+    """Regex de los resultados inline elegidos desde el flujo `flujo` ('👤 Nombre (<flujo> #id)')."""
+    return rf"^👤 .+ \({re.escape(flujo)} #(\d+)\)$"
+
+
+def texto_seleccion(nombre: str, inquilino_id: int, flujo: str | None = None) -> str:
+    """Texto que envía al chat el resultado inline de un inquilino."""
+    if flujo is None:
+        return f"👤 {nombre} (#{inquilino_id})"
+    return FORMATO_SELECCION.format(nombre=nombre, flujo=flujo, id=inquilino_id)
+
+
+def separar_flujo(consulta: str) -> tuple[str | None, str]:
+    """'pago: jose' -> ('pago', 'jose'); sin prefijo de un flujo conocido -> (None, consulta)."""
+    flujo, separador, resto = consulta.partition(":")
+    flujo = flujo.strip().lower()
+    if separador and flujo in FLUJOS_BUSQUEDA:
+        return flujo, resto.strip()
+    return None, consulta
+
+
+def extraer_id_seleccion(texto: str) -> int | None:
+    """Devuelve el id de un texto '👤 Nombre (<flujo> #id)' enviado desde la búsqueda inline, o None."""
+    coincidencia = re.match(SELECCION_INQUILINO_REGEX, texto or "")
+    return int(coincidencia.group(1)) if coincidencia else None
+
+
+class IndiceInquilinos:
+    """
+    Índice en memoria de nombres de inquilinos para la búsqueda inline.
+
+    - Prefijos: cada palabra normalizada del nombre (sin acentos ni mayúsculas) aporta
+      todos sus prefijos, así "jo pe" encuentra "José Peña" intersectando los conjuntos.
+    - Trigramas: si los prefijos no llenan el resultado, se completa con los nombres que
+      comparten más de la mitad de los trigramas de la consulta (errores de tipeo,
+      coincidencias en mitad de palabra).
+
+    Se reconstruye entero a partir de `obtener_inquilinos` (una consulta) cuando se
+    invalida tras un alta/baja/cambio o al pasar `ttl_segundos`, para recoger cambios
+    hechos fuera del bot.
+    """
+
+    def __init__(self, ttl_segundos: float = 300):
+        self.ttl = ttl_segundos
+        self._inquilinos: dict[int, tuple] = {}
+        self._normalizados: dict[int, str] = {}
+        self._prefijos: dict[str, set[int]] = defaultdict(set)
+        self._trigramas: dict[str, set[int]] = defaultdict(set)
+        self._cargado_en: float | None = None
+
+    @property
+    def vigente(self) -> bool:
+        return self._cargado_en is not None and time.monotonic() - self._cargado_en < self.ttl
+
+    def __len__(self) -> int:
+        return len(self._inquilinos)
+
+    def cargar(self, filas) -> None:
+        """Reconstruye el índice a partir de filas (id, nombre, activo, dia_pago)."""
+        inquilinos, normalizados = {}, {}
+        prefijos, trigramas = defaultdict(set), defaultdict(set)
+        for fila in filas:
+            inquilino_id, nombre = fila[0], fila[1]
+            inquilinos[inquilino_id] = tuple(fila)
+            normalizado = normalizar(nombre)
+            normalizados[inquilino_id] = normalizado
+            for palabra in normalizado.split():
+                for i in range(1, len(palabra) + 1):
+                    prefijos[palabra[:i]].add(inquilino_id)
+            for trigrama in _trigramas(normalizado):
+                trigramas[trigrama].add(inquilino_id)
+        self._inquilinos, self._normalizados = inquilinos, normalizados
+        self._prefijos, self._trigramas = prefijos, trigramas
+        self._cargado_en = time.monotonic()
+
+    def invalidar(self) -> None:
+        """Fuerza la recarga en la próxima búsqueda (tras crear, activar, desactivar o borrar)."""
+        self._cargado_en = None
+
+    async def asegurar_cargado(self, obtener_inquilinos) -> None:
+        if not self.vigente:
+            self.cargar(await obtener_inquilinos(activos_only=False))
+            logger.info("Índice de inquilinos cargado (%d nombres).", len(self))
+
+    def buscar(self, consulta: str, limite: int = 20, solo_activos: bool = False) -> list[tuple]:
+        """Devuelve hasta `limite` filas (id, nombre, activo, dia_pago) que coinciden con `consulta`."""
+        inicio = time.perf_counter()
+        texto = normalizar(consulta)
+        if not texto:
+            candidatos = [i for i in self._inquilinos if not solo_activos or self._inquilinos[i][2]]
+            ids = sorted(candidatos, key=self._normalizados.get)[:limite]
+        else:
+            # 1) Todas las palabras de la consulta son prefijo de alguna palabra del nombre
+            conjuntos = [self._prefijos.get(palabra, set()) for palabra in texto.split()]
+            por_prefijo = set.intersection(*conjuntos) if conjuntos else set()
+            if solo_activos:
+                por_prefijo = {i for i in por_prefijo if self._inquilinos[i][2]}
+            # Primero los que empiezan por la consulta, luego los más cortos y por orden alfabético
+            ids = sorted(por_prefijo, key=lambda i: (not self._normalizados[i].startswith(texto), len(self._normalizados[i]), self._normalizados[i]))[:limite]
+
+            # 2) Completar con coincidencias aproximadas por trigramas
+            if len(ids) < limite:
+                trigramas_consulta = _trigramas(texto)
+                conteo = defaultdict(int)
+                for trigrama in trigramas_consulta:
+                    for i in self._trigramas.get(trigrama, ()):
+                        conteo[i] += 1
+                minimo = len(trigramas_consulta) // 2 + 1
+                ya = set(ids)
+                aproximados = [
+                    i for i, n in conteo.items()
+                    if n >= minimo and i not in ya and (not solo_activos or self._inquilinos[i][2])
+                ]
+                aproximados.sort(key=lambda i: (-conteo[i], self._normalizados[i]))
+                ids += aproximados[:limite - len(ids)]
+        metrics.observar("busqueda.inquilinos.ms", (time.perf_counter() - inicio) * 1000)
+        return [self._inquilinos[i] for i in ids]
+
+
+indice_inquilinos = IndiceInquilinos()
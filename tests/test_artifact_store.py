@@ -0,0 +1,75 @@
+import os
+import time
+import pytest
+from decimal import Decimal
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+from artifact_store import ArtifactStore
+
+
+def test_guardar_y_obtener_comparte_contenido(tmp_path):
+    almacen = ArtifactStore(str(tmp_path), max_bytes=10_000)
+    sha_a = almacen.guardar("recibo_1_v1.pdf", b"contenido", {"inquilino": "Ana"})
+    sha_b = almacen.guardar("recibo_2_v1.pdf", b"contenido")
+
+    assert sha_a == sha_b
+    assert almacen.obtener("recibo_1_v1.pdf") == (b"contenido", {"inquilino": "Ana"})
+    assert almacen.obtener("recibo_2_v1.pdf") == (b"contenido", {})
+    assert almacen.obtener("no_existe.pdf") is None
+    # El mismo contenido se guarda una sola vez
+    blobs = [f for _, _, archivos in os.walk(tmp_path / "blobs") for f in archivos]
+    assert len(blobs) == 1
+
+    almacen.invalidar("recibo_1_v1.pdf")
+    assert almacen.obtener("recibo_1_v1.pdf") is None
+    assert almacen.obtener("recibo_2_v1.pdf") is not None
+
+    with pytest.raises(ValueError):
+        almacen.guardar("../fuera", b"x")
+
+
+def test_desalojo_por_tamano_elimina_lo_menos_usado(tmp_path):
+    almacen = ArtifactStore(str(tmp_path), max_bytes=250)
+    almacen.guardar("a", b"a" * 100)
+    almacen.guardar("b", b"b" * 100)
+    # Envejece "a" y "b", luego usa "a" para que "b" quede como el menos reciente
+    antiguo = time.time() - 60
+    for raiz, _, archivos in os.walk(tmp_path / "blobs"):
+        for nombre in archivos:
+            os.utime(os.path.join(raiz, nombre), (antiguo, antiguo))
+    assert almacen.obtener("a") is not None
+
+    almacen.guardar("c", b"c" * 100)
+    assert almacen.obtener("b") is None
+    assert almacen.obtener("a") is not None
+    assert almacen.obtener("c") is not None
+    # El tamaño total se recalcula correctamente al reabrir el almacén
+    assert ArtifactStore(str(tmp_path), max_bytes=250)._total_bytes == 200
+
+
+@pytest.mark.asyncio
+async def test_descarga_recibo_historico_usa_el_almacen(tmp_path):
+    from handlers import descargar_recibo_callback
+    almacen = ArtifactStore(str(tmp_path), max_bytes=10_000_000)
+
+    update = MagicMock()
+    update.callback_query = AsyncMock()
+    update.callback_query.data = "dl_recibo_pdf_42"
+    update.callback_query.message.chat_id = 1
+    context = MagicMock()
+    context.user_data = {}
+    context.bot = AsyncMock()
+
+    fila = (42, date(2026, 7, 3), "Carlos", Decimal("15000"), 6, 2026)
+    with patch('handlers.obtener_almacen', return_value=almacen), \
+         patch('handlers.obtener_pago_por_id', AsyncMock(return_value=fila)) as mock_db, \
+         patch('handlers.crear_recibo_pdf', wraps=__import__('receipt_generator').crear_recibo_pdf) as mock_pdf:
+        await descargar_recibo_callback(update, context)
+        await descargar_recibo_callback(update, context)
+
+    # La segunda descarga se sirve del almacén sin consultar la BD ni re-renderizar
+    mock_db.assert_awaited_once_with(42)
+    mock_pdf.assert_called_once_with(42, "2026-07-03", "Carlos", Decimal("15000"), "Junio 2026")
+    assert context.bot.send_document.await_count == 2
+    caption = context.bot.send_document.await_args.kwargs['caption']
+    assert "#0042" in caption and "Carlos" in caption
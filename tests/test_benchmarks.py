@@ -0,0 +1,22 @@
+import pytest
+from benchmarks import ejecutar, comparar, ESCENARIOS
+
+
+@pytest.mark.asyncio
+async def test_ejecutar_y_comparar_con_linea_base():
+    resultados = await ejecutar("png.recibo,grafico.financiero", repeticiones=1)
+    assert set(resultados["escenarios"]) == {"png.recibo", "grafico.financiero"}
+    recibo = resultados["escenarios"]["png.recibo"]
+    assert recibo["real_ms"] > 0 and recibo["cpu_ms"] > 0 and recibo["memoria_pico_kb"] > 0
+    # Sin --db no se seleccionan los escenarios de base de datos
+    assert ESCENARIOS["db.informe_mensual"].requiere_db
+
+    assert comparar(resultados, resultados) == []
+    base = {"escenarios": {
+        "png.recibo": {**recibo, "real_ms": recibo["real_ms"] / 2, "memoria_pico_kb": recibo["memoria_pico_kb"] - 10},
+        "grafico.financiero": {"error": "falló"},
+    }}
+    regresiones = comparar(resultados, base, umbral_tiempo=0.5)
+    # El tiempo se duplicó (+100 % > 50 %); 10 KB más de memoria está dentro de la tolerancia
+    assert [(r["escenario"], r["metrica"]) for r in regresiones] == [("png.recibo", "real_ms")]
+    assert comparar(resultados, base, umbral_tiempo=1.5) == []
@@ -0,0 +1,51 @@
+import csv
+from datetime import date
+from unittest.mock import patch, MagicMock
+from dataset_generator import generar
+from database import _cargar_csv
+
+
+def _leer(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_generar_determinista_y_ordenado(tmp_path):
+    a, b, c = tmp_path / "a", tmp_path / "b", tmp_path / "c"
+    for directorio in (a, b, c):
+        directorio.mkdir()
+    archivos = generar(str(a), semilla=3, inquilinos=60, anios=2, gastos_mes=10, hasta=date(2026, 6, 15))
+    generar(str(b), semilla=3, inquilinos=60, anios=2, gastos_mes=10, hasta=date(2026, 6, 15))
+    generar(str(c), semilla=4, inquilinos=60, anios=2, gastos_mes=10, hasta=date(2026, 6, 15))
+
+    for tabla in ("inquilinos", "pagos", "gastos"):
+        assert (a / f"{tabla}.csv").read_bytes() == (b / f"{tabla}.csv").read_bytes()
+    assert (a / "pagos.csv").read_bytes() != (c / "pagos.csv").read_bytes()
+
+    inquilinos, pagos = _leer(archivos["inquilinos"][0]), _leer(archivos["pagos"][0])
+    assert archivos["pagos"][1] == len(pagos) and len({i["nombre"] for i in inquilinos}) == 60
+    fechas = [p["fecha"] for p in pagos]
+    assert fechas == sorted(fechas) and "2024-06-28" <= fechas[0] and fechas[-1] <= "2026-06-15"
+    assert len({(p["inquilino"], p["fecha"]) for p in pagos}) == len(pagos)
+    # Hay pagos en dos partes: más de un pago del mismo inquilino para el mismo mes
+    periodos = [(p["inquilino"], p["mes_alquiler"], p["anio_alquiler"]) for p in pagos]
+    assert len(set(periodos)) < len(periodos)
+
+
+def test_cargar_csv_en_una_transaccion(tmp_path):
+    archivos = {tabla: ruta for tabla, (ruta, _) in generar(str(tmp_path), semilla=1, inquilinos=5, anios=1, gastos_mes=2).items()}
+    mock_conn = MagicMock()
+    mock_cur = mock_conn.cursor.return_value.__enter__.return_value
+    mock_cur.rowcount = 7
+
+    with patch('database.psycopg2.connect', return_value=mock_conn):
+        filas = _cargar_csv("dsn", archivos, vaciar=True)
+
+    assert filas == {"inquilinos": 7, "pagos": 7, "gastos": 7}
+    sentencias = [llamada.args[0] for llamada in mock_cur.execute.call_args_list]
+    assert sentencias[0].startswith("TRUNCATE") and "ANALYZE pagos" in sentencias
+    copias = [llamada.args[0] for llamada in mock_cur.copy_expert.call_args_list]
+    assert copias[0] == "COPY inquilinos (nombre, activo, dia_pago) FROM STDIN WITH CSV HEADER"
+    assert copias[1].startswith("COPY pagos (fecha, inquilino, monto, mes_alquiler, anio_alquiler)")
+    mock_conn.commit.assert_called_once()
+    mock_conn.close.assert_called_once()
@@ -0,0 +1,50 @@
+import io
+import random
+import asyncio
+import pytest
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import RetryAfter
+from fake_telegram_server import ApiTelegramSimulada, ServidorTelegramFalso
+
+TOKEN = "123:prueba"
+
+
+@pytest.mark.asyncio
+async def test_bot_real_contra_servidor_simulado():
+    api = ApiTelegramSimulada(tasa_error=1.0, errores=("429",), metodos_error=("sendPhoto",), espera_429=3)
+    servidor = ServidorTelegramFalso(api, puerto=0)
+    await servidor.iniciar()
+    bot = Bot(TOKEN, base_url=servidor.url_base)
+    try:
+        await bot.initialize()
+        assert bot.id == 999000001
+
+        teclado = InlineKeyboardMarkup([[InlineKeyboardButton("Recibo", callback_data="dl_recibo_7")]])
+        mensaje = await bot.send_message(chat_id=42, text="Pago registrado", reply_markup=teclado)
+        assert mensaje.text == "Pago registrado"
+        assert api.boton(42, "dl_recibo_", random.Random()) == (mensaje.message_id, "dl_recibo_7")
+
+        # Multipart: el archivo llega completo
+        await bot.send_document(chat_id=42, document=io.BytesIO(b"%PDF" * 1000), filename="recibo.pdf", caption="Recibo")
+        assert api.enviados[-1]["archivos"] == {"document": {"nombre": "recibo.pdf", "bytes": 4000}}
+        assert api.bytes_subidos == 4000
+
+        # Error inyectado con el formato de Telegram
+        with pytest.raises(RetryAfter) as error:
+            await bot.send_photo(chat_id=42, photo=io.BytesIO(b"png"))
+        assert error.value.retry_after == 3 and api.errores_inyectados["429"] == 1
+
+        # Long polling: getUpdates espera hasta que llega una actualización
+        espera = asyncio.create_task(bot.get_updates(timeout=5))
+        await asyncio.sleep(0.05)
+        assert not espera.done()
+        update_id = api.encolar_actualizacion({"message": {
+            "message_id": 1, "date": 0, "text": "/start", "chat": {"id": 42, "type": "private"},
+        }})
+        actualizaciones = await asyncio.wait_for(espera, 2)
+        assert [a.update_id for a in actualizaciones] == [update_id]
+        # Pedir desde el siguiente offset confirma la anterior
+        assert await bot.get_updates(offset=update_id + 1, timeout=0) == ()
+    finally:
+        await bot.shutdown()
+        await servidor.detener(timeout=2)
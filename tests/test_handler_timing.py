@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from telegram import Update, Message, Chat, User
+from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters
+from handler_timing import (
+    RegistroLatencias, registro_latencias, iniciar_medicion, finalizar_medicion, marcar_error_medicion,
+    marcar_recepcion, etiquetar_handlers, ETIQUETA_TOTAL, ETIQUETA_SIN_HANDLER,
+)
+
+
+def _update(update_id: int, texto: str) -> Update:
+    chat = Chat(id=1, type=Chat.PRIVATE)
+    usuario = User(id=1, first_name="Prueba", is_bot=False)
+    return Update(update_id=update_id, message=Message(message_id=update_id, date=None, chat=chat, from_user=usuario, text=texto))
+
+
+def test_percentiles_moviles_y_errores():
+    registro = RegistroLatencias(ventana=100)
+    for ms in range(1, 201):  # solo quedan las últimas 100: 101..200
+        registro.registrar("pago_monto", ms, error=ms % 50 == 0)
+    registro.registrar("start", 5)
+
+    total, pago, start = registro.resumen()
+    assert total["etiqueta"] == ETIQUETA_TOTAL and total["cantidad"] == 201
+    assert pago == {"etiqueta": "pago_monto", "cantidad": 200, "errores": 4, "p50": 150, "p95": 195, "p99": 199, "maximo": 200}
+    assert start["p99"] == 5 and start["errores"] == 0
+
+
+@pytest.mark.asyncio
+async def test_medicion_etiqueta_conversacion_y_errores():
+    async def pago_inicio(update, context):
+        return 1
+
+    async def pago_monto(update, context):
+        return ConversationHandler.END
+
+    conversacion = ConversationHandler(
+        name="registrar_pago",
+        entry_points=[MessageHandler(filters.Regex("^Pagar$"), pago_inicio)],
+        states={1: [MessageHandler(filters.TEXT, pago_monto)]},
+        fallbacks=[],
+    )
+    contexto = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+    contexto.application.handlers = {-1: [], 0: [conversacion], 1000: []}
+    etiquetar_handlers(contexto.application)
+    registro_latencias.reiniciar()
+
+    async def procesar(update: Update, falla: bool):
+        # Como en Application.process_update: grupo -1, handler, error handlers y último grupo en la misma tarea
+        marcar_recepcion()
+        await iniciar_medicion(update, contexto)
+        await asyncio.sleep(0.01)
+        check = conversacion.check_update(update)
+        if check:
+            await conversacion.handle_update(update, contexto.application, check, contexto)
+        if falla:
+            await marcar_error_medicion(update, contexto)
+        await finalizar_medicion(update, contexto)
+
+    await asyncio.create_task(procesar(_update(1, "Pagar"), False))
+    await asyncio.create_task(procesar(_update(2, "1500"), True))
+    await asyncio.create_task(procesar(_update(3, "hola"), False))
+
+    filas = {f["etiqueta"]: f for f in registro_latencias.resumen()}
+    assert set(filas) == {ETIQUETA_TOTAL, "registrar_pago.pago_inicio", "registrar_pago.pago_monto", ETIQUETA_SIN_HANDLER}
+    assert filas["registrar_pago.pago_monto"]["errores"] == 1
+    assert filas[ETIQUETA_TOTAL]["cantidad"] == 3 and filas[ETIQUETA_TOTAL]["p50"] >= 10
+
+    from handlers import stats_handler
+    mock_update = MagicMock(spec=Update)
+    mock_update.message = AsyncMock()
+    await stats_handler(mock_update, contexto)
+    texto = mock_update.message.reply_text.await_args.args[0]
+    assert "registrar_pago.pago_monto" in texto and "p99" in texto
+    registro_latencias.reiniciar()
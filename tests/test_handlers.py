@@ -170,6 +170,7 @@ class TestGenerarInforme:
         mock_update = AsyncMock(spec=Update)
         mock_update.message = AsyncMock()
         mock_context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+        mock_context.bot = AsyncMock()
 
         mock_report_data = {
             "total_ingresos": Decimal("15000.00"),
@@ -183,7 +184,35 @@ class TestGenerarInforme:
         with patch("handlers.obtener_informe_mensual", new_callable=AsyncMock, return_value=mock_report_data):
             result = await generar_informe_mensual(mock_update, mock_context, 7, 2026)
 
-            mock_update.message.reply_document.assert_called_once()
-            _, call_kwargs = mock_update.message.reply_document.call_args
+            mock_context.bot.send_document.assert_called_once()
+            _, call_kwargs = mock_context.bot.send_document.call_args
             assert "Informe_Julio_2026.pdf" == call_kwargs['document'].filename
-            assert result == MENU
\ No newline at end of file
+            assert result == MENU
+
+
+@pytest.mark.asyncio
+class TestRecordatorios:
+    """Tests para el job diario de recordatorios de pago."""
+
+    async def test_recordatorios_se_calculan_una_vez_y_aislan_fallos(self):
+        """El job de recordatorios consulta una sola vez y un envío fallido no detiene los demás."""
+        from handlers import enviar_recordatorios_pago
+
+        mock_context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+        mock_context.job = MagicMock(data={"destinatarios": [1, 2, 3]})
+        mock_context.bot = AsyncMock()
+
+        async def send_message(chat_id, text, parse_mode=None):
+            if chat_id == 2:
+                raise RuntimeError("Forbidden: bot was blocked by the user")
+
+        mock_context.bot.send_message.side_effect = send_message
+        recordatorios = {"vencidos": ["Juan"], "proximos": ["María"]}
+
+        with patch("handlers.obtener_inquilinos_para_recordatorio", new_callable=AsyncMock, return_value=recordatorios) as mock_obtener:
+            await enviar_recordatorios_pago(mock_context)
+
+        mock_obtener.assert_awaited_once()
+        assert sorted(c.kwargs["chat_id"] for c in mock_context.bot.send_message.await_args_list) == [1, 2, 3]
+        textos = {c.kwargs["text"] for c in mock_context.bot.send_message.await_args_list}
+        assert len(textos) == 1 and "Juan" in textos.pop()
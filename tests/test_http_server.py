@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from http_server import ServidorHTTP, ErrorHTTP
+
+
+class _ServidorPrueba(ServidorHTTP):
+    nombre = "Servidor de prueba"
+
+    def __init__(self):
+        super().__init__(host="127.0.0.1", puerto=0)
+        self.recibidos = []
+
+    async def _procesar(self, metodo, ruta, cabeceras, cuerpo):
+        if ruta == "/falla":
+            raise KeyError("inesperado")
+        if ruta != "/eco":
+            raise ErrorHTTP(404)
+        self.recibidos.append(cuerpo)
+        return 200, cuerpo, "text/plain; charset=utf-8"
+
+
+async def _peticion(puerto: int, ruta: str, cuerpo: bytes = b"") -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", puerto)
+    writer.write(f"POST {ruta} HTTP/1.1\r\nContent-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n".encode() + cuerpo)
+    await writer.drain()
+    respuesta = await reader.read()
+    writer.close()
+    return respuesta
+
+
+@pytest.mark.asyncio
+async def test_errores_inesperados_responden_500():
+    with pytest.raises(TypeError):
+        ServidorHTTP()  # clase abstracta: las subclases implementan _procesar
+    servidor = _ServidorPrueba()
+    await servidor.iniciar()
+    try:
+        assert (await _peticion(servidor.puerto, "/falla")).startswith(b"HTTP/1.1 500")
+        assert (await _peticion(servidor.puerto, "/otra")).startswith(b"HTTP/1.1 404")
+        assert (await _peticion(servidor.puerto, "/eco", b"hola")).endswith(b"\r\n\r\nhola")
+    finally:
+        await servidor.detener()
+
+
+@pytest.mark.asyncio
+async def test_detener_espera_peticiones_en_curso():
+    servidor = _ServidorPrueba()
+    await servidor.iniciar()
+
+    # Petición a medio enviar (cabeceras sin cuerpo) y una conexión keep-alive inactiva
+    reader, writer = await asyncio.open_connection("127.0.0.1", servidor.puerto)
+    writer.write(b"POST /eco HTTP/1.1\r\nContent-Length: 4\r\n\r\n")
+    await writer.drain()
+    _, inactiva = await asyncio.open_connection("127.0.0.1", servidor.puerto)
+    await asyncio.sleep(0.01)
+
+    detencion = asyncio.create_task(servidor.detener(timeout=5))
+    await asyncio.sleep(0.01)
+    assert not detencion.done()
+
+    writer.write(b"hola")
+    await writer.drain()
+    respuesta = await reader.read()
+    await detencion
+    writer.close()
+    inactiva.close()
+
+    assert respuesta.startswith(b"HTTP/1.1 200")
+    assert b"Connection: close" in respuesta
+    assert servidor.recibidos == [b"hola"] and not servidor.activo
@@ -0,0 +1,29 @@
+import json
+import pytest
+from config import AUTHORIZED_USERS
+from load_harness import ejecutar
+
+
+@pytest.mark.asyncio
+async def test_arnes_ejecuta_flujos_y_reproduce_la_grabacion(tmp_path):
+    autorizados = list(AUTHORIZED_USERS)
+    grabacion = tmp_path / "flujo.jsonl"
+
+    reporte = await ejecutar(
+        usuarios=2, iteraciones=1, mezcla={"pago": 1}, pausa=0, latencia_api_ms=0,
+        inquilinos=5, latencia_db_ms=0, grabar=str(grabacion), semilla=7,
+    )
+    etiquetas = {f["etiqueta"] for f in reporte["por_handler"]}
+    assert reporte["sin_respuesta"] == 0 and reporte["errores"] == 0
+    assert reporte["actualizaciones"] == 8  # 2 usuarios × (menú, toque, monto, recibo)
+    assert {"registrar_pago.pago_select_inquilino", "registrar_pago.pago_monto", "descargar_recibo_callback"} <= etiquetas
+    recibos = lambda r: r["llamadas_api"].get("sendDocument", 0) + r["llamadas_api"].get("sendPhoto", 0)
+    assert recibos(reporte) == 2
+    assert reporte["latencia_ms"]["p99"] >= reporte["latencia_ms"]["p50"] > 0
+
+    lineas = [json.loads(linea) for linea in grabacion.read_text(encoding="utf-8").splitlines()]
+    assert len(lineas) == 8
+    repetido = await ejecutar(reproducir=str(grabacion), latencia_api_ms=0, inquilinos=5, latencia_db_ms=0, semilla=7)
+    assert repetido["actualizaciones"] == 8 and repetido["errores"] == 0
+    assert repetido["llamadas_api"] == reporte["llamadas_api"]
+    assert list(AUTHORIZED_USERS) == autorizados
@@ -0,0 +1,71 @@
+import time
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+from telegram import Update, Message, Chat, User
+from telegram.ext import ContextTypes, MessageHandler, filters
+import metrics
+from handler_timing import iniciar_medicion, finalizar_medicion, etiquetar_handlers
+from loop_monitor import MonitorLoop
+
+
+def renderizar_informe_bloqueante():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_bloqueo_atribuido_al_handler_con_pila():
+    async def informe_mes_actual(update, context):
+        renderizar_informe_bloqueante()
+
+    contexto = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+    manejador = MessageHandler(filters.TEXT, informe_mes_actual)
+    contexto.application.handlers = {0: [manejador]}
+    etiquetar_handlers(contexto.application)
+    chat, usuario = Chat(id=1, type=Chat.PRIVATE), User(id=1, first_name="Prueba", is_bot=False)
+    update = Update(update_id=77, message=Message(message_id=1, date=None, chat=chat, from_user=usuario, text="Informe"))
+
+    async def procesar():
+        await iniciar_medicion(update, contexto)
+        await manejador.callback(update, contexto)
+        await finalizar_medicion(update, contexto)
+
+    metrics.reiniciar()
+    monitor = MonitorLoop(intervalo_ms=20, umbral_ms=100)
+    await monitor.iniciar()
+    try:
+        await asyncio.sleep(0.05)
+        await asyncio.create_task(procesar())
+        await asyncio.sleep(0.1)  # que el vigía vea el siguiente latido
+    finally:
+        await monitor.detener()
+
+    assert not monitor.activo
+    assert len(monitor.recientes) == 1
+    bloqueo = monitor.recientes[0]
+    assert bloqueo["etiqueta"] == "informe_mes_actual" and bloqueo["update_id"] == 77
+    assert bloqueo["origen"].startswith("test_loop_monitor.py:") and bloqueo["origen"].endswith("renderizar_informe_bloqueante")
+    assert 200 <= bloqueo["ms"] <= 600
+    assert metrics.obtener_contadores("loop.bloqueos") == {"loop.bloqueos": 1, "loop.bloqueos.informe_mes_actual": 1}
+    metrics.reiniciar()
+
+
+@pytest.mark.asyncio
+async def test_bloqueos_fuera_de_actualizaciones_comparten_contador():
+    async def job():
+        renderizar_informe_bloqueante()
+
+    metrics.reiniciar()
+    monitor = MonitorLoop(intervalo_ms=20, umbral_ms=100)
+    await monitor.iniciar()
+    try:
+        for nombre in ("Task-101", "Task-102"):
+            await asyncio.sleep(0.05)
+            await asyncio.create_task(job(), name=nombre)
+        await asyncio.sleep(0.1)
+    finally:
+        await monitor.detener()
+
+    assert [b["etiqueta"] for b in monitor.recientes] == ["tarea Task-101", "tarea Task-102"]
+    assert metrics.obtener_contadores("loop.bloqueos") == {"loop.bloqueos": 2, "loop.bloqueos.(fuera de actualizaciones)": 2}
+    metrics.reiniciar()
@@ -129,8 +129,8 @@ async def test_obtener_informe_mensual_by_period():
         mock_pool.acquire.return_value.__aenter__.return_value = mock_conn
         mock_conn.cursor.return_value.__aenter__.return_value = mock_cur
         
-        # mock cur returns for sum of pagos, sum of gastos, list of pagos, list of gastos
-        mock_cur.fetchone.side_effect = [(Decimal('20000'),), (Decimal('5000'),)]
+        # mock cur returns for sum/count of pagos, sum/count of gastos, list of pagos, list of gastos
+        mock_cur.fetchone.side_effect = [(Decimal('20000'), 1), (Decimal('5000'), 0)]
         mock_cur.fetchall.side_effect = [[(1, date(2026, 7, 6), 'Carlos', Decimal('20000'))], []]
         
         res = await obtener_informe_mensual(6, 2026)
@@ -139,3 +139,212 @@ async def test_obtener_informe_mensual_by_period():
         # verify the SQL call uses COALESCE(mes_alquiler, ...)
         calls = [c[0][0] for c in mock_cur.execute.call_args_list]
         assert any("COALESCE(mes_alquiler" in call for call in calls)
+
+def test_crear_informe_pdf_grande_en_archivo(tmp_path):
+    from pdf_generator import crear_informe_pdf, es_informe_grande, UMBRAL_INFORME_GRANDE
+    n = UMBRAL_INFORME_GRANDE + 50
+    datos = {
+        'total_ingresos': Decimal('50000'),
+        'total_gastos': Decimal('10000'),
+        'total_comision': Decimal('2500'),
+        'monto_neto': Decimal('37500'),
+        'pagos_mes': [(i, date(2026, 7, 1 + i % 28), f'Inquilino {i}', Decimal('1000')) for i in range(n)],
+        'gastos_mes': [(1, '2026-07-02', 'Plomero ' * 30, Decimal('10000'))]
+    }
+    assert es_informe_grande(datos)
+    destino = str(tmp_path / "informe.pdf")
+    resultado = crear_informe_pdf(datos, 7, 2026, destino=destino)
+    assert resultado == destino
+    with open(destino, 'rb') as f:
+        assert f.read(4) == b"%PDF"
+
+def test_exportar_informe_excel_desde_iterador():
+    import openpyxl
+    def pagos():
+        for i in range(1, 1201):
+            yield (i, date(2026, 7, 1 + i % 28), f'Inquilino {i}', Decimal('1000'))
+    datos = {
+        'total_ingresos': Decimal('1200000'),
+        'total_gastos': Decimal('0'),
+        'total_comision': Decimal('60000'),
+        'monto_neto': Decimal('1140000'),
+        'pagos_mes': pagos(),
+        'gastos_mes': iter([])
+    }
+    wb = openpyxl.load_workbook(exportar_informe_excel(7, 2026, datos))
+    ws = wb["Pagos del Mes"]
+    assert ws["A3"].value == "ID"
+    assert ws["B4"].number_format == "DD/MM/YYYY"
+    assert ws.cell(row=1204, column=4).value == "=SUM(D4:D1203)"
+    assert wb["Resumen General"]["C8"].border.bottom.style == "double"
+    assert wb["Gastos del Mes"].max_row == 3
+
+def test_copiar_libro_mayor_con_filtros(tmp_path):
+    import gzip
+    from unittest.mock import patch, MagicMock
+    from database import _copiar_libro_mayor
+
+    mock_conn = MagicMock()
+    mock_cur = mock_conn.cursor.return_value.__enter__.return_value
+    mock_cur.mogrify.side_effect = lambda consulta, params: consulta.encode('utf-8')
+    mock_cur.copy_expert.side_effect = lambda sql, archivo: archivo.write(b"tipo,id\npago,1\n")
+    mock_cur.rowcount = 1
+
+    destino = str(tmp_path / "libro.csv.gz")
+    with patch('database.psycopg2.connect', return_value=mock_conn):
+        filas = _copiar_libro_mayor("dsn", destino, date(2026, 1, 1), None, "Carlos")
+
+    assert filas == 1
+    consulta, params = mock_cur.mogrify.call_args[0]
+    assert "inquilino = %s" in consulta
+    assert "FROM gastos" not in consulta
+    assert params == [date(2026, 1, 1), "Carlos"]
+    assert mock_cur.copy_expert.call_args[0][0].startswith("COPY (SELECT 'pago'")
+    with gzip.open(destino, 'rb') as f:
+        assert f.read() == b"tipo,id\npago,1\n"
+    mock_conn.close.assert_called_once()
+
+def test_recibo_png_reutiliza_fuentes_y_plantilla():
+    from receipt_generator import get_font, _plantilla_recibo_png
+    assert get_font(18, bold=True) is get_font(18, bold=True)
+    plantilla = _plantilla_recibo_png()
+    antes = plantilla.tobytes()
+    primero = crear_recibo_png(1, "2026-07-03", "Juan Perez", Decimal("100"))
+    segundo = crear_recibo_png(2, "2026-07-03", "Ana Gomez", Decimal("200"))
+    assert primero.getvalue() != segundo.getvalue()
+    # La plantilla compartida no se modifica al dibujar cada recibo
+    assert _plantilla_recibo_png() is plantilla
+    assert plantilla.tobytes() == antes
+
+def test_recibo_pdf_canvas_ajusta_nombres_largos():
+    from unittest.mock import MagicMock
+    from reportlab.pdfgen import canvas
+    from receipt_generator import _dibujar_recibo_pdf
+    c = MagicMock(spec=canvas.Canvas)
+    nombre = "Inquilino Con Un Nombre Extremadamente Largo & Compañía S.R.L. Sucursal Norte"
+    _dibujar_recibo_pdf(c, 7, "2026-07-03", nombre, Decimal("1500"))
+
+    textos = [llamada.args[2] for llamada in c.drawString.call_args_list]
+    assert nombre in textos
+    assert "03/07/2026" in textos
+    # El nombre se dibuja con una fuente reducida para no salirse del recuadro
+    tamanos = [llamada.args[1] for llamada in c.setFont.call_args_list if llamada.args[0] == 'Helvetica-Bold']
+    assert min(tamanos) < 11
+    c.showPage.assert_not_called()
+
+def test_recibos_lote_pdf_y_zip(tmp_path):
+    import zipfile
+    from receipt_generator import crear_recibos_lote_pdf, crear_recibos_lote_zip, MIN_RECIBOS_PARALELO
+    pagos = [(i, date(2026, 7, 3), f"Inquilino {i}", Decimal("1000") + i) for i in range(1, MIN_RECIBOS_PARALELO + 3)]
+
+    destino_pdf = tmp_path / "recibos.pdf"
+    assert crear_recibos_lote_pdf(iter(pagos), str(destino_pdf), "Julio 2026") == len(pagos)
+    contenido = destino_pdf.read_bytes()
+    assert contenido.startswith(b"%PDF")
+    assert contenido.count(b"/Type /Page\n") == len(pagos)
+
+    # Suficientes recibos para usar el pool de procesos
+    destino_zip = tmp_path / "recibos.zip"
+    assert crear_recibos_lote_zip(pagos, str(destino_zip), 'png', "Julio 2026", max_workers=2) == len(pagos)
+    with zipfile.ZipFile(destino_zip) as zf:
+        nombres = zf.namelist()
+        assert nombres[0] == "Recibo_0001_Inquilino_1.png"
+        assert len(nombres) == len(pagos)
+        assert zf.read(nombres[-1]).startswith(b"\x89PNG")
+
+    with pytest.raises(ValueError):
+        crear_recibos_lote_zip(pagos, str(destino_zip), 'gif')
+
+def test_optimizador_imagenes_original_sin_perdida_y_vista_previa_reducida():
+    import io
+    import metrics
+    from PIL import Image, ImageChops, ImageStat
+    from image_optimizer import codificar_png, vista_previa
+    metrics.reiniciar()
+
+    original = Image.open(crear_recibo_png(3, "2026-07-03", "Juan Perez", Decimal("100"))).convert("RGB")
+    codificado = codificar_png(original, "prueba")
+    assert ImageChops.difference(original, Image.open(codificado).convert("RGB")).getbbox() is None
+
+    # La vista previa del chat es una paleta de 256 colores: menos de la mitad de bytes
+    # y un error medio por canal inferior a 0.1/255 en estos diseños planos
+    previa, extension = vista_previa(codificado, "prueba")
+    assert extension == "png" and previa is not codificado
+    assert len(previa.getvalue()) < len(codificado.getvalue()) / 2
+    diferencia = ImageStat.Stat(ImageChops.difference(original, Image.open(previa).convert("RGB"))).mean
+    assert max(diferencia) < 0.1
+    assert codificado.tell() == 0  # el original queda intacto y rebobinado
+
+    webp, extension = vista_previa(codificado, "prueba", formato="webp")
+    assert extension == "webp" and webp.getvalue()[8:12] == b"WEBP"
+
+    valores = metrics.obtener_valores("imagen.prueba")
+    assert valores["imagen.prueba.bytes"]["cantidad"] == 1
+    assert valores["imagen.prueba_png.bytes"]["total"] == len(previa.getvalue())
+    assert valores["imagen.prueba_webp.bytes"]["total"] == len(webp.getvalue())
+    assert "imagen.prueba.ms" in valores
+
+def test_perfil_pdf_compacto(tmp_path):
+    from receipt_generator import crear_recibos_lote_pdf
+    contenido = crear_recibo_pdf(1, "2026-07-03", "Juan Perez", Decimal("15000.50")).getvalue()
+    # Flujos comprimidos en binario, sin la capa ASCII85 de reportlab
+    assert b"/FlateDecode" in contenido
+    assert b"ASCII85Decode" not in contenido
+    # El ajuste global de reportlab solo dura lo que la construcción del documento
+    from reportlab import rl_config
+    assert rl_config.useA85 == 1
+
+    destino = tmp_path / "lote.pdf"
+    crear_recibos_lote_pdf([(i, "2026-07-03", f"Inquilino {i}", Decimal("100")) for i in range(1, 6)], str(destino), "Julio 2026")
+    lote = destino.read_bytes()
+    # La plantilla fija se escribe una sola vez y cada página la referencia
+    assert lote.count(b"/FormType 1") == 1
+    assert lote.count(b"/Type /Page\n") == 5
+
+@pytest.mark.asyncio
+async def test_descargar_excel_grande_lee_el_detalle_en_streaming():
+    from unittest.mock import patch, AsyncMock, MagicMock
+    from handlers import descargar_excel_callback
+    from export_generator import UMBRAL_EXCEL_GRANDE
+    n = UMBRAL_EXCEL_GRANDE + 1
+    totales = {
+        'total_ingresos': Decimal('1000') * n, 'total_gastos': Decimal('0'),
+        'total_comision': Decimal('50') * n, 'monto_neto': Decimal('950') * n,
+        'filas_pagos': n, 'filas_gastos': 0,
+    }
+    leidas = []
+    def iterar(mes, anio, tabla):
+        for i in range(1, n + 1 if tabla == "pagos" else 1):
+            leidas.append(i)
+            yield (i, date(2026, 7, 1 + i % 28), f'Inquilino {i}', Decimal('1000'))
+    update, context = MagicMock(), MagicMock()
+    update.callback_query.data = "dl_excel_7_2026"
+    update.callback_query.answer = AsyncMock()
+    context.bot.send_document = AsyncMock()
+    with patch("handlers.obtener_informe_mensual", new_callable=AsyncMock, return_value=totales) as informe, \
+         patch("handlers.iterar_detalle_informe", side_effect=iterar):
+        await descargar_excel_callback(update, context)
+    informe.assert_awaited_once_with(7, 2026, limite_detalle=UMBRAL_EXCEL_GRANDE)
+    context.bot.send_document.assert_awaited_once()
+    assert len(leidas) == n
+
+@pytest.mark.asyncio
+async def test_descargar_excel_pequeno_consulta_una_sola_vez():
+    from unittest.mock import patch, AsyncMock, MagicMock
+    from handlers import descargar_excel_callback
+    informe_mes = {
+        'total_ingresos': Decimal('1000'), 'total_gastos': Decimal('0'),
+        'total_comision': Decimal('50'), 'monto_neto': Decimal('950'),
+        'filas_pagos': 1, 'filas_gastos': 0,
+        'pagos_mes': [(1, date(2026, 7, 3), 'Juan Perez', Decimal('1000'))], 'gastos_mes': [],
+    }
+    update, context = MagicMock(), MagicMock()
+    update.callback_query.data = "dl_excel_7_2026"
+    update.callback_query.answer = AsyncMock()
+    context.bot.send_document = AsyncMock()
+    with patch("handlers.obtener_informe_mensual", new_callable=AsyncMock, return_value=informe_mes) as informe, \
+         patch("handlers.iterar_detalle_informe") as iterar:
+        await descargar_excel_callback(update, context)
+    informe.assert_awaited_once()
+    iterar.assert_not_called()
+    context.bot.send_document.assert_awaited_once()
@@ -0,0 +1,144 @@
+import time
+import pickle
+import asyncio
+import pytest
+from telegram.error import RetryAfter, BadRequest
+import database
+from outbound_queue import ColaSalida
+
+
+class _BotFalso:
+    def __init__(self, fallos=None):
+        self.enviados = []
+        self.fallos = fallos or {}
+
+    async def send_message(self, chat_id, text, **kwargs):
+        error = self.fallos.get((chat_id, text))
+        if error:
+            del self.fallos[(chat_id, text)]
+            raise error
+        await asyncio.sleep(0)
+        self.enviados.append((chat_id, text))
+
+
+@pytest.mark.asyncio
+async def test_orden_por_chat_reintentos_y_fallos():
+    bot = _BotFalso({(1, "a1"): RetryAfter(0.05), (3, "c1"): BadRequest("Chat not found")})
+    cola = ColaSalida(tasa_global=1000, tasa_chat=1000, rafaga_chat=5, persistir=False)
+    await cola.iniciar(bot)
+    try:
+        futuros = {
+            texto: cola.encolar(bot, chat_id, "send_message", text=texto)
+            for chat_id, texto in [(1, "a1"), (2, "b1"), (1, "a2"), (3, "c1"), (2, "b2"), (1, "a3")]
+        }
+        resultados = {texto: await futuro for texto, futuro in futuros.items()}
+    finally:
+        await cola.detener()
+
+    assert resultados == {"a1": True, "b1": True, "a2": True, "c1": False, "b2": True, "a3": True}
+    assert [t for c, t in bot.enviados if c == 1] == ["a1", "a2", "a3"]
+    assert [t for c, t in bot.enviados if c == 2] == ["b1", "b2"]
+    assert cola.pendientes == 0
+
+
+@pytest.mark.asyncio
+async def test_limite_global_y_persistencia_en_lote(monkeypatch):
+    guardados, borrados, llamadas_borrar = [], [], []
+
+    async def guardar(filas):
+        guardados.append(filas)
+        inicio = sum(len(f) for f in guardados[:-1])
+        return list(range(inicio, inicio + len(filas)))
+
+    async def borrar(ids):
+        llamadas_borrar.append(len(ids))
+        borrados.extend(ids)
+
+    async def cargar():
+        return []
+
+    monkeypatch.setattr(database, "pool", object())
+    monkeypatch.setattr(database, "cargar_envios_pendientes", cargar)
+    monkeypatch.setattr(database, "guardar_envios_pendientes", guardar)
+    monkeypatch.setattr(database, "borrar_envios_pendientes", borrar)
+
+    bot = _BotFalso()
+    cola = ColaSalida(tasa_global=100, tasa_chat=10, rafaga_chat=1, lote_maximo=100)
+    await cola.iniciar(bot)
+    inicio = time.monotonic()
+    try:
+        # 150 chats distintos: salen 100 de inmediato y el resto al ritmo de la cubeta global
+        futuros = [cola.encolar(bot, chat_id, "send_message", text=f"recordatorio {chat_id}") for chat_id in range(150)]
+        assert all(await asyncio.gather(*futuros))
+    finally:
+        await cola.detener()
+    transcurrido = time.monotonic() - inicio
+
+    assert len(bot.enviados) == 150
+    assert transcurrido >= 0.4
+    # Los 50 que quedaron pendientes tras el primer lote se guardaron en un solo INSERT
+    assert len(guardados) == 1 and len(guardados[0]) == 50
+    assert pickle.loads(guardados[0][0][2]) == {"text": "recordatorio 100"}
+    assert sorted(borrados) == list(range(50))
+    assert len(llamadas_borrar) < 10
+
+
+@pytest.mark.asyncio
+async def test_encolar_chat_nuevo_durante_un_lote():
+    bot = _BotFalso()
+    cola = ColaSalida(tasa_global=1000, tasa_chat=1000, rafaga_chat=5, persistir=False)
+    await cola.iniciar(bot)
+    try:
+        primero = cola.encolar(bot, 1, "send_message", text="a1")
+        await asyncio.sleep(0)  # el despachador ya tiene a1 en vuelo
+        segundo = cola.encolar(bot, 2, "send_message", text="b1")  # chat todavía sin cubeta
+        assert await asyncio.wait_for(asyncio.gather(primero, segundo), 2) == [True, True]
+        assert cola.activa
+    finally:
+        await cola.detener()
+
+
+@pytest.mark.asyncio
+async def test_documento_lento_no_retiene_otros_chats_ni_se_persiste(monkeypatch):
+    guardados = []
+
+    async def guardar(filas):
+        guardados.extend(filas)
+        return list(range(len(filas)))
+
+    async def borrar(ids):
+        pass
+
+    async def cargar():
+        return []
+
+    monkeypatch.setattr(database, "pool", object())
+    monkeypatch.setattr(database, "cargar_envios_pendientes", cargar)
+    monkeypatch.setattr(database, "guardar_envios_pendientes", guardar)
+    monkeypatch.setattr(database, "borrar_envios_pendientes", borrar)
+
+    subida = asyncio.Event()
+
+    class _BotConDocumentos(_BotFalso):
+        async def send_document(self, chat_id, document, **kwargs):
+            await subida.wait()
+            self.enviados.append((chat_id, "documento"))
+
+    bot = _BotConDocumentos()
+    cola = ColaSalida(tasa_global=1000, tasa_chat=1000, rafaga_chat=5)
+    await cola.iniciar(bot)
+    try:
+        documento = cola.encolar(bot, 1, "send_document", document=b"%PDF" * 1000)
+        await asyncio.sleep(0)  # la subida ya está en vuelo
+        textos = [cola.encolar(bot, chat_id, "send_message", text="hola") for chat_id in (1, 2, 3)]
+        # Los otros chats salen mientras la subida sigue; el texto del chat 1 espera a su documento
+        assert await asyncio.wait_for(asyncio.gather(*textos[1:]), 1) == [True, True]
+        assert not documento.done() and not textos[0].done()
+        subida.set()
+        assert await asyncio.wait_for(asyncio.gather(documento, textos[0]), 1) == [True, True]
+    finally:
+        await cola.detener()
+
+    assert [t for c, t in bot.enviados if c == 1] == ["documento", "hola"]
+    # Solo el texto que quedó pendiente se guardó; el documento (con el PDF entero) no
+    assert [(chat_id, metodo) for chat_id, metodo, _ in guardados] == [(1, "send_message")]
@@ -0,0 +1,90 @@
+import json
+import pickle
+import asyncio
+import pytest
+from decimal import Decimal
+import database
+from persistence import PersistenciaPostgres
+
+
+@pytest.mark.asyncio
+async def test_user_data_se_carga_una_vez_por_usuario(monkeypatch):
+    guardado = {"ultimo_recibo": {"id": 7, "monto": Decimal("1500.00")}, "monto": Decimal("1500.00")}
+    lecturas = []
+
+    async def cargar(tipo, clave):
+        lecturas.append((tipo, clave))
+        return pickle.dumps(guardado) if clave == "1" else None
+
+    monkeypatch.setattr(database, "cargar_persistencia", cargar)
+    persistencia = PersistenciaPostgres()
+    assert await persistencia.get_user_data() == {}
+
+    user_data = {"monto": Decimal("99")}
+    for _ in range(3):
+        await persistencia.refresh_user_data(1, user_data)
+    otro = {}
+    await persistencia.refresh_user_data(2, otro)
+
+    assert lecturas == [("user", "1"), ("user", "2")]
+    assert user_data["ultimo_recibo"]["id"] == 7
+    assert user_data["monto"] == Decimal("99")  # lo que ya está en memoria no se pisa
+    assert otro == {}
+
+
+@pytest.mark.asyncio
+async def test_cambios_se_escriben_en_un_lote_y_se_reintentan(monkeypatch):
+    lotes = []
+    fallar = [True]
+
+    async def guardar_lote(filas, borrados):
+        if fallar[0]:
+            fallar[0] = False
+            raise RuntimeError("sin conexión")
+        lotes.append((filas, borrados))
+
+    monkeypatch.setattr(database, "guardar_persistencia_lote", guardar_lote)
+    persistencia = PersistenciaPostgres()
+
+    # Una ronda de Application.update_persistence(): varias llamadas seguidas
+    await asyncio.gather(
+        persistencia.update_user_data(1, {"monto": Decimal("10")}),
+        persistencia.update_user_data(2, {"detalle": "Juan"}),
+        persistencia.update_conversation("registrar_pago", (1, 1), 2),
+        persistencia.update_conversation("deshacer", (2, 2), None),
+    )
+    await persistencia._escritura  # el primer intento falla y los cambios quedan pendientes
+    assert lotes == []
+
+    await persistencia.update_user_data(1, {"monto": Decimal("20")})
+    await persistencia.flush()
+
+    assert len(lotes) == 1
+    filas, borrados = lotes[0]
+    por_clave = {(tipo, clave): pickle.loads(datos) for tipo, clave, datos in filas}
+    assert por_clave == {
+        ("user", "1"): {"monto": Decimal("20")},
+        ("user", "2"): {"detalle": "Juan"},
+        ("conv:registrar_pago", "[1, 1]"): 2,
+    }
+    assert borrados == [("conv:deshacer", "[2, 2]")]
+
+
+@pytest.mark.asyncio
+async def test_conversaciones_se_restauran_con_una_consulta(monkeypatch):
+    consultas = []
+
+    async def cargar_prefijo(prefijo):
+        consultas.append(prefijo)
+        return [
+            ("conv:registrar_pago", json.dumps([10, 10]), pickle.dumps(2)),
+            ("conv:editar_borrar", json.dumps([10, 10]), pickle.dumps(5)),
+        ]
+
+    monkeypatch.setattr(database, "cargar_persistencia_prefijo", cargar_prefijo)
+    persistencia = PersistenciaPostgres()
+
+    assert await persistencia.get_conversations("registrar_pago") == {(10, 10): 2}
+    assert await persistencia.get_conversations("editar_borrar") == {(10, 10): 5}
+    assert await persistencia.get_conversations("deshacer") == {}
+    assert consultas == ["conv:"]
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+import metrics
+from receipt_cache import CachePrerender
+
+
+@pytest.mark.asyncio
+async def test_prerender_usado_y_desperdiciado():
+    metrics.reiniciar()
+    cache = CachePrerender(ttl_segundos=60)
+
+    async def renderizar():
+        await asyncio.sleep(0.01)
+        return {"id": 7}, {"pdf": b"%PDF", "png": b"\x89PNG"}
+
+    cache.programar(7, asyncio.create_task(renderizar()))
+    # La descarga espera a la tarea en curso en lugar de renderizar de nuevo
+    assert await cache.obtener(7, "pdf") == (b"%PDF", {"id": 7})
+    assert await cache.obtener(7, "png") == (b"\x89PNG", {"id": 7})
+    assert await cache.obtener(8, "pdf") is None
+
+    cache.programar(9, asyncio.create_task(renderizar()))
+    await asyncio.sleep(0.02)
+    cache.ttl = 0
+    assert await cache.obtener(9, "pdf") is None
+
+    assert metrics.obtener_contadores("prerender.") == {
+        "prerender.programados": 2,
+        "prerender.usados": 1,
+        "prerender.aciertos": 2,
+        "prerender.desperdiciados": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_descartar_mientras_se_espera_devuelve_none():
+    cache = CachePrerender(ttl_segundos=60)
+    liberar = asyncio.Event()
+
+    async def renderizar():
+        await liberar.wait()
+        return {"id": 3}, {"pdf": b"%PDF"}
+
+    cache.programar(3, asyncio.create_task(renderizar()))
+    espera = asyncio.create_task(cache.obtener(3, "pdf"))
+    await asyncio.sleep(0)
+    cache.descartar(3)  # p. ej. el pago se borró mientras se pedía el recibo
+    # La descarga no muere con CancelledError: recibe None y renderiza por su cuenta
+    assert await espera is None
+
+    # Si lo que se cancela es quien espera, la cancelación sí se propaga
+    cache.programar(4, asyncio.create_task(renderizar()))
+    espera = asyncio.create_task(cache.obtener(4, "pdf"))
+    await asyncio.sleep(0)
+    espera.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await espera
+    liberar.set()
+    assert await cache.obtener(4, "pdf") == (b"%PDF", {"id": 3})
+
+@pytest.mark.asyncio
+async def test_recibo_prerenderizado_se_guarda_una_sola_vez():
+    from unittest.mock import AsyncMock, MagicMock, patch
+    import handlers
+    almacen = MagicMock()
+    recibo = {"id": 5, "fecha": "2026-07-01", "inquilino": "Ana", "monto": "1000", "periodo": "Julio 2026"}
+    context = MagicMock()
+    context.application.create_task = asyncio.create_task
+    context.bot.send_document = AsyncMock()
+    with patch("handlers.obtener_almacen", return_value=almacen), \
+         patch("handlers.cache_prerender", CachePrerender(ttl_segundos=60)), \
+         patch("handlers._prerenderizar_recibo", return_value=(recibo, {"pdf": b"%PDF", "png": b"\x89PNG"})):
+        handlers._programar_prerender_recibo(context, recibo)
+        for _ in range(2):
+            update = MagicMock()
+            update.callback_query.data = "dl_recibo_pdf_5"
+            update.callback_query.answer = AsyncMock()
+            await handlers.descargar_recibo_callback(update, context)
+
+    assert context.bot.send_document.await_count == 2
+    # Ambos formatos se guardan al terminar el prerenderizado; las descargas no vuelven a escribir
+    assert sorted(c.args[0] for c in almacen.guardar.call_args_list) == [handlers._clave_recibo(5, "pdf"), handlers._clave_recibo(5, "png")]
+    almacen.obtener.assert_not_called()
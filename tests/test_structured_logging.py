@@ -0,0 +1,67 @@
+import io
+import json
+import queue
+import logging
+import threading
+import pytest
+from unittest.mock import MagicMock
+from logging.handlers import QueueListener
+from telegram import Update, Message, Chat, User
+from telegram.ext import ContextTypes, MessageHandler, filters
+from handler_timing import iniciar_medicion, finalizar_medicion, etiquetar_handlers
+from structured_logging import FiltroContexto, FormateadorJSON, _ManejadorCola
+
+
+@pytest.mark.asyncio
+async def test_json_con_update_id_y_escritura_en_otro_hilo():
+    hilos = []
+
+    class Salida(logging.StreamHandler):
+        def emit(self, record):
+            hilos.append(threading.current_thread())
+            super().emit(record)
+
+    destino = io.StringIO()
+    salida = Salida(destino)
+    salida.setFormatter(FormateadorJSON())
+    cola = queue.SimpleQueue()
+    manejador = _ManejadorCola(cola)
+    manejador.addFilter(FiltroContexto())
+    listener = QueueListener(cola, salida)
+    logger = logging.getLogger("prueba.structured_logging")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(manejador)
+    listener.start()
+
+    async def recibo_handler(update, context):
+        pass
+
+    contexto = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+    manejador_recibo = MessageHandler(filters.TEXT, recibo_handler)
+    contexto.application.handlers = {0: [manejador_recibo]}
+    etiquetar_handlers(contexto.application)
+    chat, usuario = Chat(id=1, type=Chat.PRIVATE), User(id=1, first_name="Prueba", is_bot=False)
+    update = Update(update_id=321, message=Message(message_id=1, date=None, chat=chat, from_user=usuario, text="Recibo 5"))
+    datos = {"pago": 5}
+    try:
+        await iniciar_medicion(update, contexto)
+        await manejador_recibo.callback(update, contexto)
+        logger.info("Recibo %s generado", datos)
+        datos["pago"] = 6  # el mensaje se fija al emitir, no al escribir
+        try:
+            raise ValueError("fallo de prueba")
+        except ValueError:
+            logger.error("Error al generar el recibo", exc_info=True)
+        await finalizar_medicion(update, contexto)
+        logger.warning("Fuera de una actualización")
+    finally:
+        listener.stop()
+        logger.removeHandler(manejador)
+
+    info, error, fuera = [json.loads(linea) for linea in destino.getvalue().splitlines()]
+    assert info["mensaje"] == "Recibo {'pago': 5} generado"
+    assert info["update_id"] == 321 and info["handler"] == "recibo_handler" and info["nivel"] == "INFO"
+    assert "ValueError: fallo de prueba" in error["excepcion"] and error["update_id"] == 321
+    assert fuera["update_id"] is None and fuera["handler"] is None
+    assert hilos and all(h is not threading.main_thread() for h in hilos)
@@ -0,0 +1,131 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from telegram import Update, Message, Chat, User
+from telegram.ext import CallbackContext, ContextTypes, ConversationHandler
+from tenant_index import IndiceInquilinos, normalizar, extraer_id_seleccion, separar_flujo, texto_seleccion, FLUJO_PAGO
+
+FILAS = [
+    (1, "José Peña", True, 5),
+    (2, "María Núñez", True, None),
+    (3, "Josefina Almonte", False, 15),
+    (4, "Pedro Rodríguez", True, 30),
+]
+
+
+def test_busqueda_sin_acentos_por_prefijo_y_aproximada():
+    indice = IndiceInquilinos()
+    indice.cargar(FILAS)
+
+    assert normalizar("  José   PEÑA ") == "jose pena"
+    assert [f[0] for f in indice.buscar("jose")] == [1, 3]
+    assert [f[0] for f in indice.buscar("JOSÉ", solo_activos=True)] == [1]
+    assert [f[0] for f in indice.buscar("jo pe")] == [1]
+    assert [f[0] for f in indice.buscar("nunez")] == [2]
+    # Error de tipeo: sin coincidencia de prefijo, se completa por trigramas
+    assert indice.buscar("rodrigues")[0][0] == 4
+    assert indice.buscar("xyz") == []
+    assert len(indice.buscar("", limite=3)) == 3
+
+    texto = texto_seleccion("José Peña", 1, FLUJO_PAGO)
+    assert texto == "👤 José Peña (pago #1)" and extraer_id_seleccion(texto) == 1
+    assert separar_flujo("Pago:  jo pe") == (FLUJO_PAGO, "jo pe") and separar_flujo("jose") == (None, "jose")
+    assert extraer_id_seleccion("José Peña") is None
+
+
+@pytest.mark.asyncio
+async def test_busqueda_inline_responde_desde_el_indice():
+    from handlers import buscar_inquilino_inline
+    from tenant_index import indice_inquilinos
+
+    indice_inquilinos.invalidar()
+    mock_update = MagicMock(spec=Update)
+    mock_update.inline_query = AsyncMock()
+    mock_update.inline_query.from_user.id = 13814098
+    mock_update.inline_query.query = "pena"
+    mock_context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+
+    with patch("handlers.AUTHORIZED_USERS", [13814098]), \
+         patch("handlers.obtener_inquilinos", new_callable=AsyncMock, return_value=FILAS) as mock_obtener:
+        await buscar_inquilino_inline(mock_update, mock_context)
+        mock_update.inline_query.query = "maria"
+        await buscar_inquilino_inline(mock_update, mock_context)
+
+    mock_obtener.assert_awaited_once()
+    primeros, segundos = [c.args[0] for c in mock_update.inline_query.answer.await_args_list]
+    assert [r.title for r in primeros] == ["José Peña"]
+    assert primeros[0].input_message_content.message_text == "👤 José Peña (#1)"
+    assert [r.id for r in segundos] == ["2"]
+    indice_inquilinos.invalidar()
+
+
+def _mensaje(update_id: int, texto: str) -> Update:
+    chat = Chat(id=13814098, type=Chat.PRIVATE)
+    usuario = User(id=13814098, first_name="Prueba", is_bot=False)
+    return Update(update_id=update_id, message=Message(message_id=update_id, date=None, chat=chat, from_user=usuario, text=texto))
+
+
+def _elegir_handler(application, update: Update) -> tuple:
+    """Como Application.process_update en el grupo 0: el primer handler que acepta la actualización."""
+    for handler in application.handlers[0]:
+        check = handler.check_update(update)
+        if check is not None and check is not False:
+            interno = check[2] if isinstance(handler, ConversationHandler) else handler
+            return handler, check, interno.callback.__name__
+    return None, None, None
+
+
+async def _despachar(application, update: Update) -> str | None:
+    handler, check, nombre = _elegir_handler(application, update)
+    if handler is not None:
+        await handler.handle_update(update, application, check, CallbackContext.from_update(update, application))
+    return nombre
+
+
+@pytest.mark.asyncio
+async def test_busqueda_inline_por_flujo_al_cambiar_de_flujo_a_medias():
+    import main
+    from handlers import buscar_inquilino_inline
+    from tenant_index import indice_inquilinos
+
+    application = main.construir_aplicacion(token="123:ABC")
+    indice_inquilinos.invalidar()
+    with patch.object(Message, "reply_text", new_callable=AsyncMock), \
+         patch("handlers.obtener_inquilinos", new_callable=AsyncMock, return_value=FILAS):
+        # Se empieza un pago y, sin terminarlo, se pasa al estado de cuenta
+        assert await _despachar(application, _mensaje(1, "📥 Registrar Pago")) == "pago_inicio"
+        assert await _despachar(application, _mensaje(2, "👤 Gestionar Inquilinos")) == "gestionar_inquilinos_menu"
+        assert await _despachar(application, _mensaje(3, "📑 Estado de Cuenta")) == "estado_cuenta_prompt"
+
+        consulta = MagicMock(spec=Update)
+        consulta.inline_query = AsyncMock()
+        consulta.inline_query.from_user.id = 13814098
+        contexto = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+        for texto in ("ec: jose", "pago: jose"):
+            consulta.inline_query.query = texto
+            await buscar_inquilino_inline(consulta, contexto)
+    estado_cuenta, pago = [c.args[0] for c in consulta.inline_query.answer.await_args_list]
+    indice_inquilinos.invalidar()
+
+    # El estado de cuenta ofrece también a los inactivos; el pago, solo a los activos
+    assert [r.title for r in estado_cuenta] == ["José Peña", "Josefina Almonte"]
+    assert [r.title for r in pago] == ["José Peña"]
+    seleccion = estado_cuenta[1].input_message_content.message_text
+    assert seleccion == "👤 Josefina Almonte (ec #3)"
+    # La conversación de pago abandonada (registrada antes) no se queda con la selección
+    assert _elegir_handler(application, _mensaje(4, seleccion))[2] == "estado_cuenta_buscado"
+
+
+@pytest.mark.asyncio
+async def test_pago_rechaza_inquilino_inactivo():
+    from handlers import pago_inquilino_buscado, PAGO_SELECT_INQUILINO
+
+    mock_update = MagicMock(spec=Update)
+    mock_update.message = AsyncMock()
+    # Una selección pegada a mano con el id de un inactivo
+    mock_update.message.text = texto_seleccion("Josefina Almonte", 3, FLUJO_PAGO)
+    mock_context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+    mock_context.user_data = {}
+    with patch("handlers.obtener_inquilino_por_id", new_callable=AsyncMock, return_value=FILAS[2]):
+        assert await pago_inquilino_buscado(mock_update, mock_context) == PAGO_SELECT_INQUILINO
+    assert "inactivo" in mock_update.message.reply_text.call_args[0][0]
+    assert "detalle" not in mock_context.user_data
@@ -0,0 +1,81 @@
+import json
+import time
+import asyncio
+import pytest
+from unittest.mock import patch
+from outbound_queue import ColaSalida
+from tracing import Trazador, ExportadorChrome, trazar
+
+
+class _BotFalso:
+    def __init__(self):
+        self.documentos = []
+
+    async def send_document(self, chat_id, document, **kwargs):
+        await asyncio.sleep(0.005)
+        self.documentos.append((chat_id, document))
+
+
+@trazar("database.consultar")
+async def consultar() -> int:
+    await asyncio.sleep(0.01)
+    return 3
+
+
+@trazar()
+def renderizar(paginas: int) -> bytes:
+    time.sleep(0.01)
+    return b"%PDF" * paginas
+
+
+def _leer(archivo) -> list[dict]:
+    # Array sin cerrar (válido en Chrome Trace Event): se cierra para leerlo con json
+    return json.loads(archivo.read_text(encoding="utf-8").rstrip().rstrip(",") + "]")
+
+
+@pytest.mark.asyncio
+async def test_traza_fases_en_tareas_hilos_y_cola_de_salida(tmp_path):
+    archivo = tmp_path / "trazas" / "trazas.json"
+    trazador = Trazador(muestreo=1.0, lentas_ms=60_000, exportador=ExportadorChrome(str(archivo), 1024 * 1024))
+    bot = _BotFalso()
+    cola = ColaSalida(tasa_global=1000, tasa_chat=1000, persistir=False)
+    with patch("tracing.trazador", trazador), patch("outbound_queue.trazador", trazador):
+        await cola.iniciar(bot)  # fuera de toda traza, como en main.py
+        try:
+            with trazador.traza("actualizacion", update_id=7):
+                trazador.anotar_raiz(handler="informe")
+                paginas = await consultar()
+                pdf = await asyncio.to_thread(renderizar, paginas)
+                assert await cola.enviar(bot, 1, "send_document", document=pdf)
+            assert await consultar() == 3  # sin traza abierta: no se registra
+        finally:
+            await cola.detener()
+        trazador.exportador.detener()
+
+    eventos = _leer(archivo)
+    spans = {e["name"]: e for e in eventos if e["ph"] == "X"}
+    assert set(spans) == {"actualizacion", "database.consultar", "test_tracing.renderizar", "salida.send_document"}
+    raiz = spans["actualizacion"]
+    assert raiz["args"] == {"traza": 1, "update_id": 7, "handler": "informe"}
+    for nombre, span in spans.items():
+        assert raiz["ts"] <= span["ts"] and span["ts"] + span["dur"] <= raiz["ts"] + raiz["dur"] + 1, nombre
+    # El render corrió en otro hilo: carril propio; el envío lo hizo el despachador, en el del loop
+    carriles = {e["tid"]: e["args"]["name"] for e in eventos if e["ph"] == "M"}
+    assert spans["test_tracing.renderizar"]["tid"] != raiz["tid"] == spans["salida.send_document"]["tid"]
+    assert carriles[raiz["tid"]] == "informe #1"
+    assert spans["salida.send_document"]["args"]["intento"] == 1 and spans["database.consultar"]["cat"] == "database"
+
+
+@pytest.mark.asyncio
+async def test_exporta_muestreadas_y_lentas(tmp_path):
+    archivo = tmp_path / "trazas.json"
+    trazador = Trazador(muestreo=0.0, lentas_ms=20, exportador=ExportadorChrome(str(archivo), 1024 * 1024))
+    with trazador.traza("rapida"):
+        await asyncio.sleep(0)
+    with trazador.traza("lenta"):
+        with trazador.span("database.consultar"):
+            await asyncio.sleep(0.03)
+    trazador.exportador.detener()
+
+    nombres = [e["name"] for e in _leer(archivo) if e["ph"] == "X"]
+    assert nombres == ["lenta", "database.consultar"]
@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from telegram import Update, Message, Chat, User
+from update_processor import ProcesadorOrdenadoPorChat
+
+
+def _update(update_id: int, chat_id: int) -> Update:
+    chat = Chat(id=chat_id, type=Chat.PRIVATE)
+    usuario = User(id=chat_id, first_name="Prueba", is_bot=False)
+    mensaje = Message(message_id=update_id, date=None, chat=chat, from_user=usuario, text="x")
+    return Update(update_id=update_id, message=mensaje)
+
+
+@pytest.mark.asyncio
+async def test_orden_por_chat_y_concurrencia_entre_chats():
+    procesador = ProcesadorOrdenadoPorChat(2)
+    liberar = asyncio.Event()
+    orden = []
+
+    async def manejar(chat_id: int, n: int, bloquear: bool):
+        if bloquear:
+            await liberar.wait()
+        orden.append((chat_id, n))
+
+    # El primer mensaje del chat 1 queda bloqueado: los siguientes del mismo chat esperan
+    # su turno, mientras que los chats 2 y 3 avanzan en paralelo.
+    mensajes = [(1, True), (1, False), (2, False), (1, False), (2, False), (3, False)]
+    tareas = [
+        asyncio.create_task(procesador.process_update(_update(n, chat_id), manejar(chat_id, n, bloquear)))
+        for n, (chat_id, bloquear) in enumerate(mensajes)
+    ]
+    await asyncio.sleep(0.01)
+    assert orden == [(2, 2), (2, 4), (3, 5)]
+    assert procesador.en_curso == 1
+    assert procesador.en_cola == 2
+
+    liberar.set()
+    await asyncio.gather(*tareas)
+    assert [n for chat_id, n in orden if chat_id == 1] == [0, 1, 3]
+    assert procesador.en_curso == 0 and procesador.en_cola == 0
+    assert procesador._locks_chat == {}
+
+
+@pytest.mark.asyncio
+async def test_limite_de_actualizaciones_simultaneas():
+    procesador = ProcesadorOrdenadoPorChat(2)
+    liberar = asyncio.Event()
+
+    async def manejar():
+        await liberar.wait()
+
+    tareas = [asyncio.create_task(procesador.process_update(_update(n, 100 + n), manejar())) for n in range(3)]
+    await asyncio.sleep(0.01)
+    assert procesador.limite == 2
+    assert procesador.en_curso == 2
+    assert procesador.en_cola == 1
+
+    liberar.set()
+    await asyncio.gather(*tareas)
+    assert procesador.en_curso == 0 and procesador.en_cola == 0
+
+
+@pytest.mark.asyncio
+async def test_limite_uno_procesa_de_una_en_una():
+    procesador = ProcesadorOrdenadoPorChat(1)
+    activas, maximo = 0, 0
+
+    async def manejar():
+        nonlocal activas, maximo
+        activas += 1
+        maximo = max(maximo, activas)
+        await asyncio.sleep(0.01)
+        activas -= 1
+
+    await asyncio.gather(*(procesador.process_update(_update(n, 100 + n), manejar()) for n in range(3)))
+    assert procesador.limite == 1 and maximo == 1
+    with pytest.raises(ValueError):
+        ProcesadorOrdenadoPorChat(0)
@@ -0,0 +1,60 @@
+import time
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from telegram import Update, Message, Chat, User
+from update_profiler import PerfiladorActualizaciones, MARCO_ESPERA
+
+
+def _update(update_id: int, usuario_id: int) -> Update:
+    chat, usuario = Chat(id=usuario_id, type=Chat.PRIVATE), User(id=usuario_id, first_name="Admin", is_bot=False)
+    update = Update(update_id=update_id, message=Message(message_id=update_id, date=None, chat=chat, from_user=usuario, text="x"))
+    update.set_bot(AsyncMock())
+    return update
+
+
+def renderizar_pdf():
+    time.sleep(0.06)
+
+
+async def consultar_base():
+    await asyncio.sleep(0.06)
+
+
+async def generar_informe():
+    await consultar_base()
+    renderizar_pdf()
+
+
+@pytest.mark.asyncio
+async def test_perfila_las_proximas_n_de_un_usuario():
+    perfilador = PerfiladorActualizaciones(intervalo_ms=2)
+    assert perfilador.armar(1, 50) == perfilador.max_actualizaciones
+    assert perfilador.desarmar(1) == perfilador.max_actualizaciones
+    perfilador.armar(1, 1)
+
+    otro = _update(10, usuario_id=2)
+    coro_otro = generar_informe()
+    assert perfilador.envolver(otro, coro_otro) is coro_otro  # otro usuario: sin perfilar
+    await coro_otro
+
+    primera = _update(11, usuario_id=1)
+    await asyncio.create_task(perfilador.envolver(primera, generar_informe()))
+    segunda = generar_informe()
+    assert perfilador.envolver(_update(12, usuario_id=1), segunda) is segunda  # ya se consumió el pedido
+    await segunda
+    await asyncio.gather(*perfilador._entregas)
+
+    bot = primera.get_bot()
+    bot.send_document.assert_awaited_once()
+    kwargs = bot.send_document.await_args.kwargs
+    assert kwargs["chat_id"] == 1 and "update 11" in kwargs["caption"]
+    colapsado = kwargs["document"].input_file_content.decode("utf-8")
+    pilas = dict(linea.rsplit(" ", 1) for linea in colapsado.splitlines())
+    bloqueante = [p for p in pilas if p.endswith("test_update_profiler.py:renderizar_pdf")]
+    en_espera = [p for p in pilas if p.endswith(MARCO_ESPERA) and "test_update_profiler.py:consultar_base" in p]
+    assert bloqueante and en_espera
+    assert all(p.startswith("update_profiler.py:_perfilar;test_update_profiler.py:generar_informe") for p in bloqueante + en_espera)
+    # Ambas mitades duran ~60 ms: cada una se lleva una parte apreciable de las muestras
+    total = sum(int(n) for n in pilas.values())
+    assert sum(int(pilas[p]) for p in bloqueante) > total / 4 and sum(int(pilas[p]) for p in en_espera) > total / 4
@@ -0,0 +1,82 @@
+import json
+import socket
+import asyncio
+import pytest
+from unittest.mock import patch
+from telegram import Update
+from telegram.ext import Application
+from fake_telegram_server import ServidorTelegramFalso
+import main
+
+# Actualización tal como la envía Telegram al webhook
+UPDATE_GRABADA = {
+    "update_id": 500001,
+    "message": {
+        "message_id": 42,
+        "date": 1760000000,
+        "chat": {"id": 13814098, "type": "private", "first_name": "Ana"},
+        "from": {"id": 13814098, "is_bot": False, "first_name": "Ana", "language_code": "es"},
+        "text": "📊 Ver Resumen",
+    },
+}
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _post(puerto: int, ruta: str, cuerpo: bytes, secreto: str = None) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", puerto)
+    cabeceras = [
+        f"POST {ruta} HTTP/1.1", "Host: localhost", "Content-Type: application/json",
+        f"Content-Length: {len(cuerpo)}", "Connection: close",
+    ]
+    if secreto is not None:
+        cabeceras.append(f"X-Telegram-Bot-Api-Secret-Token: {secreto}")
+    writer.write(("\r\n".join(cabeceras) + "\r\n\r\n").encode() + cuerpo)
+    await writer.drain()
+    respuesta = await reader.read()
+    writer.close()
+    return int(respuesta.split(b" ", 2)[1])
+
+
+@pytest.mark.asyncio
+async def test_webhook_de_ptb_encola_actualizaciones_y_valida_secreto():
+    api = ServidorTelegramFalso(puerto=0)
+    llamadas, llamar = [], api.api.llamar
+
+    async def espiar(metodo, parametros, archivos):
+        llamadas.append((metodo, parametros))
+        return await llamar(metodo, parametros, archivos)
+
+    api.api.llamar = espiar
+    await api.iniciar()
+    application = Application.builder().token("123:abc").base_url(api.url_base).build()
+    puerto = _puerto_libre()
+    await application.initialize()
+    try:
+        with patch.multiple(main, WEBHOOK_URL="https://bot.ejemplo.com/", WEBHOOK_RUTA="/telegram",
+                            WEBHOOK_HOST="127.0.0.1", WEBHOOK_PUERTO=puerto, WEBHOOK_SECRETO="s3creto"):
+            await main.iniciar_webhook(application)
+        registro = next(parametros for metodo, parametros in llamadas if metodo == "setWebhook")
+        assert registro["url"] == "https://bot.ejemplo.com/telegram" and registro["secret_token"] == "s3creto"
+
+        cuerpo = json.dumps(UPDATE_GRABADA).encode()
+        assert await _post(puerto, "/telegram", cuerpo, secreto="otro") == 403
+        assert await _post(puerto, "/telegram", cuerpo) == 403
+        assert await _post(puerto, "/otra", cuerpo, secreto="s3creto") == 404
+        assert application.update_queue.empty()
+
+        assert await _post(puerto, "/telegram", cuerpo, secreto="s3creto") == 200
+        update = await asyncio.wait_for(application.update_queue.get(), 2)
+        assert isinstance(update, Update)
+        assert update.update_id == 500001 and update.message.text == "📊 Ver Resumen"
+    finally:
+        await application.updater.stop()
+        await application.shutdown()
+        await api.detener()
+
+    with pytest.raises(ValueError), patch.object(main, "WEBHOOK_URL", None):
+        await main.iniciar_webhook(application)
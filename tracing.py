@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import queue
+import random
+import atexit
+import logging
+import asyncio
+import functools
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import TRAZAS_ACTIVAS, TRAZAS_MUESTREO, TRAZAS_LENTAS_MS, TRAZAS_ARCHIVO, TRAZAS_MAX_MB
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Para convertir perf_counter_ns (monótono, preciso) a tiempo de reloj en los eventos
+_ORIGEN_NS = time.time_ns() - time.perf_counter_ns()
+
+
+class Span:
+    __slots__ = ("nombre", "traza", "inicio", "fin", "hilo", "atributos")
+
+    def __init__(self, nombre: str, traza: "Traza", atributos: dict):
+        self.nombre = nombre
+        self.traza = traza
+        self.inicio = time.perf_counter_ns()
+        self.fin = None
+        self.hilo = threading.current_thread().name
+        self.atributos = atributos
+
+
+class Traza:
+    __slots__ = ("numero", "raiz", "spans", "muestreada")
+
+    def __init__(self, numero: int, muestreada: bool):
+        self.numero = numero
+        self.raiz: Span | None = None
+        self.spans: list[Span] = []
+        self.muestreada = muestreada
+
+
+# Span abierto en la tarea (o hilo de asyncio.to_thread, que copia el contexto) actual
+_span_actual: ContextVar[Span | None] = ContextVar("span_actual", default=None)
+
+
+class ExportadorChrome:
+    """
+    Escribe trazas en formato Chrome Trace Event (JSON array), abrible en ui.perfetto.dev
+    o chrome://tracing. La escritura va en un hilo aparte; el array se deja abierto (el
+    formato admite omitir el "]" final) para poder añadir trazas sin reescribir el archivo.
+    Al superar `max_bytes` el archivo pasa a <archivo>.1 y se empieza uno nuevo.
+    """
+
+    def __init__(self, archivo: str, max_bytes: int):
+        self.archivo = archivo
+        self.max_bytes = max_bytes
+        self._cola: queue.SimpleQueue = queue.SimpleQueue()
+        self._hilo: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._registrado = False
+
+    def enviar(self, eventos: list[dict]) -> None:
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._escribir, name="exportador-trazas", daemon=True)
+                self._hilo.start()
+                if not self._registrado:
+                    atexit.register(self.detener)
+                    self._registrado = True
+        self._cola.put(eventos)
+
+    def detener(self, timeout: float = 5.0) -> None:
+        """Escribe lo pendiente y detiene el hilo."""
+        with self._lock:
+            hilo, self._hilo = self._hilo, None
+        if hilo is not None:
+            self._cola.put(None)
+            hilo.join(timeout)
+
+    def _escribir(self) -> None:
+        while (eventos := self._cola.get()) is not None:
+            try:
+                directorio = os.path.dirname(self.archivo)
+                if directorio:
+                    os.makedirs(directorio, exist_ok=True)
+                if os.path.exists(self.archivo) and os.path.getsize(self.archivo) > self.max_bytes:
+                    os.replace(self.archivo, f"{self.archivo}.1")
+                nuevo = not os.path.exists(self.archivo) or os.path.getsize(self.archivo) == 0
+                with open(self.archivo, "a", encoding="utf-8") as f:
+                    if nuevo:
+                        f.write("[\n")
+                    f.writelines(json.dumps(e, ensure_ascii=False, default=str) + ",\n" for e in eventos)
+            except Exception as e:
+                logger.error(f"No se pudieron escribir las trazas en {self.archivo}: {e}", exc_info=True)
+
+
+class Trazador:
+    """
+    Trazas de extremo a extremo de cada actualización: un span raíz por actualización
+    (update_processor.py) y spans hijos de cada fase (consultas de database.py, renders,
+    envíos de la cola de salida y peticiones a la Bot API, ver main.py), enlazados por una
+    variable de contexto.
+
+    Todas las actualizaciones se trazan en memoria (unos pocos objetos por fase), pero
+    solo se exportan las elegidas al azar con probabilidad `muestreo` y todas las que
+    duran `lentas_ms` o más, que son las que interesa desglosar después.
+    """
+
+    def __init__(self, activo: bool = True, muestreo: float = 0.01, lentas_ms: float = 3000,
+                 exportador: ExportadorChrome | None = None):
+        self.activo = activo
+        self.muestreo = muestreo
+        self.lentas_ns = lentas_ms * 1_000_000
+        self.exportador = exportador
+        self._numeros = itertools.count(1)
+        self._carriles = itertools.count(1)
+        self._rng = random.Random()
+
+    @contextmanager
+    def traza(self, nombre: str, **atributos):
+        """Abre una traza nueva con su span raíz (o nada si el trazado está desactivado)."""
+        if not self.activo:
+            yield None
+            return
+        traza = Traza(next(self._numeros), self._rng.random() < self.muestreo)
+        raiz = traza.raiz = Span(nombre, traza, atributos)
+        traza.spans.append(raiz)
+        token = _span_actual.set(raiz)
+        try:
+            yield raiz
+        except BaseException as e:
+            raiz.atributos["error"] = type(e).__name__
+            raise
+        finally:
+            raiz.fin = time.perf_counter_ns()
+            _span_actual.reset(token)
+            self._terminar(traza)
+
+    @contextmanager
+    def span(self, nombre: str, padre: Span | None = None, **atributos):
+        """Span hijo de `padre` o del span actual; sin traza abierta no hace nada."""
+        padre = padre or _span_actual.get()
+        if padre is None:
+            yield None
+            return
+        span = Span(nombre, padre.traza, atributos)
+        padre.traza.spans.append(span)
+        token = _span_actual.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.atributos["error"] = type(e).__name__
+            raise
+        finally:
+            span.fin = time.perf_counter_ns()
+            _span_actual.reset(token)
+
+    @staticmethod
+    def actual() -> Span | None:
+        return _span_actual.get()
+
+    @staticmethod
+    def anotar_raiz(**atributos) -> None:
+        """Añade atributos al span raíz de la traza en curso (ej. el handler que la atiende)."""
+        span = _span_actual.get()
+        if span is not None and span.traza.raiz is not None:
+            span.traza.raiz.atributos.update(atributos)
+
+    def _terminar(self, traza: Traza) -> None:
+        duracion = traza.raiz.fin - traza.raiz.inicio
+        lenta = duracion >= self.lentas_ns
+        if not (traza.muestreada or lenta) or self.exportador is None:
+            return
+        metrics.incrementar("trazas.exportadas")
+        if lenta:
+            metrics.incrementar("trazas.lentas")
+        self.exportador.enviar(self._eventos(traza, lenta))
+
+    def _eventos(self, traza: Traza, lenta: bool) -> list[dict]:
+        """Eventos "X" (duración completa) con un carril por traza e hilo, y sus nombres ("M")."""
+        pid = os.getpid()
+        raiz = traza.raiz
+        titulo = f"{raiz.atributos.get('handler') or raiz.nombre} #{traza.numero}"
+        carriles, eventos = {}, []
+        for span in traza.spans:
+            if span.hilo not in carriles:
+                carriles[span.hilo] = next(self._carriles)
+                nombre_carril = titulo if span.hilo == raiz.hilo else f"{titulo} · {span.hilo}"
+                eventos.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": carriles[span.hilo],
+                                "args": {"name": nombre_carril}})
+            fin = span.fin if span.fin is not None else raiz.fin
+            eventos.append({
+                "name": span.nombre,
+                "cat": span.nombre.split(".", 1)[0],
+                "ph": "X",
+                "ts": (span.inicio + _ORIGEN_NS) / 1000,
+                "dur": (fin - span.inicio) / 1000,
+                "pid": pid,
+                "tid": carriles[span.hilo],
+                "args": {"traza": traza.numero, **({"lenta": True} if span is raiz and lenta else {}), **span.atributos},
+            })
+        return eventos
+
+
+def trazar(nombre: str | None = None):
+    """
+    Decorador: cada llamada a la función (síncrona o corrutina) es un span de la traza en
+    curso, con nombre `nombre` o "<módulo>.<función>". Fuera de una traza solo añade una
+    lectura de variable de contexto.
+    """
+    def decorador(funcion):
+        etiqueta = nombre or f"{funcion.__module__}.{funcion.__name__}"
+        if asyncio.iscoroutinefunction(funcion):
+            @functools.wraps(funcion)
+            async def envoltura(*args, **kwargs):
+                if _span_actual.get() is None:
+                    return await funcion(*args, **kwargs)
+                with trazador.span(etiqueta):
+                    return await funcion(*args, **kwargs)
+        else:
+            @functools.wraps(funcion)
+            def envoltura(*args, **kwargs):
+                if _span_actual.get() is None:
+                    return funcion(*args, **kwargs)
+                with trazador.span(etiqueta):
+                    return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+trazador = Trazador(
+    activo=TRAZAS_ACTIVAS,
+    muestreo=TRAZAS_MUESTREO,
+    lentas_ms=TRAZAS_LENTAS_MS,
+    exportador=ExportadorChrome(TRAZAS_ARCHIVO, TRAZAS_MAX_MB * 1024 * 1024),
+)
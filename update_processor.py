@@ -0,0 +1,119 @@
+import sys
+import asyncio
+import logging
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+import metrics
+from handler_timing import marcar_recepcion
+from update_profiler import perfilador
+from tracing import trazador
+
+logger = logging.getLogger(__name__)
+
+
+class ProcesadorOrdenadoPorChat(BaseUpdateProcessor):
+    """
+    Procesa actualizaciones de forma concurrente manteniendo el orden dentro de cada chat.
+
+    Las actualizaciones de un mismo chat (o usuario, si no hay chat) se serializan con un
+    asyncio.Lock por chat, que atiende a sus esperas en orden de llegada; así los
+    ConversationHandler ven los mensajes en el mismo orden que antes. Las de chats
+    distintos corren en paralelo hasta `limite` a la vez.
+
+    El semáforo de BaseUpdateProcessor se toma antes de saber a qué chat pertenece la
+    actualización, por lo que se le pasa un valor sin límite efectivo y el límite real
+    se aplica después del lock del chat: las actualizaciones en espera de un chat
+    ocupado no consumen plazas que podrían usar otros chats. Por eso
+    `max_concurrent_updates` (y Application.concurrent_updates) reporta ese valor sin
+    límite y el máximo configurado está en `limite`.
+
+    Se instala siempre, también con límite 1 (una actualización a la vez, como el
+    procesamiento por defecto de PTB): es el punto donde empiezan la medición, el
+    perfilado de /profile y la traza de cada actualización.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` debe ser al menos 1.")
+        super().__init__(max_concurrent_updates=sys.maxsize)
+        self._limite = max_concurrent_updates
+        self._plazas = asyncio.Semaphore(max_concurrent_updates)
+        # clave de chat -> [lock, actualizaciones pendientes de ese chat]
+        self._locks_chat: dict[int, list] = {}
+        self._pendientes = 0
+        self._en_curso = 0
+        metrics.registrar_indicador("actualizaciones.en_curso", lambda: self.en_curso)
+        metrics.registrar_indicador("actualizaciones.en_cola", lambda: self.en_cola)
+
+    @property
+    def limite(self) -> int:
+        """Máximo real de actualizaciones ejecutándose a la vez."""
+        return self._limite
+
+    @property
+    def en_curso(self) -> int:
+        """Actualizaciones ejecutándose en este momento."""
+        return self._en_curso
+
+    @property
+    def en_cola(self) -> int:
+        """Actualizaciones recibidas que esperan su turno (por su chat o por una plaza libre)."""
+        return self._pendientes - self._en_curso
+
+    @staticmethod
+    def _clave_orden(update: object) -> int | None:
+        """Chat (o usuario) cuyas actualizaciones deben procesarse en orden."""
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def _ejecutar(self, coroutine) -> None:
+        async with self._plazas:
+            self._en_curso += 1
+            try:
+                # Lo que la traza tenga antes de este span es espera en cola (chat ocupado o sin plazas)
+                with trazador.span("procesar"):
+                    await coroutine
+            finally:
+                self._en_curso -= 1
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        # La latencia por handler se mide desde aquí, incluida la espera en cola (ver handler_timing.py)
+        marcar_recepcion()
+        # Si su autor lo pidió con /profile, se perfila desde que empieza a ejecutarse
+        coroutine = perfilador.envolver(update, coroutine)
+        # Traza de extremo a extremo de la actualización (ver tracing.py)
+        with trazador.traza("actualizacion", update_id=getattr(update, "update_id", None)):
+            clave = self._clave_orden(update)
+            self._pendientes += 1
+            try:
+                if clave is None:
+                    await self._ejecutar(coroutine)
+                    return
+
+                entrada = self._locks_chat.get(clave)
+                if entrada is None:
+                    entrada = self._locks_chat[clave] = [asyncio.Lock(), 0]
+                entrada[1] += 1
+                try:
+                    async with entrada[0]:
+                        await self._ejecutar(coroutine)
+                finally:
+                    entrada[1] -= 1
+                    if entrada[1] == 0:
+                        del self._locks_chat[clave]
+            finally:
+                self._pendientes -= 1
+
+    async def initialize(self) -> None:
+        if self._limite == 1:
+            logger.info("Procesamiento de actualizaciones de una en una.")
+        else:
+            logger.info(f"Procesamiento concurrente de actualizaciones activado (máximo {self._limite} a la vez).")
+
+    async def shutdown(self) -> None:
+        if self._pendientes:
+            logger.info(f"Procesador detenido con {self.en_curso} actualizaciones en curso y {self.en_cola} en cola.")
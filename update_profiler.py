@@ -0,0 +1,198 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter
+from telegram import Update, InputFile
+from config import PERFIL_INTERVALO_MS, PERFIL_MAX_ACTUALIZACIONES
+from handler_timing import medicion_de_tarea
+
+logger = logging.getLogger(__name__)
+
+# Hoja de las pilas tomadas mientras la tarea espera (base de datos, Telegram, hilos)
+MARCO_ESPERA = "(esperando)"
+
+
+def _nombre_marco(codigo) -> str:
+    return f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}"
+
+
+class _Perfil:
+    __slots__ = ("update_id", "usuario_id", "chat_id", "bot", "etiqueta", "inicio", "duracion_ms", "muestras")
+
+    def __init__(self, update: Update):
+        self.update_id = update.update_id
+        self.usuario_id = update.effective_user.id
+        self.chat_id = update.effective_chat.id if update.effective_chat else update.effective_user.id
+        self.bot = update.get_bot()
+        self.etiqueta = None
+        self.inicio = time.perf_counter()
+        self.duracion_ms = 0.0
+        self.muestras = Counter()
+
+    def colapsado(self) -> str:
+        """Formato "marco;marco;marco cantidad" de flamegraph.pl, speedscope o inferno."""
+        return "".join(f"{pila} {n}\n" for pila, n in sorted(self.muestras.items()))
+
+    def resumen(self, intervalo_ms: float, maximo: int = 5) -> str:
+        """Marcos donde terminan más muestras (tiempo propio), en % del total."""
+        total = sum(self.muestras.values())
+        propios = Counter()
+        for pila, n in self.muestras.items():
+            marcos = pila.split(";")
+            # En las esperas interesa quién espera, no el marcador
+            propios[marcos[-2] + " (espera)" if marcos[-1] == MARCO_ESPERA and len(marcos) > 1 else marcos[-1]] += n
+        lineas = [
+            f"🔬 Perfil de {self.etiqueta or 'actualización'} (update {self.update_id}): "
+            f"{self.duracion_ms:.0f} ms, {total} muestras cada {intervalo_ms:g} ms"
+        ]
+        lineas += [f"• {marco}: {n * 100 / total:.0f}%" for marco, n in propios.most_common(maximo)] if total else []
+        return "\n".join(lineas)
+
+
+class PerfiladorActualizaciones:
+    """
+    Perfilador por muestreo, bajo demanda, de las próximas actualizaciones de un usuario
+    (comando /profile).
+
+    Mientras haya actualizaciones perfilándose, un hilo toma cada `intervalo_ms` la pila
+    de cada una: si su tarea es la que está ejecutando el loop, la pila real del hilo del
+    loop (sys._current_frames(), incluido el código síncrono como renders); si está
+    suspendida, la cadena de corrutinas que espera (cr_await) terminada en MARCO_ESPERA.
+    Así el perfil es de tiempo real y cubre también base de datos y envíos a Telegram.
+
+    Al terminar cada actualización se envía al chat un documento con las pilas en formato
+    colapsado y un resumen de dónde se fue el tiempo.
+    """
+
+    def __init__(self, intervalo_ms: float = 5, max_actualizaciones: int = 20):
+        self.intervalo = intervalo_ms / 1000
+        self.max_actualizaciones = max_actualizaciones
+        self._pedidos: dict[int, int] = {}  # usuario -> actualizaciones por perfilar
+        self._activos: dict[asyncio.Task, _Perfil] = {}
+        self._lock = threading.Lock()
+        self._hay_trabajo = threading.Event()
+        self._hilo: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._id_hilo_loop: int | None = None
+        self._entregas: set[asyncio.Task] = set()
+
+    # --- Pedidos (/profile) ---
+
+    def armar(self, usuario_id: int, cantidad: int = 1) -> int:
+        """Perfila las próximas `cantidad` actualizaciones del usuario (acotado); devuelve cuántas."""
+        cantidad = max(1, min(cantidad, self.max_actualizaciones))
+        self._pedidos[usuario_id] = cantidad
+        return cantidad
+
+    def desarmar(self, usuario_id: int) -> int:
+        """Cancela el pedido del usuario; devuelve cuántas actualizaciones quedaban."""
+        return self._pedidos.pop(usuario_id, 0)
+
+    def pendientes(self, usuario_id: int) -> int:
+        return self._pedidos.get(usuario_id, 0)
+
+    def envolver(self, update: object, coroutine):
+        """Devuelve `coroutine` tal cual o, si su autor pidió perfilar, envuelta en el perfilado."""
+        if not self._pedidos or not isinstance(update, Update) or not update.effective_user:
+            return coroutine
+        usuario_id = update.effective_user.id
+        restantes = self._pedidos.get(usuario_id, 0)
+        if not restantes:
+            return coroutine
+        if restantes == 1:
+            del self._pedidos[usuario_id]
+        else:
+            self._pedidos[usuario_id] = restantes - 1
+        return self._perfilar(update, coroutine)
+
+    # --- Perfilado ---
+
+    async def _perfilar(self, update: Update, coroutine) -> None:
+        perfil = _Perfil(update)
+        tarea = asyncio.current_task()
+        self._asegurar_hilo()
+        with self._lock:
+            self._activos[tarea] = perfil
+            self._hay_trabajo.set()
+        try:
+            await coroutine
+        finally:
+            with self._lock:
+                self._activos.pop(tarea, None)
+            perfil.duracion_ms = (time.perf_counter() - perfil.inicio) * 1000
+            entrega = asyncio.create_task(self._entregar(perfil))
+            self._entregas.add(entrega)
+            entrega.add_done_callback(self._entregas.discard)
+
+    def _asegurar_hilo(self) -> None:
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._id_hilo_loop = threading.get_ident()
+        self._hilo = threading.Thread(target=self._muestrear, name="perfilador-actualizaciones", daemon=True)
+        self._hilo.start()
+
+    def _muestrear(self) -> None:
+        while True:
+            self._hay_trabajo.wait()
+            with self._lock:
+                activos = list(self._activos.items())
+                if not activos:
+                    self._hay_trabajo.clear()
+                    continue
+            try:
+                corriendo = asyncio.current_task(self._loop)
+            except RuntimeError:
+                corriendo = None
+            marco_loop = sys._current_frames().get(self._id_hilo_loop)
+            for tarea, perfil in activos:
+                try:
+                    pila = self._pila(tarea, marco_loop if tarea is corriendo else None)
+                except Exception:
+                    continue  # la tarea avanzó mientras se leía su pila
+                if pila:
+                    perfil.muestras[";".join(pila)] += 1
+                # La etiqueta la pone el handler al empezar: se sigue leyendo hasta que termina
+                if (medicion := medicion_de_tarea(tarea)) is not None:
+                    perfil.etiqueta = medicion.etiqueta
+            time.sleep(self.intervalo)
+
+    @staticmethod
+    def _pila(tarea: asyncio.Task, marco_loop) -> list[str]:
+        """Marcos de la tarea, del más externo al más interno."""
+        corrutina = tarea.get_coro()
+        raiz = getattr(corrutina, "cr_frame", None)
+        if marco_loop is not None and raiz is not None:
+            # Ejecutándose: pila real del hilo del loop hasta la corrutina de la tarea
+            marcos, marco = [], marco_loop
+            while marco is not None:
+                marcos.append(_nombre_marco(marco.f_code))
+                if marco is raiz:
+                    return marcos[::-1]
+                marco = marco.f_back
+        # Suspendida: cadena de corrutinas que está esperando
+        marcos = []
+        while corrutina is not None and hasattr(corrutina, "cr_code"):
+            marcos.append(_nombre_marco(corrutina.cr_code))
+            corrutina = corrutina.cr_await
+        marcos.append(MARCO_ESPERA)
+        return marcos
+
+    async def _entregar(self, perfil: _Perfil) -> None:
+        contenido = perfil.colapsado().encode("utf-8")
+        nombre = f"perfil_{perfil.update_id}_{(perfil.etiqueta or 'actualizacion').replace('.', '_')}.txt"
+        try:
+            await perfil.bot.send_document(
+                chat_id=perfil.chat_id,
+                document=InputFile(contenido, filename=nombre),
+                caption=perfil.resumen(self.intervalo * 1000)[:1024],
+            )
+            logger.info(f"Perfil de la actualización {perfil.update_id} enviado ({sum(perfil.muestras.values())} muestras).")
+        except Exception as e:
+            logger.error(f"No se pudo enviar el perfil de la actualización {perfil.update_id}: {e}", exc_info=True)
+
+
+perfilador = PerfiladorActualizaciones(PERFIL_INTERVALO_MS, PERFIL_MAX_ACTUALIZACIONES)